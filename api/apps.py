@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 from django.db.models.signals import post_migrate
 
 class ApiConfig(AppConfig):
@@ -7,10 +8,21 @@ class ApiConfig(AppConfig):
 
 
     def ready(self):
-        from .models import Role
+        from django.conf import settings
+        from . import dbpool  # noqa: F401  (registers connection counters)
+        from . import changefeed, counters, queries
+        connection_created.connect(queries.install, dispatch_uid="api_query_wrappers")
+        changefeed.connect_signals()
+        counters.connect_signals()
+        if settings.AUDIT_LOG["ENABLED"]:
+            from . import audit
+            audit.connect_signals()
+        if settings.MOCK_DATA["PRELOAD"]:
+            from . import mockdata
+            mockdata.get_dataset()
         def create_default_roles(sender, **kwargs):
-            roles = ["Admin", "Moderator", "User", "Guest"]
-            for role_name in roles:
-                Role.objects.get_or_create(name=role_name)
+            # Only the roles; `manage.py sync_policy` applies elements and rules
+            from .policy import ensure_roles, load_policy
+            ensure_roles(load_policy())
 
         post_migrate.connect(create_default_roles, sender=self)
\ No newline at end of file
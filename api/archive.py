@@ -0,0 +1,163 @@
+"""
+Cold archive of finished orders.
+
+Completed and cancelled orders older than a cutoff are moved out of the hot
+table into gzipped NDJSON files on local disk, one file per month of
+`created_at` (`orders-YYYY-MM.ndjson.gz`). Every batch is appended to its
+file as a separate gzip member, and a line in the sidecar `index.tsv`
+records the member's id range, file, byte offset and length. Looking up an
+archived order only decompresses the members whose id range contains it.
+
+Archived orders are logged to the change feed with the "archive"
+operation, not "delete": they left the hot table but can still be read.
+
+Run one archiver at a time: concurrent appends to the same month file would
+record wrong offsets.
+"""
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from . import counters
+from .models import ChangeLogEntry, Order
+
+ARCHIVED_STATUSES = ("completed", "cancelled")
+INDEX_FILE = "index.tsv"
+
+FIELDS = [field.attname for field in Order._meta.concrete_fields]
+
+# Parsed index.tsv, keyed by (path, mtime, size) so appends invalidate it
+_index_cache = (None, [])
+
+
+def archive_dir():
+    return Path(settings.ORDER_ARCHIVE["DIR"])
+
+
+def archivable_orders(older_than_days):
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    return Order.objects.filter(status__in=ARCHIVED_STATUSES, created_at__lt=cutoff)
+
+
+def _month_file(created_at):
+    return f"orders-{created_at:%Y-%m}.ndjson.gz"
+
+
+def _append(path, data):
+    """Appends `data` durably and returns the offset it was written at."""
+    with open(path, "ab") as fh:
+        offset = fh.tell()
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+    return offset
+
+
+def _write_batch(directory, rows):
+    by_file = defaultdict(list)
+    for row in rows:
+        by_file[_month_file(row["created_at"])].append(row)
+
+    index_lines = []
+    for filename, file_rows in sorted(by_file.items()):
+        payload = "".join(json.dumps(row, cls=DjangoJSONEncoder) + "\n" for row in file_rows)
+        member = gzip.compress(payload.encode())
+        offset = _append(directory / filename, member)
+        ids = [row["id"] for row in file_rows]
+        index_lines.append(f"{min(ids)}\t{max(ids)}\t{filename}\t{offset}\t{len(member)}\n")
+    _append(directory / INDEX_FILE, "".join(index_lines).encode())
+
+
+def _delete_rows(using, ids):
+    """
+    Deletes orders by id with a plain DELETE. Archiving is not a deletion:
+    the collector and its delete signals (change feed, audit log, counters)
+    are skipped.
+    """
+    connection = connections[using]
+    table = connection.ops.quote_name(Order._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(f"DELETE FROM {table} WHERE id = ANY(%s)", [ids])
+        else:
+            cursor.execute(f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(ids))})", ids)
+
+
+def archive_orders(older_than_days=None, batch_size=None):
+    """
+    Moves archivable orders to the archive in batches, each in its own
+    transaction. Returns the number of orders archived.
+
+    Files are written before the rows are deleted, so an interrupted run can
+    leave a batch both archived and in the table. It is archived again by
+    the next run, and lookups return the newest copy.
+    """
+    options = settings.ORDER_ARCHIVE
+    queryset = archivable_orders(older_than_days if older_than_days is not None else options["OLDER_THAN_DAYS"])
+    batch_size = batch_size or options["BATCH_SIZE"]
+    using = router.db_for_write(Order)
+    directory = archive_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+
+    archived = 0
+    while True:
+        with transaction.atomic(using=using):
+            rows = list(
+                queryset.using(using).select_for_update().order_by("pk").values(*FIELDS)[:batch_size]
+            )
+            if not rows:
+                return archived
+            _write_batch(directory, rows)
+            ids = [row["id"] for row in rows]
+            ChangeLogEntry.record_queryset(Order.objects.using(using).filter(pk__in=ids), "archive")
+            _delete_rows(using, ids)
+            counters.record_archived_orders(rows, using)
+        archived += len(rows)
+
+
+def _index_entries(directory):
+    global _index_cache
+    path = directory / INDEX_FILE
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return []
+
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+    cached_key, entries = _index_cache
+    if cached_key != key:
+        entries = []
+        with open(path) as fh:
+            for line in fh:
+                low, high, filename, offset, length = line.rstrip("\n").split("\t")
+                entries.append((int(low), int(high), filename, int(offset), int(length)))
+        _index_cache = (key, entries)
+    return entries
+
+
+def find_archived_order(pk):
+    """Returns the archived order as an unsaved Order instance, or None."""
+    directory = archive_dir()
+    # Newest members first, so a batch archived twice resolves to its last copy
+    for low, high, filename, offset, length in reversed(_index_entries(directory)):
+        if not low <= pk <= high:
+            continue
+        with open(directory / filename, "rb") as fh:
+            fh.seek(offset)
+            data = gzip.decompress(fh.read(length))
+        for line in data.splitlines():
+            row = json.loads(line)
+            if row["id"] == pk:
+                return Order(**{
+                    field.attname: field.to_python(row[field.attname])
+                    for field in Order._meta.concrete_fields
+                })
+    return None
@@ -0,0 +1,179 @@
+"""
+Write-behind audit trail.
+
+Changes to audited models are captured by signals once their transaction
+commits and put into an in-process bounded buffer. A background thread
+writes the buffer with `bulk_create` when it holds BATCH_SIZE records or
+FLUSH_INTERVAL seconds have passed, and once more at interpreter exit, so
+requests never wait for audit INSERTs.
+
+When the buffer is full, producers wait up to BLOCK_TIMEOUT seconds for the
+flusher to make room (backpressure) before the record is dropped and
+counted.
+"""
+import atexit
+import logging
+import queue
+import threading
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .models import AccessRoleRule, AuditLog, Order, Product, Store
+
+logger = logging.getLogger(__name__)
+
+AUDITED_MODELS = (AccessRoleRule, Product, Store, Order)
+
+# Id of the authenticated user making changes in the current request
+_current_actor = ContextVar("audit_actor", default=None)
+
+
+def set_actor(user_id):
+    _current_actor.set(user_id)
+
+
+def _reset_actor(**kwargs):
+    _current_actor.set(None)
+
+
+class AuditBuffer:
+    def __init__(self, capacity, batch_size, flush_interval, block_timeout, autostart=True):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self.autostart = autostart
+
+        self._queue = queue.Queue(maxsize=capacity)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._thread = None
+        self._stats = {"enqueued": 0, "flushed": 0, "dropped": 0, "flush_errors": 0}
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["buffered"] = self._queue.qsize()
+        stats["capacity"] = self._queue.maxsize
+        return stats
+
+    def put(self, record):
+        """Buffers an unsaved AuditLog. Returns False if it had to be dropped."""
+        if self.autostart:
+            self._ensure_started()
+        try:
+            self._queue.put(record, timeout=self.block_timeout)
+        except queue.Full:
+            self._count("dropped")
+            return False
+
+        self._count("enqueued")
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def flush(self):
+        """Writes everything buffered so far. Returns the number of records written."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return written
+                try:
+                    AuditLog.objects.bulk_create(batch)
+                except Exception:
+                    logger.exception("Failed to write %d audit records", len(batch))
+                    self._count("flush_errors")
+                    self._count("dropped", len(batch))
+                else:
+                    self._count("flushed", len(batch))
+                    written += len(batch)
+
+    def close(self):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-flusher", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+            connections.close_all()
+
+
+audit_buffer = AuditBuffer(
+    capacity=settings.AUDIT_LOG["BUFFER_SIZE"],
+    batch_size=settings.AUDIT_LOG["BATCH_SIZE"],
+    flush_interval=settings.AUDIT_LOG["FLUSH_INTERVAL"],
+    block_timeout=settings.AUDIT_LOG["BLOCK_TIMEOUT"],
+)
+
+
+def record(model, object_id, action, changes, using=None):
+    """Queues an audit record to be buffered once the current transaction commits."""
+    if not settings.AUDIT_LOG["ENABLED"]:
+        return
+    entry = AuditLog(
+        actor_id=_current_actor.get(),
+        model=model._meta.label_lower,
+        object_id=str(object_id),
+        action=action,
+        changes=changes,
+        created_at=timezone.now(),
+    )
+    # Looked up at call time so tests can swap the buffer
+    transaction.on_commit(lambda: audit_buffer.put(entry), using=using)
+
+
+def _snapshot(instance):
+    """Loaded concrete field values; deferred fields are skipped, not fetched."""
+    deferred = instance.get_deferred_fields()
+    return {
+        field.attname: field.value_from_object(instance)
+        for field in instance._meta.concrete_fields
+        if field.attname not in deferred
+    }
+
+
+def _on_save(sender, instance, created, using, **kwargs):
+    record(sender, instance.pk, "create" if created else "update", _snapshot(instance), using=using)
+
+
+def _on_delete(sender, instance, using, **kwargs):
+    record(sender, instance.pk, "delete", _snapshot(instance), using=using)
+
+
+def connect_signals():
+    request_started.connect(_reset_actor, dispatch_uid="audit_reset_actor")
+    for model in AUDITED_MODELS:
+        post_save.connect(_on_save, sender=model, dispatch_uid=f"audit_save_{model._meta.label_lower}")
+        post_delete.connect(_on_delete, sender=model, dispatch_uid=f"audit_delete_{model._meta.label_lower}")
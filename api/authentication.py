@@ -1,11 +1,14 @@
 from rest_framework.authentication import BaseAuthentication
 from rest_framework import exceptions
 from .models import User, RevokedToken
-from .utils import decode_jwt
+from .metrics import JWT_DECODE_FAILURES, REVOKED_TOKEN_HITS
+from .tracing import span, traced
+from .utils import verify_jwt
+from . import audit
 
 class JWTAuthentication(BaseAuthentication):
 
-    def authenticate(self, request):
+    def get_token(self, request):
         auth_header = request.headers.get("Authorization")
         if not auth_header:
             raise exceptions.NotAuthenticated("Authentication credentials were not provided")
@@ -17,20 +20,61 @@ class JWTAuthentication(BaseAuthentication):
         except ValueError:
             raise exceptions.NotAuthenticated("Invalid Authorization header format")
 
-        if RevokedToken.objects.filter(token=token).exists():
+        return token
+
+    @traced()
+    def authenticate(self, request):
+        token = self.get_token(request)
+
+        with span("auth.revocation_check"):
+            revoked = RevokedToken.objects.filter(token=token).exists()
+        if revoked:
+            REVOKED_TOKEN_HITS.inc()
             raise exceptions.AuthenticationFailed("Token has been revoked")
 
-        payload = decode_jwt(token)
-        if not payload:
-            raise exceptions.AuthenticationFailed("Invalid or expired token")
+        with span("auth.jwt_decode"):
+            payload = self.decode(token)
 
         try:
-            user = User.objects.get(id=payload["user_id"], is_active=True)
+            with span("auth.user_fetch"):
+                user = User.objects.select_related("role").get(id=payload["user_id"])
         except User.DoesNotExist:
             raise exceptions.AuthenticationFailed("User not found or inactive")
 
+        audit.set_actor(user.pk)
         return (user, None)
 
+    async def aauthenticate(self, request):
+        """
+        Async counterpart of `authenticate` for native async views.
+        Uses the async ORM, so no thread-pool hop is needed under ASGI.
+        """
+        token = self.get_token(request)
+
+        if await RevokedToken.objects.filter(token=token).aexists():
+            REVOKED_TOKEN_HITS.inc()
+            raise exceptions.AuthenticationFailed("Token has been revoked")
+
+        payload = self.decode(token)
+
+        try:
+            user = await User.objects.select_related("role").aget(id=payload["user_id"])
+        except User.DoesNotExist:
+            raise exceptions.AuthenticationFailed("User not found or inactive")
+
+        audit.set_actor(user.pk)
+        return (user, token)
+
+    @staticmethod
+    def decode(token):
+        # Counted here rather than in verify_jwt, which middleware may call for the same token
+        payload, failure = verify_jwt(token)
+        if failure:
+            JWT_DECODE_FAILURES.inc(reason=failure)
+        if not payload:
+            raise exceptions.AuthenticationFailed("Invalid or expired token")
+        return payload
+
     def authenticate_header(self, request):
         """
         DRF uses this to return the WWW-Authenticate header.
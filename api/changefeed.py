@@ -0,0 +1,25 @@
+"""
+Writes the change feed (ChangeLogEntry) for Product, Store and Order.
+
+Receivers run inside the transaction of the change: saves are wrapped by
+ChangeTrackedModel.save and deletes by Django's collector.
+"""
+from django.db.models.signals import post_delete, post_save
+
+from .models import ChangeLogEntry, Order, Product, Store
+
+TRACKED_MODELS = (Product, Store, Order)
+
+
+def _on_save(sender, instance, created, using, **kwargs):
+    ChangeLogEntry.record(instance, "create" if created else "update", using)
+
+
+def _on_delete(sender, instance, using, **kwargs):
+    ChangeLogEntry.record(instance, "delete", using)
+
+
+def connect_signals():
+    for model in TRACKED_MODELS:
+        post_save.connect(_on_save, sender=model, dispatch_uid=f"changefeed_save_{model._meta.label_lower}")
+        post_delete.connect(_on_delete, sender=model, dispatch_uid=f"changefeed_delete_{model._meta.label_lower}")
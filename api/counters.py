@@ -0,0 +1,191 @@
+"""
+Denormalized Store counters: product_count, active_product_count and
+order_revenue (total_price of all orders that are not cancelled).
+
+Receivers adjust the counters with F() expressions in the transaction of
+the product or order change. They compare against the values the instance
+had when it was loaded or last saved, recorded on post_init. Queryset
+`.update()` calls bypass signals, so code doing bulk updates refreshes the
+counters it affects, and `reconcile_store_counters` repairs any remaining
+drift in bulk.
+
+Archived orders leave the table without signals. Their revenue is kept in
+`archived_order_revenue` so reconciliation still accounts for it.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+
+from .models import Order, Product, Store
+
+COUNTER_FIELDS = ("product_count", "active_product_count", "order_revenue")
+
+TRACKED_FIELDS = {
+    Product: ("store_id", "is_active"),
+    Order: ("product_id", "status", "total_price"),
+}
+
+_MISSING = object()
+
+
+def expected_counters():
+    """Expressions computing each Store counter from the source tables, for `.annotate()`/`.update()`."""
+    products = Product.all_objects.filter(store=OuterRef("pk")).order_by().values("store")
+    orders = (
+        Order.objects.filter(product__store=OuterRef("pk"))
+        .exclude(status="cancelled")
+        .order_by()
+        .values("product__store")
+    )
+    money = DecimalField(max_digits=14, decimal_places=2)
+    return {
+        "product_count": Coalesce(Subquery(products.annotate(n=Count("pk")).values("n")), 0),
+        "active_product_count": Coalesce(
+            Subquery(products.filter(is_active=True).annotate(n=Count("pk")).values("n")), 0
+        ),
+        "order_revenue": Coalesce(
+            Subquery(orders.annotate(total=Sum("total_price")).values("total")),
+            Value(Decimal("0")),
+            output_field=money,
+        ) + F("archived_order_revenue"),
+    }
+
+
+def find_drift(queryset=None):
+    """Stores whose counters differ from the source tables, with the expected values."""
+    queryset = Store.all_objects.all() if queryset is None else queryset
+    annotated = queryset.annotate(**{f"expected_{name}": value for name, value in expected_counters().items()})
+    drifted = Q()
+    for name in COUNTER_FIELDS:
+        drifted |= ~Q(**{name: F(f"expected_{name}")})
+    return annotated.filter(drifted).order_by("pk").values(
+        "pk", *COUNTER_FIELDS, *(f"expected_{name}" for name in COUNTER_FIELDS)
+    )
+
+
+def repair(store_ids, using=None):
+    """Recomputes every counter of the given stores in one UPDATE."""
+    return Store.all_objects.db_manager(using).filter(pk__in=store_ids).update(**expected_counters())
+
+
+def refresh_active_product_counts(store_ids, using=None):
+    """Recomputes active_product_count after a bulk change of Product.is_active."""
+    if not store_ids:
+        return 0
+    return Store.all_objects.db_manager(using).filter(pk__in=store_ids).update(
+        active_product_count=expected_counters()["active_product_count"]
+    )
+
+
+def record_archived_orders(rows, using=None):
+    """Moves the revenue of archived order rows (dicts) into archived_order_revenue."""
+    by_product = defaultdict(Decimal)
+    for row in rows:
+        if row["status"] != "cancelled":
+            by_product[row["product_id"]] += Decimal(str(row["total_price"]))
+
+    by_store = defaultdict(Decimal)
+    products = Product.all_objects.db_manager(using).filter(pk__in=by_product).values_list("pk", "store_id")
+    for product_id, store_id in products:
+        by_store[store_id] += by_product[product_id]
+    for store_id, amount in by_store.items():
+        Store.all_objects.db_manager(using).filter(pk=store_id).update(
+            archived_order_revenue=F("archived_order_revenue") + amount
+        )
+
+
+def _loaded_state(instance, fields):
+    values = tuple(instance.__dict__.get(name, _MISSING) for name in fields)
+    return None if _MISSING in values else values
+
+
+def _on_init(sender, instance, **kwargs):
+    instance._counter_state = None if instance.pk is None else _loaded_state(instance, TRACKED_FIELDS[sender])
+
+
+def _ensure_state(sender, instance, using, **kwargs):
+    """Reads the stored values of tracked fields that were deferred when the instance was loaded."""
+    if instance._state.adding or getattr(instance, "_counter_state", None) is not None:
+        return
+    instance._counter_state = (
+        sender._base_manager.db_manager(using)
+        .filter(pk=instance.pk)
+        .values_list(*TRACKED_FIELDS[sender])
+        .first()
+    )
+
+
+def _saved_state(sender, instance, old, update_fields):
+    """Tracked values as stored after the save; unsaved or deferred fields keep their old value."""
+    state = []
+    for index, name in enumerate(TRACKED_FIELDS[sender]):
+        skipped = update_fields is not None and name not in update_fields and name.removesuffix("_id") not in update_fields
+        if old is not None and (skipped or name not in instance.__dict__):
+            state.append(old[index])
+        else:
+            state.append(getattr(instance, name))
+    return tuple(state)
+
+
+def _adjust(using, stores, changes):
+    changes = {name: F(name) + delta for name, delta in changes.items() if delta}
+    if changes:
+        stores.using(using).update(**changes)
+
+
+def _product_deltas(state, sign):
+    store_id, is_active = state
+    return store_id, {"product_count": sign, "active_product_count": sign if is_active else 0}
+
+
+def _order_deltas(state, sign):
+    product_id, status, total_price = state
+    revenue = Decimal(0) if status == "cancelled" else Decimal(str(total_price))
+    return product_id, {"order_revenue": sign * revenue}
+
+
+def _apply(sender, old, new, using):
+    deltas = defaultdict(lambda: defaultdict(int))
+    for state, sign in ((old, -1), (new, 1)):
+        if state is None:
+            continue
+        key, changes = (_product_deltas if sender is Product else _order_deltas)(state, sign)
+        for name, delta in changes.items():
+            deltas[key][name] += delta
+
+    for key, changes in deltas.items():
+        if key is None:
+            continue
+        if sender is Product:
+            stores = Store.all_objects.filter(pk=key)
+        else:
+            stores = Store.all_objects.filter(pk=Subquery(Product.all_objects.filter(pk=key).values("store_id")[:1]))
+        _adjust(using, stores, changes)
+
+
+def _on_save(sender, instance, created, using, update_fields, raw, **kwargs):
+    if raw:
+        return
+    old = None if created else instance._counter_state
+    new = _saved_state(sender, instance, old, update_fields)
+    if old != new:
+        _apply(sender, old, new, using)
+    instance._counter_state = new
+
+
+def _on_delete(sender, instance, using, **kwargs):
+    if getattr(instance, "_counter_state", None) is not None:
+        _apply(sender, instance._counter_state, None, using)
+
+
+def connect_signals():
+    for model in TRACKED_FIELDS:
+        label = model._meta.label_lower
+        post_init.connect(_on_init, sender=model, dispatch_uid=f"counters_init_{label}")
+        pre_save.connect(_ensure_state, sender=model, dispatch_uid=f"counters_pre_save_{label}")
+        pre_delete.connect(_ensure_state, sender=model, dispatch_uid=f"counters_pre_delete_{label}")
+        post_save.connect(_on_save, sender=model, dispatch_uid=f"counters_save_{label}")
+        post_delete.connect(_on_delete, sender=model, dispatch_uid=f"counters_delete_{label}")
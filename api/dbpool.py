@@ -0,0 +1,52 @@
+"""
+Per-worker database connection counters.
+
+`connection_created` fires whenever Django obtains a connection: a new
+physical connection without a pool, a checkout when the psycopg 3 pool is
+enabled. The pool's own statistics (waits, wait time, pool size) are added
+when it is configured.
+"""
+import os
+from collections import Counter
+from threading import Lock
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_counts = Counter()
+_lock = Lock()
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    with _lock:
+        _counts[connection.alias] += 1
+
+
+def get_pool_stats():
+    """Returns connection statistics of this worker process for every database alias."""
+    stats = []
+    for alias in connections:
+        pool = getattr(connections[alias], "pool", None)
+        entry = {
+            "alias": alias,
+            "pooled": pool is not None,
+            "connections_obtained": _counts[alias],
+        }
+        if pool is not None:
+            pool_stats = pool.get_stats()
+            entry.update(
+                pool_min=pool_stats.get("pool_min"),
+                pool_max=pool_stats.get("pool_max"),
+                pool_size=pool_stats.get("pool_size"),
+                pool_available=pool_stats.get("pool_available"),
+                checkouts=pool_stats.get("requests_num", 0),
+                waits=pool_stats.get("requests_queued", 0),
+                wait_ms=pool_stats.get("requests_wait_ms", 0),
+                waiting_now=pool_stats.get("requests_waiting", 0),
+                errors=pool_stats.get("requests_errors", 0),
+                connections_opened=pool_stats.get("connections_num", 0),
+            )
+        stats.append(entry)
+    return {"pid": os.getpid(), "databases": stats}
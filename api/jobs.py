@@ -0,0 +1,133 @@
+"""
+Chunked background deletion of users and stores.
+
+Deleting a large account in one go makes Django's collector load every
+dependent row into memory and delete them in a single long transaction.
+Here dependents are removed leaf-first (orders, products, stores, then the
+target) in batches of DELETION_BATCH_SIZE rows, each batch in its own short
+transaction. Because every level is emptied before its parent, no orphan
+rows are left even if the job is interrupted and resumed.
+
+A runner claims a job by stamping `claimed_at` and renews `heartbeat_at`
+in the transaction of every batch, only while its claim still stands. A
+running job can be resumed once its heartbeat is older than
+DELETION_JOB_LEASE_SECONDS; the runner it was taken from then rolls back
+its next batch and stops, so each row is deleted and counted once.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import DeletionJob, Order, Product, Store, User
+
+logger = logging.getLogger(__name__)
+
+# One worker per process keeps deletions from competing with each other
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="deletion")
+
+
+def deletion_plan(target_type, target_id):
+    """Querysets to empty, leaf-first, ending with the target itself."""
+    if target_type == "store":
+        return [
+            Order.objects.filter(product__store_id=target_id),
+            Product.all_objects.filter(store_id=target_id),
+            Store.all_objects.filter(pk=target_id),
+        ]
+    if target_type == "user":
+        return [
+            Order.objects.filter(
+                Q(user_id=target_id) | Q(owner_id=target_id)
+                | Q(product__owner_id=target_id) | Q(product__store__owner_id=target_id)
+            ),
+            Product.all_objects.filter(Q(owner_id=target_id) | Q(store__owner_id=target_id)),
+            Store.all_objects.filter(owner_id=target_id),
+            User.all_objects.filter(pk=target_id),
+        ]
+    raise ValueError(f"Unknown deletion target '{target_type}'")
+
+
+def dependent_row_count(target_type, target_id, limit=None):
+    """Number of rows that deleting the target cascades to, capped at `limit` per table."""
+    total = 0
+    for queryset in deletion_plan(target_type, target_id)[:-1]:
+        total += (queryset[:limit] if limit else queryset).count()
+    return total
+
+
+def enqueue_deletion(target, requested_by=None):
+    """
+    Hides `target` (a User or Store) and the stores and products under it
+    right away (see User.soft_delete and Store.soft_delete), and schedules
+    its deletion once the current transaction commits. Returns the DeletionJob.
+    """
+    target_type = {User: "user", Store: "store"}[type(target)]
+    with transaction.atomic():
+        target.soft_delete()
+        job = DeletionJob.objects.create(target_type=target_type, target_id=target.pk, requested_by=requested_by)
+    transaction.on_commit(lambda: _executor.submit(_run_in_thread, job.pk))
+    return job
+
+
+def _run_in_thread(job_id):
+    try:
+        run_deletion_job(job_id)
+    finally:
+        connections.close_all()
+
+
+class LeaseLost(Exception):
+    pass
+
+
+def run_deletion_job(job_id, batch_size=None, resume=False):
+    """
+    Claims and runs a pending job. With `resume`, a running job whose
+    heartbeat is older than DELETION_JOB_LEASE_SECONDS (its runner died) is
+    picked up as well. Returns the job, or None if it was not claimable or
+    was taken over by another runner.
+    """
+    batch_size = batch_size or settings.DELETION_BATCH_SIZE
+    claimed_at = timezone.now()
+    claimable = Q(status="pending")
+    if resume:
+        expired = claimed_at - timedelta(seconds=settings.DELETION_JOB_LEASE_SECONDS)
+        claimable |= Q(status="running") & (Q(heartbeat_at__lt=expired) | Q(heartbeat_at__isnull=True))
+    claimed = DeletionJob.objects.filter(claimable, pk=job_id).update(
+        status="running", claimed_at=claimed_at, heartbeat_at=claimed_at,
+    )
+    if not claimed:
+        return None
+
+    # Every write below only applies while this runner still holds the job
+    lease = DeletionJob.objects.filter(pk=job_id, claimed_at=claimed_at)
+    job = DeletionJob.objects.get(pk=job_id)
+    plan = deletion_plan(job.target_type, job.target_id)
+    lease.update(rows_total=job.rows_deleted + sum(queryset.count() for queryset in plan))
+
+    status, error = "completed", ""
+    try:
+        for queryset in plan:
+            while True:
+                ids = list(queryset.values_list("pk", flat=True)[:batch_size])
+                if not ids:
+                    break
+                with transaction.atomic():
+                    deleted, _ = queryset.model._base_manager.filter(pk__in=ids).delete()
+                    now = timezone.now()
+                    if not lease.update(rows_deleted=F("rows_deleted") + deleted, heartbeat_at=now, updated_at=now):
+                        raise LeaseLost
+    except LeaseLost:
+        logger.warning("Deletion job %s was taken over by another runner", job_id)
+        return None
+    except Exception as exc:
+        logger.exception("Deletion job %s failed", job_id)
+        status, error = "failed", str(exc)
+    now = timezone.now()
+    lease.update(status=status, error=error, finished_at=now, updated_at=now)
+    return DeletionJob.objects.get(pk=job_id)
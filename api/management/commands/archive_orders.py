@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.archive import archivable_orders, archive_dir, archive_orders
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves completed and cancelled orders older than --older-than-days "
+        "into gzipped NDJSON files under ORDER_ARCHIVE['DIR']. Run one at a time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than-days", type=int, default=settings.ORDER_ARCHIVE["OLDER_THAN_DAYS"])
+        parser.add_argument("--batch-size", type=int, help="Orders moved per transaction")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the orders that would be archived")
+
+    def handle(self, *args, **options):
+        if options["dry_run"]:
+            count = archivable_orders(options["older_than_days"]).count()
+            self.stdout.write(f"{count} orders would be archived")
+            return
+
+        count = archive_orders(options["older_than_days"], batch_size=options["batch_size"])
+        self.stdout.write(f"{count} orders archived to {archive_dir()}")
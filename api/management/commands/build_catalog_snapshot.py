@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.snapshot import build_snapshot, catalog_cursor, get_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Compiles the active product/store catalog into the memory-mapped snapshot "
+        "file. With --watch, rebuilds whenever the change feed shows catalog changes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--watch", action="store_true", help="Keep rebuilding when the catalog changes")
+        parser.add_argument("--interval", type=float, default=2.0, help="Seconds between change checks")
+        parser.add_argument("--max-age", type=float, default=300.0,
+                            help="Rebuild at least this often so store counters stay fresh")
+
+    def handle(self, *args, **options):
+        while True:
+            current = get_snapshot()
+            stale = (
+                current is None
+                or current.cursor < catalog_cursor()
+                or time.time() - current.built_at >= options["max_age"]
+            )
+            if stale or not options["watch"]:
+                started = time.perf_counter()
+                path = build_snapshot()
+                self.stdout.write(f"Built {path} in {time.perf_counter() - started:.2f}s")
+
+            if not options["watch"]:
+                break
+            time.sleep(options["interval"])
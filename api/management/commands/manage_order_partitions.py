@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates monthly Order partitions ahead of time and detaches old ones "
+        "(PostgreSQL only). Run it daily, e.g. from cron. --backfill also creates "
+        "partitions for past months whose orders sit in the default partition."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ahead", type=int, default=3,
+                            help="Months of future partitions to keep created (default: 3)")
+        parser.add_argument("--backfill", action="store_true",
+                            help="Create partitions for every month that has rows in the default partition")
+        parser.add_argument("--detach-older-than", type=int, metavar="MONTHS",
+                            help="Detach partitions for months more than MONTHS months before the current one")
+        parser.add_argument("--dry-run", action="store_true", help="Only print what would be done")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Order partitioning is only available on PostgreSQL")
+
+        current = partitions.month_start(timezone.now().date())
+        with transaction.atomic(), connection.cursor() as cursor:
+            if not partitions.is_partitioned(cursor):
+                raise CommandError("api_order is not partitioned; run the migrations first")
+            # Moving a month out of the default partition is one statement
+            cursor.execute("SET LOCAL statement_timeout = 0")
+            existing = partitions.month_partitions(cursor)
+
+            months = [partitions.add_months(current, offset) for offset in range(options["ahead"] + 1)]
+            if options["backfill"]:
+                months = sorted(set(months) | set(partitions.default_partition_months(cursor)))
+            for month in months:
+                if month in existing:
+                    continue
+                if not options["dry_run"]:
+                    # Also moves the month's rows out of the default partition
+                    partitions.create_month_partition(cursor, month)
+                self.stdout.write(f"created {partitions.partition_name(month)}")
+
+            if options["detach_older_than"] is not None:
+                cutoff = partitions.add_months(current, -options["detach_older_than"])
+                for month in sorted(m for m in existing if m < cutoff):
+                    if not options["dry_run"]:
+                        partitions.detach_month_partition(cursor, month)
+                    self.stdout.write(f"detached {partitions.partition_name(month)}")
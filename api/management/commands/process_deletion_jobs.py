@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.jobs import run_deletion_job
+from api.models import DeletionJob
+
+
+class Command(BaseCommand):
+    help = "Runs pending background deletion jobs, and with --resume interrupted ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, help="Rows deleted per transaction")
+        parser.add_argument("--resume", action="store_true",
+                            help="Also pick up running jobs without a heartbeat for "
+                                 "DELETION_JOB_LEASE_SECONDS (their worker died)")
+        parser.add_argument("--loop", action="store_true", help="Keep polling for new jobs")
+        parser.add_argument("--interval", type=float, default=5.0, help="Polling interval in seconds")
+
+    def handle(self, *args, **options):
+        while True:
+            statuses = ["pending", "running"] if options["resume"] else ["pending"]
+            job_ids = list(
+                DeletionJob.objects.filter(status__in=statuses)
+                .order_by("created_at")
+                .values_list("pk", flat=True)
+            )
+            for job_id in job_ids:
+                job = run_deletion_job(job_id, batch_size=options["batch_size"], resume=options["resume"])
+                if job:
+                    self.stdout.write(f"{job}: {job.rows_deleted}/{job.rows_total} rows deleted")
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
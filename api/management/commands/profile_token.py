@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.profiling import TOKEN_HEADER, make_token
+
+
+class Command(BaseCommand):
+    help = (
+        "Prints a signed X-Profile-Token header value. Requests sent with it are "
+        "profiled; fetch the results from /api/ops/profiles/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/", help="Only profile requests under this path prefix")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{TOKEN_HEADER}: {make_token(options['path'])}")
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.counters import COUNTER_FIELDS, find_drift, repair
+
+
+class Command(BaseCommand):
+    help = "Compares the denormalized Store counters with Product/Order and repairs drift in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Repair the stores that drifted")
+        parser.add_argument("--batch-size", type=int, default=500, help="Stores repaired per UPDATE")
+
+    def handle(self, *args, **options):
+        drifted = list(find_drift())
+        for row in drifted:
+            changes = ", ".join(
+                f"{name} {row[name]} -> {row[f'expected_{name}']}"
+                for name in COUNTER_FIELDS
+                if row[name] != row[f"expected_{name}"]
+            )
+            self.stdout.write(f"store {row['pk']}: {changes}")
+
+        if not options["fix"]:
+            self.stdout.write(f"{len(drifted)} stores drifted (run with --fix to repair)")
+            return
+
+        ids = [row["pk"] for row in drifted]
+        repaired = 0
+        for start in range(0, len(ids), options["batch_size"]):
+            with transaction.atomic():
+                repaired += repair(ids[start:start + options["batch_size"]])
+        self.stdout.write(f"{repaired} stores repaired")
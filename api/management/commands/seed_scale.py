@@ -0,0 +1,89 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+
+from api.models import Order, Product, Role, Store, User
+from api.seeding import (
+    ORDER_COLUMNS, PRODUCT_COLUMNS, STORE_COLUMNS, USER_COLUMNS, ScaleDataset, copy_rows,
+)
+from api.utils import hash_password
+
+
+class Command(BaseCommand):
+    help = (
+        "Loads a large deterministic synthetic dataset (users, stores, products, orders) "
+        "with COPY (PostgreSQL only). Rows are added next to existing data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--stores", type=int, default=1_000)
+        parser.add_argument("--products", type=int, default=100_000)
+        parser.add_argument("--orders", type=int, default=1_000_000)
+        parser.add_argument("--seed", type=int, default=0, help="Same seed, same dataset")
+        parser.add_argument("--months", type=int, default=24, help="Spread created_at over this many months")
+        parser.add_argument("--skew", type=float, default=3.0,
+                            help="Ownership/popularity skew; 1 is uniform, higher concentrates on fewer rows")
+        parser.add_argument("--password", default="password123",
+                            help="Password of every generated user (hashed once)")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("seed_scale loads data with COPY and needs PostgreSQL")
+        if min(options["users"], options["stores"], options["products"]) < 1:
+            raise CommandError("--users, --stores and --products must be at least 1")
+
+        role_ids = {role.name: role.pk for role in Role.objects.filter(name__in=["User", "Moderator"])}
+        if set(role_ids) != {"User", "Moderator"}:
+            raise CommandError("Roles are missing; run the migrations first")
+
+        models = {"user": User, "store": Store, "product": Product, "order": Order}
+        first_ids = {
+            name: (model._base_manager.aggregate(Max("pk"))["pk__max"] or 0) + 1
+            for name, model in models.items()
+        }
+        dataset = ScaleDataset(
+            options["users"], options["stores"], options["products"], options["orders"],
+            password_hash=hash_password(options["password"]),
+            role_ids=role_ids,
+            first_ids=first_ids,
+            seed=options["seed"],
+            months=options["months"],
+            skew=options["skew"],
+        )
+
+        loads = (
+            (User, USER_COLUMNS, dataset.users),
+            (Product, PRODUCT_COLUMNS, dataset.products),
+            (Order, ORDER_COLUMNS, dataset.orders),
+            (Store, STORE_COLUMNS, dataset.stores),  # last: counters are accumulated above
+        )
+        started = time.perf_counter()
+        total = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Each table is a single COPY; DB_STATEMENT_TIMEOUT_MS is meant for requests
+            cursor.execute("SET LOCAL statement_timeout = 0")
+            for model, columns, rows in loads:
+                table = model._meta.db_table
+                t0 = time.perf_counter()
+                count = copy_rows(cursor, table, columns, rows())
+                elapsed = time.perf_counter() - t0
+                total += count
+                self.stdout.write(f"{table}: {count} rows in {elapsed:.1f}s ({count / max(elapsed, 1e-9):,.0f} rows/s)")
+
+            for model in models.values():
+                table = model._meta.db_table
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence(%s, 'id'), (SELECT MAX(id) FROM {table}))", [table]
+                )
+
+        with connection.cursor() as cursor:
+            for model in models.values():
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {total} rows in {elapsed:.1f}s ({total / elapsed * 60:,.0f} rows/min)"
+        ))
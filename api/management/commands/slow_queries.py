@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db.models import ExpressionWrapper, F, FloatField
+
+from api.models import SlowQuery
+
+ORDERINGS = {
+    "total": "-total_ms",
+    "max": "-max_ms",
+    "count": "-count",
+    "avg": "-avg_ms",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Prints the statements that most often ran over SLOW_QUERIES['THRESHOLD_MS'], "
+        "aggregated per fingerprint and view, with their EXPLAIN plans."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=10, help="Number of statements to print (default: 10)")
+        parser.add_argument("--sort", choices=sorted(ORDERINGS), default="total",
+                            help="Rank by total, worst, average time or by count (default: total)")
+        parser.add_argument("--view", help="Only statements run by this URL name, e.g. order-list")
+        parser.add_argument("--no-plans", action="store_true", help="Leave out the EXPLAIN plans")
+        parser.add_argument("--reset", action="store_true", help="Delete the recorded statements instead")
+
+    def handle(self, *args, **options):
+        if options["reset"]:
+            deleted, _ = SlowQuery.objects.all().delete()
+            self.stdout.write(f"{deleted} slow queries deleted")
+            return
+
+        rows = SlowQuery.objects.annotate(
+            avg_ms=ExpressionWrapper(F("total_ms") / F("count"), output_field=FloatField()),
+        )
+        if options["view"]:
+            rows = rows.filter(view=options["view"])
+        rows = list(rows.order_by(ORDERINGS[options["sort"]])[:options["limit"]])
+        if not rows:
+            self.stdout.write("No slow queries recorded")
+            return
+
+        for rank, row in enumerate(rows, 1):
+            action = f" ({row.action})" if row.action else ""
+            self.stdout.write(
+                f"#{rank} {row.view}{action} on {row.database}: {row.count}x, "
+                f"total {row.total_ms:.1f} ms, avg {row.avg_ms:.1f} ms, max {row.max_ms:.1f} ms, "
+                f"last seen {row.last_seen:%Y-%m-%d %H:%M:%S}"
+            )
+            self.stdout.write(f"    {row.fingerprint}")
+            if not options["no_plans"] and row.plan:
+                for line in row.plan.splitlines():
+                    self.stdout.write(f"      {line}")
+            self.stdout.write("")
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.policy import PolicyError, apply_diff, diff_policy, load_policy
+
+
+class Command(BaseCommand):
+    help = (
+        "Brings roles, business elements and access rules in line with the policy file "
+        "(ACCESS_POLICY_FILE), writing only what differs in one transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", help="Policy file to apply (default: ACCESS_POLICY_FILE)")
+        parser.add_argument("--dry-run", action="store_true", help="Only print what would change")
+        parser.add_argument("--prune", action="store_true",
+                            help="Also delete rules for roles or elements the policy does not declare")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rules per upsert (default: 1000)")
+
+    def handle(self, *args, **options):
+        try:
+            policy = load_policy(options["file"])
+        except (OSError, PolicyError) as exc:
+            raise CommandError(f"Cannot load the policy: {exc}")
+
+        diff = diff_policy(policy)
+        prune = options["prune"]
+        if options["dry_run"] or options["verbosity"] > 1:
+            for line in diff.describe(prune=prune):
+                self.stdout.write(line)
+        if not diff and not (prune and diff.stale_rules):
+            self.stdout.write("Policy already in sync")
+            return
+        if options["dry_run"]:
+            self.stdout.write(f"Dry run: {diff.summary(prune=prune)}")
+            return
+
+        written, deleted = apply_diff(diff, prune=prune, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Policy applied: {len(diff.new_roles)} roles and {len(diff.new_elements)} elements created, "
+            f"{written} rules written, {deleted} deleted"
+        ))
@@ -0,0 +1,241 @@
+"""
+Prometheus metrics shared by all worker processes.
+
+Every process writes its samples to its own file `<pid>.db` in
+METRICS["DIR"], updating each value in place through mmap. An update takes
+a process-local lock and writes one float, with no I/O or cross-process
+locking. `/metrics` adds up the files of all processes, including exited
+ones, so counters never go backwards when a worker is replaced. Empty the
+directory when the server (not a worker) starts, e.g. in gunicorn's
+`on_starting` hook.
+
+File layout (little-endian): uint64 bytes in use, then entries of uint32
+key length, the JSON key [sample name, [[label, value], ...]] padded to 8
+bytes, and a float64 value. The length header is written after the entry,
+so readers never see a partial one.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+
+USED = struct.Struct("<Q")
+KEY_LENGTH = struct.Struct("<I")
+VALUE = struct.Struct("<d")
+INITIAL_SIZE = 1 << 16
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+REGISTRY = {}
+
+
+def metrics_dir():
+    return Path(settings.METRICS["DIR"])
+
+
+class _ValueFile:
+    """One process's samples, updated in place through mmap."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "a+b")
+        self._offsets = {}
+        self._values = {}
+        self._used = USED.size
+        if os.fstat(self._file.fileno()).st_size < INITIAL_SIZE:
+            self._file.truncate(INITIAL_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        for key, value, offset in _entries(self._map):
+            self._offsets[key], self._values[key] = offset, value
+            self._used = offset + VALUE.size
+        USED.pack_into(self._map, 0, self._used)
+
+    def add(self, key, amount):
+        offset = self._offsets.get(key)
+        if offset is None:
+            offset = self._append(key)
+        value = self._values[key] + amount
+        self._values[key] = value
+        VALUE.pack_into(self._map, offset, value)
+
+    def _append(self, key):
+        encoded = key.encode()
+        padding = -(KEY_LENGTH.size + len(encoded)) % 8
+        size = KEY_LENGTH.size + len(encoded) + padding + VALUE.size
+        if self._used + size > len(self._map):
+            self._map.close()
+            self._file.truncate(max(2 * (self._used + size), INITIAL_SIZE))
+            self._map = mmap.mmap(self._file.fileno(), 0)
+
+        start = self._used
+        KEY_LENGTH.pack_into(self._map, start, len(encoded))
+        self._map[start + KEY_LENGTH.size:start + KEY_LENGTH.size + len(encoded)] = encoded
+        offset = start + size - VALUE.size
+        VALUE.pack_into(self._map, offset, 0.0)
+        self._used = start + size
+        USED.pack_into(self._map, 0, self._used)
+        self._offsets[key], self._values[key] = offset, 0.0
+        return offset
+
+
+def _entries(data):
+    """(key, value, value offset) of every complete entry in a value file."""
+    if len(data) < USED.size:
+        return
+    used = min(USED.unpack_from(data, 0)[0], len(data))
+    position = USED.size
+    while position + KEY_LENGTH.size <= used:
+        (length,) = KEY_LENGTH.unpack_from(data, position)
+        key_end = position + KEY_LENGTH.size + length
+        offset = key_end + (-(KEY_LENGTH.size + length) % 8)
+        if offset + VALUE.size > used:
+            return
+        yield bytes(data[position + KEY_LENGTH.size:key_end]).decode(), VALUE.unpack_from(data, offset)[0], offset
+        position = offset + VALUE.size
+
+
+_lock = threading.Lock()
+_file = None  # (pid, directory, _ValueFile) of this process
+
+
+def _add(name, labels, amount):
+    global _file
+    key = json.dumps([name, labels])
+    with _lock:
+        directory = metrics_dir()
+        # A forked worker must not write into its parent's file
+        if _file is None or _file[0] != os.getpid() or _file[1] != directory:
+            directory.mkdir(parents=True, exist_ok=True)
+            _file = (os.getpid(), directory, _ValueFile(directory / f"{os.getpid()}.db"))
+        _file[2].add(key, amount)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY[name] = self
+
+    def _labels(self, labels):
+        return [[name, str(labels[name])] for name in self.labelnames]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        if settings.METRICS["ENABLED"]:
+            _add(self.name + "_total", self._labels(labels), amount)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(float(bound) for bound in buckets) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        if not settings.METRICS["ENABLED"]:
+            return
+        labels = self._labels(labels)
+        bound = next(bound for bound in self.buckets if value <= bound)
+        # Buckets are stored per bound and made cumulative when rendered
+        _add(self.name + "_bucket", labels + [["le", _format(bound)]], 1)
+        _add(self.name + "_sum", labels, value)
+        _add(self.name + "_count", labels, 1)
+
+
+def _format(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _sample(name, labels, value):
+    if labels:
+        rendered = ",".join(f'{label}="{_escape(text)}"' for label, text in labels)
+        return f"{name}{{{rendered}}} {_format(value)}"
+    return f"{name} {_format(value)}"
+
+
+def collect():
+    """{(sample name, labels tuple): value} added up over the files of all processes."""
+    totals = defaultdict(float)
+    directory = metrics_dir()
+    if not directory.exists():
+        return totals
+    for path in directory.glob("*.db"):
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            continue
+        for key, value, _ in _entries(data):
+            name, labels = json.loads(key)
+            totals[name, tuple(tuple(pair) for pair in labels)] += value
+    return totals
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format (0.0.4)."""
+    samples = defaultdict(list)
+    for (name, labels), value in collect().items():
+        samples[name].append((labels, value))
+
+    lines = []
+    for metric in REGISTRY.values():
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        if metric.type == "counter":
+            for labels, value in sorted(samples[metric.name + "_total"]):
+                lines.append(_sample(metric.name + "_total", labels, value))
+            continue
+
+        buckets = defaultdict(dict)
+        for labels, value in samples[metric.name + "_bucket"]:
+            buckets[labels[:-1]][float(labels[-1][1])] = value
+        for labels in sorted(buckets):
+            running = 0
+            for bound in metric.buckets:
+                running += buckets[labels].get(bound, 0)
+                lines.append(_sample(metric.name + "_bucket", labels + (("le", _format(bound)),), running))
+        for suffix in ("_sum", "_count"):
+            for labels, value in sorted(samples[metric.name + suffix]):
+                lines.append(_sample(metric.name + suffix, labels, value))
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency by view and method.", ["view", "method"],
+)
+RESPONSES = Counter(
+    "http_responses", "Responses by view, method and status code.", ["view", "method", "status"],
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "SQL statements run per request.", ["view", "method"], buckets=QUERY_BUCKETS,
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Time spent in SQL statements per request.", ["view", "method"],
+)
+BCRYPT_SECONDS = Histogram(
+    "bcrypt_duration_seconds", "bcrypt password hashing and checking time.", ["operation"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+JWT_DECODE_FAILURES = Counter("jwt_decode_failures", "JWTs rejected on decode.", ["reason"])
+REVOKED_TOKEN_HITS = Counter("revoked_token_hits", "Requests made with a revoked JWT.")
+PERMISSION_DENIALS = Counter(
+    "permission_denials", "Requests denied by RoleBasedPermission.", ["element", "action"],
+)
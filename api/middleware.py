@@ -0,0 +1,442 @@
+import cProfile
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.messages.middleware import MessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.cache import cache
+from django.middleware.csrf import CsrfViewMiddleware
+from rest_framework.permissions import SAFE_METHODS
+
+from . import metrics, profiling, slowqueries, tracing
+from .queries import QueryCounter, QueryRecorder, QueryTimer, get_query_budget
+from .routers import pin_to_primary
+from .utils import decode_jwt
+
+logger = logging.getLogger(__name__)
+
+
+class HybridMiddleware:
+    """
+    Base for middleware that work in sync and async chains alike, so the
+    chain stays async under ASGI and async views are not run through
+    async_to_sync. `__call__` serves sync chains and starts with
+    `if self.async_mode: return self.__acall__(request)`.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+
+class ReadYourWritesMiddleware(HybridMiddleware):
+    """
+    Keeps a client's reads on the primary database for
+    READ_YOUR_WRITES_SECONDS after it performed a write, so it never sees
+    replica lag on its own changes. Write requests are always pinned.
+
+    The catalog snapshot is stale in the same way as a replica, so clients
+    are also tracked when only CATALOG_SNAPSHOT is enabled; pinned clients
+    read the catalog from the database.
+    """
+    cache_prefix = "ryw:"
+
+    @staticmethod
+    def is_enabled():
+        return bool(settings.DATABASE_REPLICAS or settings.CATALOG_SNAPSHOT["ENABLED"])
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.is_enabled():
+            return self.get_response(request)
+
+        key = self.cache_prefix + self.client_key(request)
+        is_write = request.method not in SAFE_METHODS
+        token = pin_to_primary.set(is_write or bool(cache.get(key)))
+        try:
+            response = self.get_response(request)
+        finally:
+            pin_to_primary.reset(token)
+
+        if is_write and response.status_code < 400:
+            cache.set(key, True, settings.READ_YOUR_WRITES_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        if not self.is_enabled():
+            return await self.get_response(request)
+
+        key = self.cache_prefix + self.client_key(request)
+        is_write = request.method not in SAFE_METHODS
+        token = pin_to_primary.set(is_write or bool(await cache.aget(key)))
+        try:
+            response = await self.get_response(request)
+        finally:
+            pin_to_primary.reset(token)
+
+        if is_write and response.status_code < 400:
+            await cache.aset(key, True, settings.READ_YOUR_WRITES_SECONDS)
+        return response
+
+    @staticmethod
+    def client_key(request):
+        """The JWT user id when present, otherwise the client address."""
+        auth_header = request.headers.get("Authorization", "")
+        prefix, _, token = auth_header.partition(" ")
+        if prefix.lower() == "bearer" and token:
+            payload = decode_jwt(token)
+            if payload and "user_id" in payload:
+                return f"user:{payload['user_id']}"
+        return f"addr:{request.META.get('REMOTE_ADDR', '')}"
+
+
+class QueryCountMiddleware(HybridMiddleware):
+    """
+    Reports the number of SQL statements a request ran in the X-DB-Queries
+    response header when QUERY_COUNT_HEADER is on (used by the benchmarks).
+    """
+    header = "X-DB-Queries"
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.QUERY_COUNT_HEADER:
+            return self.get_response(request)
+
+        with QueryCounter().track() as counter:
+            response = self.get_response(request)
+        response[self.header] = str(counter.count)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.QUERY_COUNT_HEADER:
+            return await self.get_response(request)
+
+        with QueryCounter().track() as counter:
+            response = await self.get_response(request)
+        response[self.header] = str(counter.count)
+        return response
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryBudgetMiddleware(HybridMiddleware):
+    """
+    Checks each request against the QueryBudget its view declares in
+    `query_budgets` (see api.queries). Over-budget requests are logged as a
+    warning with their query fingerprints, for a QUERY_BUDGETS["SAMPLE_RATE"]
+    share of them. With QUERY_BUDGETS["RAISE"] (the test settings), going
+    over the query count raises QueryBudgetExceeded instead, so the test
+    making the request fails. DB time depends on the machine and is only
+    logged.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.QUERY_BUDGETS["ENABLED"]:
+            return self.get_response(request)
+
+        with QueryRecorder().track() as recorder:
+            response = self.get_response(request)
+        self.check(request, recorder)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.QUERY_BUDGETS["ENABLED"]:
+            return await self.get_response(request)
+
+        with QueryRecorder().track() as recorder:
+            response = await self.get_response(request)
+        self.check(request, recorder)
+        return response
+
+    @staticmethod
+    def check(request, recorder):
+        config = settings.QUERY_BUDGETS
+        match = getattr(request, "resolver_match", None)
+        budget = match and get_query_budget(match.func, request.method)
+        problems = recorder.over_budget(budget) if budget else []
+        if not problems:
+            return
+
+        endpoint = f"{request.method} {request.path} ({match.view_name})"
+        if config["RAISE"] and budget.queries is not None and recorder.count > budget.queries:
+            raise QueryBudgetExceeded(f"{endpoint} ran {', '.join(problems)}:\n{recorder.report()}")
+        if random.random() < config["SAMPLE_RATE"]:
+            logger.warning(
+                "%s over its query budget: %s\n%s", endpoint, ", ".join(problems),
+                recorder.report(limit=config["REPORT_LIMIT"]),
+            )
+
+
+class SlowQueryMiddleware(HybridMiddleware):
+    """
+    Hands the statements of each request that run over
+    SLOW_QUERIES["THRESHOLD_MS"] to the slow query collector, which
+    aggregates them per fingerprint and view in the background (see
+    api.slowqueries).
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        config = settings.SLOW_QUERIES
+        if not config["ENABLED"]:
+            return self.get_response(request)
+
+        with slowqueries.SlowQueryWatcher(request, config["THRESHOLD_MS"]).track():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        config = settings.SLOW_QUERIES
+        if not config["ENABLED"]:
+            return await self.get_response(request)
+
+        with slowqueries.SlowQueryWatcher(request, config["THRESHOLD_MS"]).track():
+            return await self.get_response(request)
+
+
+class ProfilingMiddleware(HybridMiddleware):
+    """
+    Profiles requests carrying a valid signed X-Profile-Token header, or
+    picked by PROFILING["SAMPLE_RATE"], with cProfile (see api.profiling).
+    The profile id is returned in the X-Profile-Id header. Other requests
+    pass straight through. Keep it last in MIDDLEWARE so the profile covers
+    the view rather than the other middleware.
+
+    cProfile only sees its own thread: in an async chain the profile covers
+    the event loop, so async views are profiled but sync views, which run in
+    a worker thread, only show up as the time awaited.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        profiler = self.start(request)
+        if profiler is None:
+            return self.get_response(request)
+
+        started, clock = time.time(), time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        return self.save(request, response, profiler, started, time.perf_counter() - clock)
+
+    async def __acall__(self, request):
+        profiler = self.start(request)
+        if profiler is None:
+            return await self.get_response(request)
+
+        started, clock = time.time(), time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiler.disable()
+        return self.save(request, response, profiler, started, time.perf_counter() - clock)
+
+    def start(self, request):
+        """An enabled profiler when `request` is to be profiled, else None."""
+        if not self.is_selected(request):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is active in this thread
+            return None
+        return profiler
+
+    @staticmethod
+    def save(request, response, profiler, started, elapsed):
+        profile_id = profiling.new_profile_id()
+        profiling.save_profile(profiler, profile_id, profiling.request_meta(request, response, started, elapsed))
+        response[profiling.ID_HEADER] = profile_id
+        return response
+
+    @staticmethod
+    def is_selected(request):
+        token = request.headers.get(profiling.TOKEN_HEADER)
+        if token is not None:
+            return profiling.token_allows(token, request.path)
+        rate = settings.PROFILING["SAMPLE_RATE"]
+        return rate > 0 and random.random() < rate
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """
+    Records latency, status code, query count and query time of every
+    request in api.metrics, labelled with the URL name of the view. Place it
+    first in MIDDLEWARE so the latency covers the whole stack.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.METRICS["ENABLED"]:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        with QueryTimer().track() as timer:
+            response = self.get_response(request)
+        self.observe(request, response, timer, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.METRICS["ENABLED"]:
+            return await self.get_response(request)
+
+        started = time.perf_counter()
+        with QueryTimer().track() as timer:
+            response = await self.get_response(request)
+        self.observe(request, response, timer, time.perf_counter() - started)
+        return response
+
+    @staticmethod
+    def observe(request, response, timer, elapsed):
+        match = getattr(request, "resolver_match", None)
+        labels = {"view": match.view_name if match else "unmatched", "method": request.method}
+        metrics.REQUEST_SECONDS.observe(elapsed, **labels)
+        metrics.RESPONSES.inc(status=response.status_code, **labels)
+        metrics.REQUEST_QUERIES.observe(timer.count, **labels)
+        metrics.REQUEST_DB_SECONDS.observe(timer.db_ms / 1000, **labels)
+
+
+class TracingMiddleware(HybridMiddleware):
+    """
+    Traces sampled requests (see api.tracing). It continues the trace of an
+    inbound `traceparent` header and returns the request span's context in
+    the `traceresponse` header. Place it first in MIDDLEWARE so the request
+    span covers the whole stack.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        root = self.start(request)
+        if root is None:
+            return self.get_response(request)
+
+        with tracing.activate(root), tracing.trace_queries():
+            try:
+                response = self.get_response(request)
+            except Exception as exc:
+                root.error = f"{type(exc).__name__}: {exc}"
+                self.finish(request, root)
+                raise
+        return self.finish(request, root, response)
+
+    async def __acall__(self, request):
+        root = self.start(request)
+        if root is None:
+            return await self.get_response(request)
+
+        with tracing.activate(root), tracing.trace_queries():
+            try:
+                response = await self.get_response(request)
+            except Exception as exc:
+                root.error = f"{type(exc).__name__}: {exc}"
+                self.finish(request, root)
+                raise
+        return self.finish(request, root, response)
+
+    @staticmethod
+    def start(request):
+        """The request span when tracing is on and the request is sampled, else None."""
+        if not settings.TRACING["ENABLED"]:
+            return None
+        return tracing.start_request_span(
+            request.headers.get("traceparent"),
+            request.method,
+            {"http.request.method": request.method, "url.path": request.path},
+        )
+
+    @staticmethod
+    def finish(request, root, response=None):
+        match = getattr(request, "resolver_match", None)
+        if match is not None:
+            # The span is named after the route template, not the path with ids in it
+            route = tracing.route_template(match.route)
+            root.name = f"{request.method} {route}"
+            root.attributes["http.route"] = route
+        if response is not None:
+            root.attributes["http.response.status_code"] = response.status_code
+            if response.status_code >= 500:
+                root.error = f"HTTP {response.status_code}"
+        root.finish()
+        tracing.export(root)
+        if response is not None:
+            response["traceresponse"] = f"00-{root.trace_id}-{root.span_id}-01"
+        return response
+
+
+def is_lean_path(request):
+    """True for requests under LEAN_PATH_PREFIXES, which authenticate with JWT only."""
+    return request.path_info.startswith(settings.LEAN_PATH_PREFIXES)
+
+
+class LeanSessionMiddleware(SessionMiddleware):
+    """SessionMiddleware that neither loads nor saves sessions on lean paths."""
+
+    def process_request(self, request):
+        if not is_lean_path(request):
+            super().process_request(request)
+
+    def process_response(self, request, response):
+        if is_lean_path(request):
+            return response
+        return super().process_response(request, response)
+
+
+class LeanCsrfViewMiddleware(CsrfViewMiddleware):
+    """CsrfViewMiddleware without CSRF cookies or checks on lean paths (no cookie auth there)."""
+
+    def process_request(self, request):
+        if not is_lean_path(request):
+            super().process_request(request)
+
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        if is_lean_path(request):
+            return None
+        return super().process_view(request, callback, callback_args, callback_kwargs)
+
+    def process_response(self, request, response):
+        if is_lean_path(request):
+            return response
+        return super().process_response(request, response)
+
+
+class LeanAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    AuthenticationMiddleware that leaves request.user to DRF's
+    authentication classes on lean paths.
+    """
+
+    def process_request(self, request):
+        if not is_lean_path(request):
+            super().process_request(request)
+
+
+class LeanMessageMiddleware(MessageMiddleware):
+    """MessageMiddleware without message storage on lean paths."""
+
+    def process_request(self, request):
+        if not is_lean_path(request):
+            super().process_request(request)
+
+    def process_response(self, request, response):
+        if is_lean_path(request):
+            return response
+        return super().process_response(request, response)
@@ -0,0 +1,105 @@
+"""
+Converts api_order into a table range-partitioned by created_at month
+(PostgreSQL only; other backends keep the plain table).
+
+The partition key has to be part of the primary key, so the table's
+primary key becomes (id, created_at). Django keeps treating `id` as the
+primary key; ids still come from a sequence and stay unique.
+"""
+from datetime import date, datetime, timezone
+
+from django.db import migrations
+from django.utils import timezone as django_timezone
+
+# Months of future partitions created up front
+MONTHS_AHEAD = 3
+
+
+def _add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _bound(month):
+    return datetime(month.year, month.month, 1, tzinfo=timezone.utc).isoformat()
+
+
+def partition_orders(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        # The row copy is one statement; DB_STATEMENT_TIMEOUT_MS is meant for requests
+        cursor.execute("SET LOCAL statement_timeout = 0")
+        cursor.execute("LOCK TABLE api_order IN ACCESS EXCLUSIVE MODE")
+        cursor.execute("ALTER TABLE api_order RENAME TO api_order_unpartitioned")
+        cursor.execute(
+            "CREATE TABLE api_order (LIKE api_order_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            "PARTITION BY RANGE (created_at)"
+        )
+        cursor.execute("CREATE SEQUENCE api_order_partitioned_id_seq OWNED BY api_order.id")
+        cursor.execute("ALTER TABLE api_order ALTER COLUMN id SET DEFAULT nextval('api_order_partitioned_id_seq')")
+        cursor.execute(
+            "SELECT setval('api_order_partitioned_id_seq', COALESCE(MAX(id), 0) + 1, false) FROM api_order_unpartitioned"
+        )
+        cursor.execute("ALTER TABLE api_order ADD PRIMARY KEY (id, created_at)")
+        for column, target in (("product_id", "api_product"), ("user_id", "api_user"), ("owner_id", "api_user")):
+            cursor.execute(
+                f"ALTER TABLE api_order ADD CONSTRAINT api_order_{column}_fk "
+                f"FOREIGN KEY ({column}) REFERENCES {target} (id) DEFERRABLE INITIALLY DEFERRED"
+            )
+            cursor.execute(f"CREATE INDEX api_order_{column}_idx ON api_order ({column})")
+        cursor.execute("CREATE INDEX api_order_created_at_idx ON api_order (created_at DESC)")
+        cursor.execute("CREATE INDEX api_order_status_created_idx ON api_order (status, created_at DESC)")
+
+        cursor.execute("SELECT MIN(created_at) FROM api_order_unpartitioned")
+        oldest = cursor.fetchone()[0]
+        today = django_timezone.now().date()
+        month = date(oldest.year, oldest.month, 1) if oldest else date(today.year, today.month, 1)
+        last = _add_months(date(today.year, today.month, 1), MONTHS_AHEAD)
+        while month <= last:
+            cursor.execute(
+                f"CREATE TABLE api_order_p{month:%Y%m} PARTITION OF api_order "
+                f"FOR VALUES FROM ('{_bound(month)}') TO ('{_bound(_add_months(month, 1))}')"
+            )
+            month = _add_months(month, 1)
+        cursor.execute("CREATE TABLE api_order_default PARTITION OF api_order DEFAULT")
+
+        cursor.execute("INSERT INTO api_order SELECT * FROM api_order_unpartitioned")
+        cursor.execute("DROP TABLE api_order_unpartitioned")
+
+
+def unpartition_orders(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        # The row copy is one statement; DB_STATEMENT_TIMEOUT_MS is meant for requests
+        cursor.execute("SET LOCAL statement_timeout = 0")
+        cursor.execute("LOCK TABLE api_order IN ACCESS EXCLUSIVE MODE")
+        cursor.execute("ALTER TABLE api_order RENAME TO api_order_partitioned")
+        cursor.execute(
+            "CREATE TABLE api_order (LIKE api_order_partitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+        cursor.execute("ALTER SEQUENCE api_order_partitioned_id_seq OWNED BY api_order.id")
+        cursor.execute("INSERT INTO api_order SELECT * FROM api_order_partitioned")
+        cursor.execute("DROP TABLE api_order_partitioned CASCADE")
+        cursor.execute("ALTER TABLE api_order ADD PRIMARY KEY (id)")
+        for column, target in (("product_id", "api_product"), ("user_id", "api_user"), ("owner_id", "api_user")):
+            cursor.execute(
+                f"ALTER TABLE api_order ADD CONSTRAINT api_order_{column}_fk "
+                f"FOREIGN KEY ({column}) REFERENCES {target} (id) DEFERRABLE INITIALLY DEFERRED"
+            )
+            cursor.execute(f"CREATE INDEX api_order_{column}_idx ON api_order ({column})")
+
+
+class Migration(migrations.Migration):
+    atomic = True
+
+    dependencies = [
+        ("api", "0009_changelogentry"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_orders, unpartition_orders),
+    ]
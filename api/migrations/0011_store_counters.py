@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:19
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Store = apps.get_model("api", "Store")
+    Product = apps.get_model("api", "Product")
+    Order = apps.get_model("api", "Order")
+    products = Product._base_manager.filter(store=OuterRef("pk")).order_by().values("store")
+    orders = (
+        Order._base_manager.filter(product__store=OuterRef("pk"))
+        .exclude(status="cancelled")
+        .order_by()
+        .values("product__store")
+    )
+    Store._base_manager.using(schema_editor.connection.alias).update(
+        product_count=Coalesce(Subquery(products.annotate(n=Count("pk")).values("n")), 0),
+        active_product_count=Coalesce(
+            Subquery(products.filter(is_active=True).annotate(n=Count("pk")).values("n")), 0
+        ),
+        order_revenue=Coalesce(
+            Subquery(orders.annotate(total=Sum("total_price")).values("total")),
+            Value(Decimal("0")),
+            output_field=models.DecimalField(max_digits=14, decimal_places=2),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_partition_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='store',
+            name='active_product_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='archived_order_revenue',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='order_revenue',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='product_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
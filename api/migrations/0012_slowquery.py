@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:46
+
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_store_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('fingerprint', models.TextField()),
+                ('sample_sql', models.TextField()),
+                ('sample_params', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('database', models.CharField(max_length=100)),
+                ('view', models.CharField(max_length=200)),
+                ('action', models.CharField(blank=True, max_length=50)),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('total_ms', models.FloatField(default=0)),
+                ('max_ms', models.FloatField(default=0)),
+                ('first_seen', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_seen', models.DateTimeField(default=django.utils.timezone.now)),
+                ('plan', models.TextField(blank=True)),
+                ('plan_captured_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-total_ms'],
+            },
+        ),
+    ]
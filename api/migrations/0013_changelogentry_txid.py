@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_slowquery'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='changelogentry',
+            options={'ordering': ['txid', 'id']},
+        ),
+        migrations.RemoveIndex(
+            model_name='changelogentry',
+            name='api_changel_owner_i_5f4245_idx',
+        ),
+        migrations.AddField(
+            model_name='changelogentry',
+            name='txid',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='changelogentry',
+            index=models.Index(fields=['txid', 'id'], name='api_changel_txid_99bfe1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='changelogentry',
+            index=models.Index(fields=['owner_id', 'txid', 'id'], name='api_changel_owner_i_585d24_idx'),
+        ),
+    ]
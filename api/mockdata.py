@@ -0,0 +1,217 @@
+"""
+Generated data behind the /api/mock/ endpoints.
+
+MockDataset generates MOCK_DATA["USERS"] users, ["STORES"] stores and
+["PRODUCTS"] products from MOCK_DATA["SEED"], so every worker serves the
+same rows. Each attribute is a column in an `array`; names, emails and
+addresses are rendered from the row's id and small word lists when a row
+is served, so a million products take a few tens of megabytes.
+
+Ownership is skewed as in api.seeding: a few users own most stores, and a
+few stores list most products. Products belong to their store's owner.
+Stores are numbered in owner order and products in store order, so the
+rows of one owner are a contiguous id range. `*_offsets[owner]` is where
+that range starts (CSR layout), and an owner-scoped read is a slice, just
+like a read of everything.
+
+Reads return MockRows, a lazy sequence that renders only the rows sliced
+out of it, so DRF's paginators only render the requested page.
+"""
+import math
+import random
+import threading
+from array import array
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+from .seeding import FIRST_NAMES, LAST_NAMES
+
+ROLES = ("Admin", "Moderator", "User", "Guest")
+ADJECTIVES = ("Compact", "Classic", "Smart", "Rugged", "Premium", "Basic", "Wireless", "Portable")
+NOUNS = ("Laptop", "Phone", "Headphones", "Monitor", "Keyboard", "Camera", "Speaker", "Tablet")
+STREETS = ("Main St", "Mall Rd", "Oak Ave", "Market Sq", "River Rd", "Station St", "Park Ln", "Hill St")
+FAKE_HASH = "$2b$12$mockmockmockmockmockmu"  # not a usable bcrypt hash
+
+EPOCH = int(datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp())
+SPAN = 365 * 86400
+
+
+def _timestamp(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _offsets(counts):
+    """CSR offsets: rows of key k (1-based) are [offsets[k - 1], offsets[k])."""
+    offsets = array("q", [0])
+    for count in counts:
+        offsets.append(offsets[-1] + count)
+    return offsets
+
+
+class MockDataset:
+    def __init__(self, users, stores, products, seed=0, skew=3.0):
+        rng = random.Random(seed)
+        users = max(users, 1)
+        stores = max(stores, 1 if products else 0)  # products need a store
+
+        def pick(n):
+            """Index in range(n), skewed towards 0."""
+            return min(int(n * rng.random() ** skew), n - 1)
+
+        # Users: id i + 1. The first one is the Admin, 1% are Moderators, 5% Guests
+        self.user_role = array("B", [0])
+        self.user_first = array("B", [0])
+        self.user_last = array("B", [0])
+        self.user_joined = array("q", [EPOCH])
+        for _ in range(users - 1):
+            point = rng.random()
+            self.user_role.append(1 if point < 0.01 else 3 if point < 0.06 else 2)
+            self.user_first.append(rng.randrange(len(FIRST_NAMES)))
+            self.user_last.append(rng.randrange(len(LAST_NAMES)))
+            self.user_joined.append(EPOCH + rng.randrange(SPAN))
+
+        # Stores: counted per owner, then laid out in owner order
+        per_owner = array("q", bytes(8 * users))
+        for _ in range(stores):
+            per_owner[pick(users)] += 1
+        self.store_offsets = _offsets(per_owner)
+        self.store_owner = array("q")
+        for owner, count in enumerate(per_owner, 1):
+            self.store_owner.extend([owner] * count)
+
+        # Products: counted per store, then laid out in store (and so owner) order
+        per_store = array("q", bytes(8 * stores))
+        for _ in range(products):
+            per_store[pick(stores)] += 1
+        self.product_store = array("q")
+        for store, count in enumerate(per_store, 1):
+            self.product_store.extend([store] * count)
+        self.product_offsets = _offsets(
+            sum(per_store[self.store_offsets[owner]:self.store_offsets[owner + 1]]) for owner in range(users)
+        )
+        self.product_price = array("q")
+        self.product_active = array("b")
+        self.product_created = array("q")
+        self.product_kind = array("B")
+        for _ in range(products):
+            self.product_price.append(min(max(50, int(math.exp(rng.gauss(7.0, 1.2)))), 1_000_000))
+            self.product_active.append(rng.random() < 0.95)
+            self.product_created.append(EPOCH + rng.randrange(SPAN))
+            self.product_kind.append(rng.randrange(len(ADJECTIVES) * len(NOUNS)))
+
+    @property
+    def user_count(self):
+        return len(self.user_role)
+
+    # Row renderers, by 0-based row number
+
+    def user_name(self, pk):
+        return f"{FIRST_NAMES[self.user_first[pk - 1]]} {LAST_NAMES[self.user_last[pk - 1]]}"
+
+    def user_row(self, number):
+        pk, role = number + 1, ROLES[self.user_role[number]]
+        return {
+            "id": pk,
+            "full_name": self.user_name(pk),
+            "email": f"user{pk}@mock.example.com",
+            "password_hash": FAKE_HASH,
+            "role": role,
+            "is_active": True,
+            "is_staff": role == "Admin",
+            "is_superuser": role == "Admin",
+            "date_joined": _timestamp(self.user_joined[number]),
+        }
+
+    def store_row(self, number):
+        pk, owner = number + 1, self.store_owner[number]
+        return {
+            "id": pk,
+            "name": f"Store {pk}",
+            "address": f"{pk} {STREETS[pk % len(STREETS)]}",
+            "is_active": True,
+            "owner": owner,
+            "owner_email": f"user{owner}@mock.example.com",
+        }
+
+    def product_row(self, number):
+        pk, store = number + 1, self.product_store[number]
+        owner = self.store_owner[store - 1]
+        adjective, noun = divmod(self.product_kind[number], len(NOUNS))
+        created = _timestamp(self.product_created[number])
+        return {
+            "id": pk,
+            "name": f"{ADJECTIVES[adjective]} {NOUNS[noun]}",
+            "description": f"Mock product {pk}.",
+            "price": self.product_price[number] / 100,
+            "store": store,
+            "store_name": f"Store {store}",
+            "is_active": bool(self.product_active[number]),
+            "owner": owner,
+            "owner_name": self.user_name(owner),
+            "created_at": created,
+            "updated_at": created,
+        }
+
+    # Reads
+
+    def users(self, owner_id=None):
+        """All users, or only `owner_id` itself."""
+        if owner_id is None:
+            return MockRows(self.user_row, 0, self.user_count)
+        if 1 <= owner_id <= self.user_count:
+            return MockRows(self.user_row, owner_id - 1, owner_id)
+        return MockRows(self.user_row, 0, 0)
+
+    def stores(self, owner_id=None):
+        return self._owned(self.store_row, self.store_offsets, len(self.store_owner), owner_id)
+
+    def products(self, owner_id=None):
+        return self._owned(self.product_row, self.product_offsets, len(self.product_store), owner_id)
+
+    def _owned(self, render, offsets, total, owner_id):
+        if owner_id is None:
+            return MockRows(render, 0, total)
+        if 1 <= owner_id <= self.user_count:
+            return MockRows(render, offsets[owner_id - 1], offsets[owner_id])
+        return MockRows(render, 0, 0)
+
+
+class MockRows:
+    """Rows start..stop of a MockDataset column set, rendered when indexed or sliced."""
+
+    def __init__(self, render, start, stop):
+        self.render = render
+        self.range = range(start, stop)
+
+    def __len__(self):
+        return len(self.range)
+
+    def count(self):
+        return len(self.range)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.render(number) for number in self.range[index]]
+        return self.render(self.range[index])
+
+    def __iter__(self):
+        return map(self.render, self.range)
+
+
+_lock = threading.Lock()
+_dataset = None  # (configuration, MockDataset)
+
+
+def get_dataset():
+    """The dataset for the current MOCK_DATA settings, generated on first use."""
+    global _dataset
+    config = settings.MOCK_DATA
+    key = (config["USERS"], config["STORES"], config["PRODUCTS"], config["SEED"])
+    current = _dataset
+    if current is None or current[0] != key:
+        with _lock:
+            current = _dataset
+            if current is None or current[0] != key:
+                current = _dataset = (key, MockDataset(*key))
+    return current[1]
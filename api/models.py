@@ -1,8 +1,11 @@
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
 from django.conf import settings
-import bcrypt
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
+from .utils import hash_password, check_password as check_password_hash, acheck_password as acheck_password_hash
 
 class Role(models.Model):
     ROLE_CHOICES = [
@@ -17,6 +20,16 @@ class Role(models.Model):
     def __str__(self):
         return self.name
 
+class ActiveManager(models.Manager):
+    """
+    Hides soft-deleted (is_active=False) rows. Models keep an unfiltered
+    `all_objects` manager as their default manager, so uniqueness validation
+    and the admin still see every row.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_active=True)
+
 class UserManager(BaseUserManager):
     def create_user(self, email, full_name, password=None, role_name="User"):
         if not email:
@@ -29,7 +42,7 @@ class UserManager(BaseUserManager):
             raise ValueError(f"Role '{role_name}' does not exist")
 
         email = self.normalize_email(email)
-        password_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+        password_hash = hash_password(password)
 
         user = self.model(
             email=email,
@@ -48,6 +61,10 @@ class UserManager(BaseUserManager):
         user.save(using=self._db)
         return user
 
+class ActiveUserManager(UserManager):
+    def get_queryset(self):
+        return super().get_queryset().filter(is_active=True)
+
 
 class User(AbstractBaseUser):
     email = models.EmailField(unique=True)
@@ -62,13 +79,44 @@ class User(AbstractBaseUser):
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["full_name"]
 
-    objects = UserManager()
+    objects = ActiveUserManager()
+    all_objects = UserManager()
+
+    class Meta:
+        default_manager_name = "all_objects"
+        indexes = [
+            models.Index(fields=["email"], condition=Q(is_active=True), name="api_user_active_email_idx"),
+        ]
 
     def __str__(self):
         return f"{self.full_name} ({self.email}) - {self.role.name}"
 
+    def soft_delete(self):
+        """
+        Deactivates the user together with their stores and products (including
+        products listed in their stores), one UPDATE per table.
+        Returns the number of deactivated (stores, products).
+        """
+        with transaction.atomic():
+            self.is_active = False
+            self.save(update_fields=["is_active"])
+            stores = Store.all_objects.filter(owner=self, is_active=True)
+            products = Product.all_objects.filter(Q(owner=self) | Q(store__owner=self), is_active=True)
+            ChangeLogEntry.record_queryset(stores, "update")
+            ChangeLogEntry.record_queryset(products, "update")
+            store_ids = list(products.order_by().values_list("store_id", flat=True).distinct())
+            stores = stores.update(is_active=False)
+            products = products.update(is_active=False, updated_at=timezone.now())
+            # The bulk UPDATE skips the counter signals
+            from .counters import refresh_active_product_counts
+            refresh_active_product_counts(store_ids)
+        return stores, products
+
     def check_password(self, raw_password):
-        return bcrypt.checkpw(raw_password.encode(), self.password_hash.encode())
+        return check_password_hash(raw_password, self.password_hash)
+
+    async def acheck_password(self, raw_password):
+        return await acheck_password_hash(raw_password, self.password_hash)
 
     def has_perm(self, perm, obj=None):
         return self.is_superuser
@@ -102,7 +150,23 @@ class AccessRoleRule(models.Model):
         return f"{self.role.name} → {self.element.name}"
 
 
-class Store(models.Model):
+class ChangeTrackedModel(models.Model):
+    """
+    Base for models published in the change feed. Saves run in one
+    transaction with the ChangeLogEntry written by the post_save receiver
+    (api.changefeed); deletes already do inside Django's collector.
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+
+
+class Store(ChangeTrackedModel):
     """
     Represents a store where products are sold.
     """
@@ -117,11 +181,42 @@ class Store(models.Model):
         blank=True
     )
 
+    # Denormalized counters, kept up to date by api.counters
+    product_count = models.IntegerField(default=0)
+    active_product_count = models.IntegerField(default=0)
+    order_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # orders not cancelled
+    archived_order_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # part of order_revenue
+
+    objects = ActiveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        default_manager_name = "all_objects"
+        indexes = [
+            models.Index(fields=["owner"], condition=Q(is_active=True), name="api_store_active_owner_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
-
-class Product(models.Model):
+    def soft_delete(self):
+        """
+        Deactivates the store together with its products, one UPDATE for the
+        products. Returns the number of deactivated products.
+        """
+        with transaction.atomic():
+            self.is_active = False
+            self.save(update_fields=["is_active"])
+            products = Product.all_objects.filter(store=self, is_active=True)
+            ChangeLogEntry.record_queryset(products, "update")
+            products = products.update(is_active=False, updated_at=timezone.now())
+            # The bulk UPDATE skips the counter signals
+            from .counters import refresh_active_product_counts
+            refresh_active_product_counts([self.pk])
+        return products
+
+
+class Product(ChangeTrackedModel):
     """
     Represents a product belonging to a store.
     Includes ownership so we can check object-level permissions.
@@ -141,14 +236,22 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ActiveManager()
+    all_objects = models.Manager()
+
     class Meta:
         ordering = ['-created_at']
+        default_manager_name = "all_objects"
+        indexes = [
+            models.Index(fields=["owner"], condition=Q(is_active=True), name="api_product_active_owner_idx"),
+            models.Index(fields=["-created_at"], condition=Q(is_active=True), name="api_product_active_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.store.name})"
 
 
-class Order(models.Model):
+class Order(ChangeTrackedModel):
     STATUS_CHOICES = [
         ("pending", "Pending"),
         ("paid", "Paid"),
@@ -202,4 +305,204 @@ class RevokedToken(models.Model):
     revoked_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"RevokedToken({self.token[:20]}...)"
\ No newline at end of file
+        return f"RevokedToken({self.token[:20]}...)"
+
+class DeletionJob(models.Model):
+    """
+    Background deletion of a user or store together with its dependent rows,
+    carried out in bounded batches (see api.jobs).
+    """
+    TARGET_CHOICES = [
+        ("user", "User"),
+        ("store", "Store"),
+    ]
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+    ]
+
+    target_type = models.CharField(max_length=20, choices=TARGET_CHOICES)
+    target_id = models.BigIntegerField()
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        related_name="+",
+        null=True,
+        blank=True
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    rows_total = models.PositiveBigIntegerField(default=0)
+    rows_deleted = models.PositiveBigIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)  # identifies the runner holding the job
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # renewed by that runner after every batch
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"DeletionJob #{self.id} - {self.target_type} {self.target_id} ({self.status})"
+
+
+class AuditLog(models.Model):
+    """
+    Who changed what. Rows are written in batches by the audit buffer
+    (see api.audit), not in the request that made the change.
+    """
+    ACTION_CHOICES = [
+        ("create", "Create"),
+        ("update", "Update"),
+        ("delete", "Delete"),
+        ("bulk_update", "Bulk update"),
+    ]
+
+    # Plain ids so the trail outlives the users and objects it refers to
+    actor_id = models.BigIntegerField(null=True, blank=True)
+    model = models.CharField(max_length=100)
+    object_id = models.CharField(max_length=64)
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES)
+    changes = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)  # time of the change, not of the flush
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=["model", "object_id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.action} {self.model}#{self.object_id} by {self.actor_id}"
+
+
+class ChangeLogEntry(models.Model):
+    """
+    Log of Product, Store and Order changes, read in (txid, id) order through
+    /api/changes/?since=<txid>-<id>.
+
+    On PostgreSQL, txid is the id of the writing transaction. Ids are taken
+    before commit, so a lower id can become visible after a higher one; the
+    feed therefore only serves entries of transactions older than the
+    reader's snapshot xmin (see `visibility_horizon`), which have all ended,
+    and a transaction committing later always sorts after them. Other
+    databases serialize writers, so txid is 0 and entries are read in id
+    order.
+    """
+    ENTITY_CHOICES = [
+        ("product", "Product"),
+        ("store", "Store"),
+        ("order", "Order"),
+    ]
+    OPERATION_CHOICES = [
+        ("create", "Create"),
+        ("update", "Update"),
+        ("delete", "Delete"),
+        ("archive", "Archive"),  # orders moved to the cold archive (api.archive)
+    ]
+    ENTITY_TYPES = {"api.product": "product", "api.store": "store", "api.order": "order"}
+
+    entity_type = models.CharField(max_length=20, choices=ENTITY_CHOICES)
+    entity_id = models.BigIntegerField()
+    operation = models.CharField(max_length=10, choices=OPERATION_CHOICES)
+    owner_id = models.BigIntegerField(null=True, blank=True)  # for owner-scoped reads
+    txid = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['txid', 'id']
+        indexes = [
+            models.Index(fields=["txid", "id"]),
+            models.Index(fields=["owner_id", "txid", "id"]),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.operation} {self.entity_type} {self.entity_id}"
+
+    @staticmethod
+    def _txid_sql(using):
+        if connections[using].vendor == "postgresql":
+            return "pg_current_xact_id()::text::bigint"
+        return "0"
+
+    @classmethod
+    def visibility_horizon(cls, using):
+        """
+        Transaction id below which every writer has ended, or None where
+        writers are serialized. Entries with a lower txid never change.
+        """
+        connection = connections[using]
+        if connection.vendor != "postgresql":
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+            return cursor.fetchone()[0]
+
+    @classmethod
+    def visible(cls, entries):
+        """`entries` without those of transactions that may still commit."""
+        horizon = cls.visibility_horizon(entries.db)
+        return entries if horizon is None else entries.filter(txid__lt=horizon)
+
+    @staticmethod
+    def after(txid, id):
+        """Filter for entries past the (txid, id) cursor."""
+        return models.Q(txid__gt=txid) | models.Q(txid=txid, id__gt=id)
+
+    @classmethod
+    def record(cls, instance, operation, using):
+        cls.objects.using(using).create(
+            entity_type=cls.ENTITY_TYPES[instance._meta.label_lower],
+            entity_id=instance.pk,
+            operation=operation,
+            owner_id=instance.owner_id,
+            txid=RawSQL(cls._txid_sql(using), []),
+        )
+
+    @classmethod
+    def record_queryset(cls, queryset, operation):
+        """
+        Logs `operation` for every row of `queryset` with a single
+        INSERT ... SELECT, for bulk updates that bypass signals. Call it inside
+        the transaction of the bulk change.
+        """
+        using = queryset.db
+        source = queryset.order_by().values(change_entity_id=models.F("pk"), change_owner_id=models.F("owner_id"))
+        source_sql, source_params = source.query.sql_with_params()
+        table = connections[using].ops.quote_name(cls._meta.db_table)
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (entity_type, operation, created_at, txid, entity_id, owner_id) "
+                f"SELECT %s, %s, %s, {cls._txid_sql(using)}, src.change_entity_id, src.change_owner_id "
+                f"FROM ({source_sql}) src",
+                [cls.ENTITY_TYPES[queryset.model._meta.label_lower], operation, timezone.now(), *source_params],
+            )
+            return cursor.rowcount
+
+
+class SlowQuery(models.Model):
+    """
+    Statements that ran over SLOW_QUERIES["THRESHOLD_MS"], aggregated per
+    fingerprint and originating view (see api.slowqueries).
+    """
+    key = models.CharField(max_length=64, unique=True)  # sha256 of view, action and fingerprint
+    fingerprint = models.TextField()
+    sample_sql = models.TextField()  # latest slow execution with its parameters, with STORE_SAMPLES only
+    sample_params = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    database = models.CharField(max_length=100)
+    view = models.CharField(max_length=200)
+    action = models.CharField(max_length=50, blank=True)
+    count = models.PositiveBigIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    first_seen = models.DateTimeField(default=timezone.now)
+    last_seen = models.DateTimeField(default=timezone.now)
+    plan = models.TextField(blank=True)
+    plan_captured_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-total_ms']
+
+    def __str__(self):
+        return f"{self.view} {self.action}: {self.count}x {self.fingerprint[:60]}"
@@ -0,0 +1,94 @@
+"""
+Monthly range partitions of the Order table (PostgreSQL only).
+
+`api_order` is partitioned by `created_at`. Each month lives in
+`api_order_pYYYYMM`, and rows outside every month partition land in
+`api_order_default`. The `manage_order_partitions` command keeps partitions
+created ahead of time, splits months out of the default partition and
+detaches old ones.
+"""
+from datetime import date, datetime, timezone
+
+ORDER_TABLE = "api_order"
+DEFAULT_PARTITION = f"{ORDER_TABLE}_default"
+
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def partition_name(month):
+    return f"{ORDER_TABLE}_p{month:%Y%m}"
+
+
+def _bound(month):
+    return datetime(month.year, month.month, 1, tzinfo=timezone.utc).isoformat()
+
+
+def is_partitioned(cursor):
+    cursor.execute(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = %s",
+        [ORDER_TABLE],
+    )
+    return cursor.fetchone() is not None
+
+
+def month_partitions(cursor):
+    """Attached month partitions as {month: name}."""
+    cursor.execute(
+        """
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = %s
+        """,
+        [ORDER_TABLE],
+    )
+    partitions = {}
+    prefix = f"{ORDER_TABLE}_p"
+    for (name,) in cursor.fetchall():
+        if name.startswith(prefix) and name[len(prefix):].isdigit():
+            stamp = name[len(prefix):]
+            partitions[date(int(stamp[:4]), int(stamp[4:]), 1)] = name
+    return partitions
+
+
+def default_partition_months(cursor):
+    """Months that have rows in the default partition, oldest first."""
+    cursor.execute(
+        f"SELECT DISTINCT date_trunc('month', created_at AT TIME ZONE 'UTC') FROM {DEFAULT_PARTITION} ORDER BY 1"
+    )
+    return [month.date() for (month,) in cursor.fetchall()]
+
+
+def create_month_partition(cursor, month):
+    """
+    Creates the partition for `month`. Rows of that month already sitting in
+    the default partition are moved into it in the same transaction.
+    """
+    name = partition_name(month)
+    lower, upper = _bound(month), _bound(add_months(month, 1))
+
+    cursor.execute(f"ALTER TABLE {ORDER_TABLE} DETACH PARTITION {DEFAULT_PARTITION}")
+    # DDL cannot take bind parameters; the bounds are generated above
+    cursor.execute(f"CREATE TABLE {name} PARTITION OF {ORDER_TABLE} FOR VALUES FROM ('{lower}') TO ('{upper}')")
+    cursor.execute(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= %s AND created_at < %s RETURNING *) "
+        f"INSERT INTO {ORDER_TABLE} SELECT * FROM moved",
+        [lower, upper],
+    )
+    cursor.execute(f"ALTER TABLE {ORDER_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT")
+    return name
+
+
+def detach_month_partition(cursor, month):
+    """Detaches the partition for `month`; the table itself is kept."""
+    name = partition_name(month)
+    cursor.execute(f"ALTER TABLE {ORDER_TABLE} DETACH PARTITION {name}")
+    return name
@@ -1,11 +1,14 @@
 from rest_framework.permissions import BasePermission
+from .metrics import PERMISSION_DENIALS
 from .models import AccessRoleRule, BusinessElement, Role
+from .tracing import traced
 
 class CanAccessAccessRules(BasePermission):
     """
     Allow Admin always, or roles explicitly given permission for Access Rules.
     """
 
+    @traced()
     def has_permission(self, request, view):
         user = request.user
         if not user or not user.is_authenticated:
@@ -21,6 +24,16 @@ class CanAccessAccessRules(BasePermission):
         except (BusinessElement.DoesNotExist, AccessRoleRule.DoesNotExist):
             return False
 
+class IsAdminRole(BasePermission):
+    """
+    Allow only users with the Admin role (operational endpoints).
+    """
+
+    @traced()
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and user.role.name == "Admin")
+
 class RoleBasedPermission(BasePermission):
 
     action_map = {
@@ -32,6 +45,26 @@ class RoleBasedPermission(BasePermission):
         'destroy': ('delete_permission', 'delete_all_permission'),
     }
 
+    def get_rule(self, request, element_name):
+        """
+        The user's rule for the element, or None. Looked up once per request,
+        since object-level checks follow the view-level one.
+        """
+        rules = getattr(request, "_access_rules", None)
+        if rules is None:
+            rules = request._access_rules = {}
+        if element_name not in rules:
+            rules[element_name] = AccessRoleRule.objects.filter(
+                role=request.user.role, element__name=element_name
+            ).first()
+        return rules[element_name]
+
+    @staticmethod
+    def deny(view):
+        PERMISSION_DENIALS.inc(element=view.business_element, action=getattr(view, 'action', None) or "unknown")
+        return False
+
+    @traced()
     def has_permission(self, request, view):
         user = request.user
 
@@ -46,14 +79,13 @@ class RoleBasedPermission(BasePermission):
         if user.role.name == "Admin":
             return True
 
-        try:
-            rule = AccessRoleRule.objects.get(role=user.role, element__name=element_name)
-        except AccessRoleRule.DoesNotExist:
-            return False
+        rule = self.get_rule(request, element_name)
+        if rule is None:
+            return self.deny(view)
 
         action = getattr(view, 'action', None)
         if not action or action not in self.action_map:
-            return False
+            return self.deny(view)
 
         permission_field, all_permission_field = self.action_map[action]
 
@@ -62,6 +94,7 @@ class RoleBasedPermission(BasePermission):
 
         return True
 
+    @traced()
     def has_object_permission(self, request, view, obj):
         """
         Object-level permission check for ownership.
@@ -77,14 +110,13 @@ class RoleBasedPermission(BasePermission):
         if user.role.name == "Admin":
             return True
 
-        try:
-            rule = AccessRoleRule.objects.get(role=user.role, element__name=element_name)
-        except AccessRoleRule.DoesNotExist:
-            return False
+        rule = self.get_rule(request, element_name)
+        if rule is None:
+            return self.deny(view)
 
         action = getattr(view, 'action', None)
         if not action or action not in self.action_map:
-            return False
+            return self.deny(view)
 
         permission_field, all_permission_field = self.action_map[action]
 
@@ -92,10 +124,11 @@ class RoleBasedPermission(BasePermission):
             return True
 
         if permission_field and getattr(rule, permission_field, False):
-            if hasattr(obj, 'owner') and obj.owner == user:
+            # Compare the raw FK so the owner row is never fetched
+            if hasattr(obj, 'owner_id') and obj.owner_id == user.pk:
                 return True
 
-        return False
+        return self.deny(view)
 
 class MockRoleBasedPermission(BasePermission):
     """
@@ -103,6 +136,7 @@ class MockRoleBasedPermission(BasePermission):
     Returns the rule object, the view can filter the mock list.
     """
 
+    @traced()
     def has_permission(self, request, view):
         user_role = getattr(request.user, "role_id", None)
         if not user_role:
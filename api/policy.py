@@ -0,0 +1,227 @@
+"""
+Access policy as code.
+
+The roles, business elements and access rules live in one file
+(ACCESS_POLICY_FILE, api/policy.json by default):
+
+    {
+      "roles": ["Admin", "Guest"],
+      "elements": ["Products", "Orders"],
+      "rules": {
+        "Admin": {"*": ["read", "read_all", "create", "update", "update_all", "delete", "delete_all"]},
+        "Guest": {"*": ["read"], "Orders": []}
+      }
+    }
+
+Every role gets a rule for every element. The permissions listed for an
+element, or else for "*", are granted and all others are not, so a role
+without rules can do nothing. Files ending in .yaml/.yml are read with
+PyYAML when it is installed.
+
+`manage.py sync_policy` compares the policy with the database and writes
+only the difference, in one transaction: missing roles and elements with
+one INSERT each, and new or changed rules with batched upserts.
+"""
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+
+from . import audit
+from .models import AccessRoleRule, BusinessElement, Role
+
+PERMISSIONS = ("read", "read_all", "create", "update", "update_all", "delete", "delete_all")
+PERMISSION_FIELDS = tuple(f"{name}_permission" for name in PERMISSIONS)
+
+
+class PolicyError(ValueError):
+    pass
+
+
+class Policy:
+    def __init__(self, roles, elements, rules):
+        self.roles = roles
+        self.elements = elements
+        self.rules = rules  # {(role, element): (flag per PERMISSION_FIELDS)}
+
+    @classmethod
+    def from_dict(cls, data):
+        if not isinstance(data, dict):
+            raise PolicyError("The policy must be an object with roles, elements and rules")
+        roles = _names(data, "roles")
+        elements = _names(data, "elements")
+        granted = data.get("rules", {})
+        if not isinstance(granted, dict):
+            raise PolicyError("rules must map role names to element permissions")
+
+        unknown = set(granted) - set(roles)
+        if unknown:
+            raise PolicyError(f"rules for undeclared roles: {', '.join(sorted(unknown))}")
+        rules = {}
+        declared = set(elements) | {"*"}
+        for role in roles:
+            by_element = granted.get(role, {})
+            unknown = set(by_element) - declared
+            if unknown:
+                raise PolicyError(f"{role}: rules for undeclared elements: {', '.join(sorted(unknown))}")
+            flags = {element: _flags(role, element, permissions) for element, permissions in by_element.items()}
+            default = flags.get("*", _flags(role, "*", []))
+            for element in elements:
+                rules[role, element] = flags.get(element, default)
+        return cls(roles, elements, rules)
+
+
+def _flags(role, element, permissions):
+    if not isinstance(permissions, list) or any(name not in PERMISSIONS for name in permissions):
+        raise PolicyError(f"{role} -> {element}: expected a list of {', '.join(PERMISSIONS)}")
+    return tuple(name in permissions for name in PERMISSIONS)
+
+
+def _names(data, key):
+    names = data.get(key)
+    if not isinstance(names, list) or not all(isinstance(name, str) and name for name in names):
+        raise PolicyError(f"{key} must be a list of names")
+    if len(set(names)) != len(names):
+        raise PolicyError(f"{key} contains duplicates")
+    return names
+
+
+def load_policy(path=None):
+    """The Policy in `path` (default: ACCESS_POLICY_FILE)."""
+    path = Path(path or settings.ACCESS_POLICY_FILE)
+    text = path.read_text()
+    if path.suffix in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise PolicyError("Reading YAML policies requires PyYAML") from None
+        data = yaml.safe_load(text)
+    else:
+        try:
+            data = json.loads(text)
+        except ValueError as exc:
+            raise PolicyError(f"{path}: {exc}") from None
+    return Policy.from_dict(data)
+
+
+class PolicyDiff:
+    """What applying a Policy would change. Rules are keyed by (role, element)."""
+
+    def __init__(self, policy, new_roles, new_elements, new_rules, changed_rules, stale_rules):
+        self.policy = policy
+        self.new_roles = new_roles
+        self.new_elements = new_elements
+        self.new_rules = new_rules
+        self.changed_rules = changed_rules  # {(role, element): (old flags, new flags)}
+        self.stale_rules = stale_rules  # {(role, element): id} of rules the policy does not cover
+
+    def __bool__(self):
+        return bool(self.new_roles or self.new_elements or self.new_rules or self.changed_rules)
+
+    def describe(self, prune=False):
+        """Human-readable lines, one per change."""
+        lines = [f"+ role {name}" for name in self.new_roles]
+        lines += [f"+ element {name}" for name in self.new_elements]
+        lines += [f"+ rule {role} -> {element}: {_describe(self.policy.rules[role, element])}"
+                  for role, element in self.new_rules]
+        lines += [f"~ rule {role} -> {element}: {_describe(old)} => {_describe(new)}"
+                  for (role, element), (old, new) in self.changed_rules.items()]
+        if prune:
+            lines += [f"- rule {role} -> {element}" for role, element in self.stale_rules]
+        return lines
+
+    def summary(self, prune=False):
+        parts = [
+            f"{len(self.new_roles)} roles and {len(self.new_elements)} elements to create",
+            f"{len(self.new_rules)} rules to create",
+            f"{len(self.changed_rules)} to update",
+        ]
+        if prune:
+            parts.append(f"{len(self.stale_rules)} to delete")
+        return ", ".join(parts)
+
+
+def _describe(flags):
+    return ", ".join(name for name, granted in zip(PERMISSIONS, flags) if granted) or "none"
+
+
+def diff_policy(policy):
+    """Compares `policy` with the database in three queries."""
+    roles = set(Role.objects.values_list("name", flat=True))
+    elements = set(BusinessElement.objects.values_list("name", flat=True))
+    existing = {
+        (role, element): (pk, tuple(flags))
+        for pk, role, element, *flags in AccessRoleRule.objects.values_list(
+            "pk", "role__name", "element__name", *PERMISSION_FIELDS,
+        ).order_by().iterator(chunk_size=10_000)
+    }
+
+    new_rules, changed_rules = [], {}
+    for key, flags in policy.rules.items():
+        if key not in existing:
+            new_rules.append(key)
+        elif existing[key][1] != flags:
+            changed_rules[key] = (existing[key][1], flags)
+    stale_rules = {key: pk for key, (pk, _) in existing.items() if key not in policy.rules}
+    return PolicyDiff(
+        policy,
+        new_roles=[name for name in policy.roles if name not in roles],
+        new_elements=[name for name in policy.elements if name not in elements],
+        new_rules=new_rules,
+        changed_rules=changed_rules,
+        stale_rules=stale_rules,
+    )
+
+
+def apply_diff(diff, prune=False, batch_size=1000):
+    """
+    Writes `diff` in one transaction. Rules are upserted, so rules created or
+    changed since the diff was taken end up as the policy says. Returns the
+    number of rules written and deleted.
+    """
+    policy = diff.policy
+    with transaction.atomic():
+        Role.objects.bulk_create([Role(name=name) for name in diff.new_roles], ignore_conflicts=True)
+        BusinessElement.objects.bulk_create(
+            [BusinessElement(name=name) for name in diff.new_elements], ignore_conflicts=True,
+        )
+        role_ids = dict(Role.objects.values_list("name", "pk"))
+        element_ids = dict(BusinessElement.objects.values_list("name", "pk"))
+
+        keys = diff.new_rules + list(diff.changed_rules)
+        rules = [
+            AccessRoleRule(
+                role_id=role_ids[role],
+                element_id=element_ids[element],
+                **dict(zip(PERMISSION_FIELDS, policy.rules[role, element])),
+            )
+            for role, element in keys
+        ]
+        AccessRoleRule.objects.bulk_create(
+            rules,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["role", "element"],
+            update_fields=list(PERMISSION_FIELDS),
+        )
+
+        deleted = 0
+        if prune and diff.stale_rules:
+            stale = list(diff.stale_rules.values())
+            for start in range(0, len(stale), batch_size):
+                deleted += AccessRoleRule.objects.filter(pk__in=stale[start:start + batch_size]).delete()[0]
+
+        # The upserts bypass signals, so they are audited as one change
+        audit.record(AccessRoleRule, "*", "bulk_update", {
+            "roles_created": diff.new_roles,
+            "elements_created": diff.new_elements,
+            "rules_created": len(diff.new_rules),
+            "rules_updated": len(diff.changed_rules),
+        })
+    return len(rules), deleted
+
+
+def ensure_roles(policy):
+    """Creates the roles of `policy` that are missing, in one INSERT."""
+    Role.objects.bulk_create([Role(name=name) for name in policy.roles], ignore_conflicts=True)
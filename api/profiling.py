@@ -0,0 +1,108 @@
+"""
+On-demand request profiling.
+
+ProfilingMiddleware runs cProfile around the rest of the request
+(authentication, permission checks, ORM and serialization) when the
+request carries a valid signed `X-Profile-Token` header, or when it is
+picked by PROFILING["SAMPLE_RATE"]. Tokens come from
+`manage.py profile_token`. They are signed with SECRET_KEY, expire after
+PROFILING["TOKEN_MAX_AGE"] seconds, and can be limited to a path prefix.
+
+Each profile is stored in PROFILING["DIR"] as `<id>.prof` (pstats
+format), with a `<id>.json` sidecar describing the request, including
+its `X-Request-ID`. Only the
+newest PROFILING["KEEP"] profiles are kept.
+"""
+import io
+import json
+import pstats
+import re
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+
+TOKEN_HEADER = "X-Profile-Token"
+ID_HEADER = "X-Profile-Id"
+SALT = "api.profiling"
+_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def profile_dir():
+    return Path(settings.PROFILING["DIR"])
+
+
+def make_token(path_prefix="/"):
+    """A header value requesting a profile of requests under `path_prefix`."""
+    return signing.dumps({"path": path_prefix}, salt=SALT)
+
+
+def token_allows(token, path):
+    """True when `token` is valid, unexpired and covers `path`."""
+    try:
+        data = signing.loads(token, salt=SALT, max_age=settings.PROFILING["TOKEN_MAX_AGE"])
+    except signing.BadSignature:
+        return False
+    return path.startswith(data.get("path", "/"))
+
+
+def new_profile_id():
+    """
+    Profile ids are always generated here: an id taken from the request
+    would let clients pick file names and overwrite other profiles.
+    """
+    return uuid.uuid4().hex
+
+
+def save_profile(profiler, profile_id, meta):
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(directory / f"{profile_id}.prof")
+    (directory / f"{profile_id}.json").write_text(json.dumps({"id": profile_id, **meta}))
+    _prune(directory, settings.PROFILING["KEEP"])
+
+
+def _prune(directory, keep):
+    sidecars = sorted(directory.glob("*.json"), key=lambda path: path.stat().st_mtime, reverse=True)
+    for sidecar in sidecars[keep:]:
+        sidecar.with_suffix(".prof").unlink(missing_ok=True)
+        sidecar.unlink(missing_ok=True)
+
+
+def list_profiles():
+    """Metadata of the stored profiles, newest first."""
+    profiles = []
+    for sidecar in profile_dir().glob("*.json"):
+        try:
+            profiles.append(json.loads(sidecar.read_text()))
+        except (OSError, ValueError):
+            continue  # pruned or half-written
+    return sorted(profiles, key=lambda meta: meta["started_at"], reverse=True)
+
+
+def profile_file(profile_id):
+    """Path of a stored profile, or None."""
+    if not _ID.match(profile_id):
+        return None
+    path = profile_dir() / f"{profile_id}.prof"
+    return path if path.exists() else None
+
+
+def render_stats(path, sort="cumulative", limit=50):
+    """The top `limit` functions of a profile as pstats text."""
+    output = io.StringIO()
+    pstats.Stats(str(path), stream=output).sort_stats(sort).print_stats(limit)
+    return output.getvalue()
+
+
+def request_meta(request, response, started, elapsed):
+    return {
+        "method": request.method,
+        "path": request.path,
+        "status": response.status_code,
+        "duration_ms": round(elapsed * 1000, 2),
+        "started_at": started,
+        "trigger": "token" if TOKEN_HEADER in request.headers else "sample",
+        "request_id": request.headers.get("X-Request-ID", "")[:200],  # client-supplied, metadata only
+    }
@@ -0,0 +1,158 @@
+"""
+Per-request SQL accounting built on `connection.execute_wrapper`.
+
+`execute_wrapper` applies a wrapper to the statements run in the current
+context rather than the current thread, so under ASGI it also covers the
+ORM calls a request makes from sync_to_async worker threads, which copy
+the context.
+
+Views declare what a request may cost in `query_budgets`, keyed by viewset
+action (or lowercase HTTP method for plain APIViews), with "default" as
+the fallback:
+
+    query_budgets = {
+        "list": QueryBudget(queries=4, db_ms=50),
+        "default": QueryBudget(queries=8, db_ms=100),
+    }
+
+QueryBudgetMiddleware measures every request against its view's budget.
+"""
+import functools
+import re
+import time
+from collections import Counter, defaultdict, namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+
+# Either limit may be None (not limited)
+QueryBudget = namedtuple("QueryBudget", ["queries", "db_ms"], defaults=[None, None])
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\?")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+_wrappers = ContextVar("query_wrappers", default=())
+
+
+def _dispatch(execute, sql, params, many, context):
+    """The one wrapper installed on every connection: runs those of the current context."""
+    for wrapper in reversed(_wrappers.get()):
+        execute = functools.partial(wrapper, execute)
+    return execute(sql, params, many, context)
+
+
+def install(connection, **kwargs):
+    """Installs the dispatcher on `connection` (a connection_created receiver)."""
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_dispatch)
+
+
+@contextmanager
+def execute_wrapper(wrapper):
+    """Applies `wrapper` to every statement run in this context inside the block, on every alias."""
+    for alias in connections:
+        install(connections[alias])
+    token = _wrappers.set((*_wrappers.get(), wrapper))
+    try:
+        yield
+    finally:
+        _wrappers.reset(token)
+
+
+def fingerprint(sql):
+    """`sql` with literals and placeholders replaced by ?, so repeats of one statement compare equal."""
+    sql = _PLACEHOLDER.sub("?", _NUMBER.sub("?", _STRING.sub("?", sql)))
+    return _SPACE.sub(" ", _IN_LIST.sub("(...)", sql)).strip()
+
+
+class QueryCounter:
+    """execute_wrapper counting the statements run on every database alias."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def track(self):
+        """Counts the queries run in this context inside the block."""
+        with execute_wrapper(self):
+            yield self
+
+
+class QueryTimer(QueryCounter):
+    """QueryCounter that also adds up the time spent in the database."""
+
+    def __init__(self):
+        super().__init__()
+        self.db_ms = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(sql, (time.perf_counter() - started) * 1000)
+
+    def record(self, sql, ms):
+        self.db_ms += ms
+
+
+class QueryRecorder(QueryTimer):
+    """QueryTimer that also keeps each statement and its duration."""
+
+    def __init__(self):
+        super().__init__()
+        self.queries = []  # (sql, milliseconds)
+
+    def record(self, sql, ms):
+        super().record(sql, ms)
+        self.queries.append((sql, ms))
+
+    def fingerprints(self):
+        """[(fingerprint, count, total ms)], most frequent first, then in order of first execution."""
+        counts, durations = Counter(), defaultdict(float)
+        for sql, ms in self.queries:
+            key = fingerprint(sql)
+            counts[key] += 1
+            durations[key] += ms
+        return [(key, count, durations[key]) for key, count in counts.most_common()]
+
+    def over_budget(self, budget):
+        """Human-readable list of the limits of `budget` this recording exceeds."""
+        problems = []
+        if budget.queries is not None and self.count > budget.queries:
+            problems.append(f"{self.count} queries (budget {budget.queries})")
+        if budget.db_ms is not None and self.db_ms > budget.db_ms:
+            problems.append(f"{self.db_ms:.1f} ms in the database (budget {budget.db_ms} ms)")
+        return problems
+
+    def report(self, limit=None):
+        """The executed statements grouped by fingerprint, repeated ones marked."""
+        lines = []
+        for key, count, ms in self.fingerprints()[:limit]:
+            marker = "  <- repeated" if count > 1 else ""
+            lines.append(f"  {count:>3}x {ms:8.2f} ms  {key}{marker}")
+        return "\n".join(lines)
+
+
+def view_action(view_func, method):
+    """The viewset action `view_func` runs for `method`, or the lowercase method for other views."""
+    actions = getattr(view_func, "actions", None)
+    return actions.get(method.lower(), method.lower()) if actions else method.lower()
+
+
+def get_query_budget(view_func, method):
+    """The QueryBudget the view behind `view_func` declares for `method`, or None."""
+    budgets = getattr(getattr(view_func, "cls", None), "query_budgets", None)
+    if not budgets:
+        return None
+    return budgets.get(view_action(view_func, method), budgets.get("default"))
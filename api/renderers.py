@@ -0,0 +1,11 @@
+from rest_framework.renderers import JSONRenderer
+
+from .tracing import span
+
+
+class TracedJSONRenderer(JSONRenderer):
+    """JSONRenderer whose rendering shows up as a span in sampled traces."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with span("render json"):
+            return super().render(data, accepted_media_type, renderer_context)
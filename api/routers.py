@@ -0,0 +1,39 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Set by ReadYourWritesMiddleware for the duration of a request
+pin_to_primary = ContextVar("pin_to_primary", default=False)
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends writes to the primary and safe reads to a random replica.
+
+    Reads stay on the primary when the current request is pinned (the client
+    wrote recently), inside a transaction on the primary, or for models that
+    must never be read stale.
+    """
+
+    # Token revocation has to take effect immediately for every client
+    primary_only_models = {"api.revokedtoken"}
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or model._meta.label_lower in self.primary_only_models:
+            return DEFAULT_DB_ALIAS
+        if pin_to_primary.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # All aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
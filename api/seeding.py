@@ -0,0 +1,186 @@
+"""
+Deterministic synthetic data for performance work (`manage.py seed_scale`).
+
+ScaleDataset yields rows in PostgreSQL COPY text format. Every value comes
+from one random.Random(seed), and timestamps are relative to a fixed
+`now`, so a seed always produces the same dataset:
+
+- ownership is skewed: a few users own most stores, and a few stores list
+  most products and receive most orders (power law, see `skew`)
+- prices are log-normal, quantities mostly 1
+- order statuses follow ORDER_STATUSES; created_at is spread over `months`
+  months, and orders are never older than their product
+
+Consume the generators in table order (users, products, orders, stores).
+Stores come last because their denormalized counters are accumulated while
+products and orders are generated. Their foreign keys are deferrable, so
+the load only has to be a single transaction.
+"""
+import io
+import math
+import random
+from array import array
+from datetime import datetime, timezone
+
+ORDER_STATUSES = (("completed", 60), ("shipped", 8), ("paid", 10), ("pending", 14), ("cancelled", 8))
+QUANTITIES = ((1, 60), (2, 20), (3, 10), (4, 6), (5, 4))
+FIRST_NAMES = ("Alex", "Maria", "Ivan", "Olga", "Sam", "Nina", "Pavel", "Anna", "Leo", "Vera")
+LAST_NAMES = ("Smirnov", "Ivanova", "Petrov", "Kuznetsova", "Popov", "Sokolova", "Lebedev", "Novak")
+
+MAX_PRICE_CENTS = 1_000_000
+
+USER_COLUMNS = ("id", "email", "full_name", "password_hash", "role_id", "is_active", "is_staff",
+                "is_superuser", "date_joined")
+PRODUCT_COLUMNS = ("id", "name", "description", "price", "store_id", "is_active", "owner_id",
+                   "created_at", "updated_at")
+ORDER_COLUMNS = ("id", "product_id", "user_id", "quantity", "total_price", "status", "created_at",
+                 "updated_at", "owner_id")
+STORE_COLUMNS = ("id", "name", "address", "is_active", "owner_id", "product_count",
+                 "active_product_count", "order_revenue", "archived_order_revenue")
+
+
+def _timestamp(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat()
+
+
+def _money(cents):
+    return f"{cents // 100}.{cents % 100:02d}"
+
+
+def _weighted(choices):
+    values, weights = zip(*choices)
+    total = sum(weights)
+    cumulative, running = [], 0
+    for weight in weights:
+        running += weight
+        cumulative.append(running / total)
+    return values, cumulative
+
+
+class ScaleDataset:
+    def __init__(self, users, stores, products, orders, *, password_hash, role_ids, first_ids,
+                 seed=0, months=24, skew=3.0, now=None):
+        """
+        `role_ids` maps role names ("User", "Moderator") to ids, and
+        `first_ids` maps "user", "store", "product" and "order" to the
+        first id to use for each table.
+        """
+        self.counts = {"user": users, "store": stores, "product": products, "order": orders}
+        self.password_hash = password_hash
+        self.role_ids = role_ids
+        self.first = first_ids
+        self.skew = skew
+        self.rng = random.Random(seed)
+
+        now = now or datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        self.end = now.timestamp()
+        self.start = self.end - months * 30 * 86400
+
+        self.store_owner = array("q", (self.first["user"] + self._pick(users) for _ in range(stores)))
+        self.store_products = array("q", bytes(8 * stores))
+        self.store_active_products = array("q", bytes(8 * stores))
+        self.store_revenue = array("q", bytes(8 * stores))
+        self.product_store = array("q")
+        self.product_price = array("q")
+        self.product_created = array("d")
+
+    def _pick(self, n):
+        """Index in range(n), skewed towards 0."""
+        return min(int(n * self.rng.random() ** self.skew), n - 1)
+
+    def _choose(self, table):
+        values, cumulative = table
+        point = self.rng.random()
+        for value, bound in zip(values, cumulative):
+            if point < bound:
+                return value
+        return values[-1]
+
+    def users(self):
+        moderator, user = self.role_ids["Moderator"], self.role_ids["User"]
+        for i in range(self.counts["user"]):
+            pk = self.first["user"] + i
+            name = f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}"
+            role = moderator if self.rng.random() < 0.01 else user
+            joined = _timestamp(self.start + (self.end - self.start) * self.rng.random())
+            yield f"{pk}\tuser{pk}@seed.example.com\t{name}\t{self.password_hash}\t{role}\tt\tf\tf\t{joined}\n"
+
+    def products(self):
+        n_users, n_stores = self.counts["user"], self.counts["store"]
+        for i in range(self.counts["product"]):
+            pk = self.first["product"] + i
+            store = self._pick(n_stores)
+            if self.rng.random() < 0.9:
+                owner = self.store_owner[store]
+            else:
+                owner = self.first["user"] + self._pick(n_users)
+            price = min(max(50, int(math.exp(self.rng.gauss(7.0, 1.2)))), MAX_PRICE_CENTS)
+            created = self.start + (self.end - self.start) * self.rng.random()
+            active = self.rng.random() < 0.95
+            description = f"Synthetic product {pk}" if self.rng.random() < 0.3 else "\\N"
+
+            self.product_store.append(store)
+            self.product_price.append(price)
+            self.product_created.append(created)
+            self.store_products[store] += 1
+            self.store_active_products[store] += active
+
+            ts = _timestamp(created)
+            yield (f"{pk}\tProduct {pk}\t{description}\t{_money(price)}\t{self.first['store'] + store}\t"
+                   f"{'t' if active else 'f'}\t{owner}\t{ts}\t{ts}\n")
+
+    def orders(self):
+        statuses, quantities = _weighted(ORDER_STATUSES), _weighted(QUANTITIES)
+        n_users, n_products = self.counts["user"], self.counts["product"]
+        for i in range(self.counts["order"]):
+            pk = self.first["order"] + i
+            product = self._pick(n_products)
+            user = self.first["user"] + self.rng.randrange(n_users)
+            quantity = self._choose(quantities)
+            status = self._choose(statuses)
+            total = self.product_price[product] * quantity
+            listed = self.product_created[product]
+            created = _timestamp(listed + (self.end - listed) * self.rng.random())
+            if status != "cancelled":
+                self.store_revenue[self.product_store[product]] += total
+            yield (f"{pk}\t{self.first['product'] + product}\t{user}\t{quantity}\t{_money(total)}\t"
+                   f"{status}\t{created}\t{created}\t{user}\n")
+
+    def stores(self):
+        for i in range(self.counts["store"]):
+            pk = self.first["store"] + i
+            yield (f"{pk}\tStore {pk}\t{pk} Market Street\tt\t{self.store_owner[i]}\t"
+                   f"{self.store_products[i]}\t{self.store_active_products[i]}\t"
+                   f"{_money(self.store_revenue[i])}\t0.00\n")
+
+
+def copy_rows(cursor, table, columns, rows, chunk_rows=50_000):
+    """
+    Loads COPY text-format `rows` into `table` with COPY FROM STDIN, sending
+    one in-memory chunk of `chunk_rows` rows at a time. Returns the row count.
+    """
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    raw = cursor.cursor  # driver cursor under Django's wrapper
+    count = 0
+
+    def chunks():
+        nonlocal count
+        buffer = []
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) >= chunk_rows:
+                count += len(buffer)
+                yield "".join(buffer)
+                buffer = []
+        if buffer:
+            count += len(buffer)
+            yield "".join(buffer)
+
+    if hasattr(raw, "copy"):  # psycopg 3
+        with raw.copy(sql) as copy:
+            for chunk in chunks():
+                copy.write(chunk)
+    else:  # psycopg2
+        for chunk in chunks():
+            raw.copy_expert(sql, io.StringIO(chunk))
+    return count
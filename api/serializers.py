@@ -1,5 +1,40 @@
 from rest_framework import serializers
-from .models import AccessRoleRule, User, Product, Store, Order
+from .models import AccessRoleRule, User, Product, Store, Order, DeletionJob, ChangeLogEntry
+from .tracing import span
+
+
+class TracedListSerializer(serializers.ListSerializer):
+    """Serializes the whole list in one tracing span."""
+
+    @property
+    def data(self):
+        with span(f"serialize {type(self.child).__name__}", many=True):
+            return super().data
+
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    ModelSerializer that accepts optional `fields` / `exclude` arguments
+    controlling which fields are rendered (sparse fieldsets). `fields="__all__"`
+    renders every field, including ones a subclass leaves out by default.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        exclude = kwargs.pop('exclude', None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None and fields != serializers.ALL_FIELDS:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+        for name in exclude or ():
+            self.fields.pop(name, None)
+
+    @property
+    def data(self):
+        with span(f"serialize {type(self).__name__}"):
+            return super().data
 
 class AccessRoleRuleSerializer(serializers.ModelSerializer):
     role_name = serializers.CharField(source='role.name', read_only=True)
@@ -10,11 +45,12 @@ class AccessRoleRuleSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(DynamicFieldsModelSerializer):
     role_name = serializers.CharField(source='role.name', read_only=True)
 
     class Meta:
         model = User
+        list_serializer_class = TracedListSerializer
         fields = '__all__'
         extra_kwargs = {
             'password_hash': {'write_only': True},
@@ -22,12 +58,26 @@ class UserSerializer(serializers.ModelSerializer):
             'is_superuser': {'read_only': True},
         }
 
-class StoreSerializer(serializers.ModelSerializer):
+class StoreSerializer(DynamicFieldsModelSerializer):
+    """
+    Pass `include_counters=True` (or name them in `fields`) to render the
+    denormalized counters. They are plain columns, so this costs no queries.
+    """
+    COUNTER_FIELDS = ['product_count', 'active_product_count', 'order_revenue']
+
     owner = serializers.ReadOnlyField(source='owner.email')  # show owner email
 
     class Meta:
         model = Store
-        fields = ['id', 'name', 'address', 'is_active', 'owner']
+        list_serializer_class = TracedListSerializer
+        fields = ['id', 'name', 'address', 'is_active', 'owner',
+                  'product_count', 'active_product_count', 'order_revenue']
+        read_only_fields = ['product_count', 'active_product_count', 'order_revenue']
+
+    def __init__(self, *args, include_counters=False, **kwargs):
+        if not include_counters and kwargs.get('fields') is None:
+            kwargs['exclude'] = [*(kwargs.get('exclude') or ()), *self.COUNTER_FIELDS]
+        super().__init__(*args, **kwargs)
 
     def create(self, validated_data):
         request = self.context.get('request')
@@ -36,11 +86,12 @@ class StoreSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(DynamicFieldsModelSerializer):
     owner = serializers.ReadOnlyField(source='owner.email')  # show owner email
 
     class Meta:
         model = Product
+        list_serializer_class = TracedListSerializer
         fields = ['id', 'name', 'description', 'price', 'store', 'is_active', 'owner']
 
     def create(self, validated_data):
@@ -49,8 +100,33 @@ class ProductSerializer(serializers.ModelSerializer):
             validated_data['owner'] = request.user
         return super().create(validated_data)
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Order
+        list_serializer_class = TracedListSerializer
         fields = '__all__'
-        read_only_fields = ['owner', 'total_price', 'created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = ['user', 'owner', 'total_price', 'created_at', 'updated_at']
+
+class RepriceSerializer(serializers.Serializer):
+    """Body of `POST /api/stores/<id>/reprice/`: exactly one of percent/amount, plus optional filters."""
+    percent = serializers.DecimalField(max_digits=7, decimal_places=2, required=False, min_value=-100)
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    product_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+
+    def validate(self, attrs):
+        if ('percent' in attrs) == ('amount' in attrs):
+            raise serializers.ValidationError("Provide exactly one of 'percent' or 'amount'")
+        return attrs
+
+class DeletionJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DeletionJob
+        fields = '__all__'
+        read_only_fields = [field.name for field in DeletionJob._meta.fields]
+
+class ChangeLogEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ChangeLogEntry
+        fields = ['id', 'entity_type', 'entity_id', 'operation', 'owner_id', 'created_at']
@@ -0,0 +1,255 @@
+"""
+Slow query capture.
+
+SlowQueryMiddleware times every statement a view runs. Statements over
+SLOW_QUERIES["THRESHOLD_MS"] are put into an in-process buffer together
+with the view and action that ran them, and the request moves on. A
+background thread folds the buffer into SlowQuery rows, one per
+fingerprint and view/action, keeping the count, total and worst time.
+
+Parameters carry user data (emails, tokens, password hashes), so they are
+kept in memory only until EXPLAIN has run. The latest statement and its
+parameters are stored only with SLOW_QUERIES["STORE_SAMPLES"], and string
+literals in stored plans are masked otherwise.
+
+With SLOW_QUERIES["EXPLAIN"], the same thread runs EXPLAIN for the latest
+statement of each row on its own connection to the database the statement
+ran on, at most once per PLAN_TTL seconds. On PostgreSQL,
+SLOW_QUERIES["ANALYZE"] makes that `EXPLAIN (ANALYZE, BUFFERS)`, which
+executes the statement again: it is done for SELECTs only, inside a
+transaction that is rolled back and under EXPLAIN_TIMEOUT_MS.
+
+`manage.py slow_queries` prints the worst offenders.
+"""
+import atexit
+import hashlib
+import logging
+import queue
+import re
+import threading
+import time
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import SlowQuery
+from .queries import QueryCounter, fingerprint, view_action
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+
+SlowStatement = namedtuple(
+    "SlowStatement", ["database", "view", "action", "sql", "params", "many", "ms", "seen_at"],
+)
+
+
+def slow_query_key(view, action, statement_fingerprint):
+    return hashlib.sha256(f"{view}\0{action}\0{statement_fingerprint}".encode()).hexdigest()
+
+
+class SlowQueryWatcher(QueryCounter):
+    """execute_wrapper handing the statements of `request` slower than `threshold_ms` to the collector."""
+
+    def __init__(self, request, threshold_ms):
+        super().__init__()
+        self.request = request
+        self.threshold_ms = threshold_ms
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            if ms >= self.threshold_ms:
+                self.report(context["connection"].alias, sql, params, many, ms)
+
+    def report(self, database, sql, params, many, ms):
+        # Statements run before URL resolution (middleware, sessions) belong to no view
+        match = getattr(self.request, "resolver_match", None)
+        if match is None:
+            return
+        statement = SlowStatement(
+            database, match.view_name, view_action(match.func, self.request.method),
+            sql, params, many, ms, timezone.now(),
+        )
+        # Looked up at call time so tests can swap the collector
+        collector.put(statement)
+
+
+class SlowQueryCollector:
+    def __init__(self, capacity, flush_interval, autostart=True):
+        self.flush_interval = flush_interval
+        self.autostart = autostart
+
+        self._queue = queue.Queue(maxsize=capacity)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self.dropped = 0
+
+    def put(self, statement):
+        """Buffers a SlowStatement without waiting. Returns False if it had to be dropped."""
+        if self.autostart:
+            self._ensure_started()
+        try:
+            self._queue.put_nowait(statement)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def flush(self):
+        """Aggregates everything buffered so far. Returns the number of statements recorded."""
+        with self._flush_lock:
+            groups = defaultdict(list)
+            while True:
+                try:
+                    statement = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                key = slow_query_key(statement.view, statement.action, fingerprint(statement.sql))
+                groups[key].append(statement)
+
+            recorded = 0
+            for key, statements in groups.items():
+                try:
+                    self._record(key, statements)
+                except Exception:
+                    logger.exception("Failed to record %d slow statements", len(statements))
+                    continue
+                recorded += len(statements)
+                if settings.SLOW_QUERIES["EXPLAIN"]:
+                    self._refresh_plan(key, statements[-1])
+            return recorded
+
+    @staticmethod
+    def _record(key, statements):
+        latest = statements[-1]
+        changes = {
+            "count": F("count") + len(statements),
+            "total_ms": F("total_ms") + sum(s.ms for s in statements),
+            "max_ms": Greatest(F("max_ms"), max(s.ms for s in statements)),
+            "last_seen": latest.seen_at,
+        }
+        if settings.SLOW_QUERIES["STORE_SAMPLES"]:
+            changes.update(sample_sql=latest.sql, sample_params=_json_params(latest.params))
+        if SlowQuery.objects.filter(key=key).update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                SlowQuery.objects.create(
+                    key=key,
+                    fingerprint=fingerprint(latest.sql),
+                    database=latest.database,
+                    view=latest.view,
+                    action=latest.action,
+                    count=len(statements),
+                    total_ms=sum(s.ms for s in statements),
+                    max_ms=max(s.ms for s in statements),
+                    first_seen=statements[0].seen_at,
+                    last_seen=latest.seen_at,
+                    sample_sql=changes.get("sample_sql", ""),
+                    sample_params=changes.get("sample_params", []),
+                )
+        except IntegrityError:
+            # Another process created the row first
+            SlowQuery.objects.filter(key=key).update(**changes)
+
+    @staticmethod
+    def _refresh_plan(key, statement):
+        stale = timezone.now() - timedelta(seconds=settings.SLOW_QUERIES["PLAN_TTL"])
+        due = SlowQuery.objects.filter(key=key).filter(
+            Q(plan_captured_at__isnull=True) | Q(plan_captured_at__lt=stale)
+        )
+        if statement.many or not due.exists():
+            return
+        try:
+            plan = explain(statement.database, statement.sql, statement.params)
+        except Exception as exc:
+            plan = f"EXPLAIN failed: {type(exc).__name__}: {exc}"
+        if plan is not None:
+            if not settings.SLOW_QUERIES["STORE_SAMPLES"]:
+                # Plans show parameters as literals, e.g. (email = 'a@b.c'::text)
+                plan = _STRING.sub("'?'", plan)
+            due.update(plan=plan, plan_captured_at=timezone.now())
+
+    def close(self):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="slow-query-collector", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+            connections.close_all()
+
+
+def _json_params(params):
+    if params is None:
+        return []
+    if isinstance(params, dict):
+        return {key: _json_param(value) for key, value in params.items()}
+    return [_json_param(value) for value in params]
+
+
+def _json_param(value):
+    if isinstance(value, (bytes, memoryview)):
+        return f"<{len(value)} bytes>"
+    if isinstance(value, (list, tuple)):
+        return [_json_param(item) for item in value]
+    return value
+
+
+def explain(database, sql, params):
+    """
+    The plan of `sql` on `database` as text, or None for statements that
+    are not explained (anything but SELECT, UPDATE and DELETE).
+    """
+    verb = (sql.split(None, 1) or [""])[0].upper()
+    if verb not in ("SELECT", "UPDATE", "DELETE"):
+        return None
+    connection = connections[database]
+    options = {}
+    analyze = connection.vendor == "postgresql" and settings.SLOW_QUERIES["ANALYZE"] and verb == "SELECT"
+    if analyze:
+        options = {"analyze": True, "buffers": True}
+    prefix = connection.ops.explain_query_prefix(**options)
+
+    with transaction.atomic(using=database), connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SET LOCAL statement_timeout = %s", [int(settings.SLOW_QUERIES["EXPLAIN_TIMEOUT_MS"])])
+        cursor.execute(f"{prefix} {sql}", params)
+        rows = cursor.fetchall()
+        # ANALYZE executed the statement; nothing it did may stay
+        transaction.set_rollback(True, using=database)
+    # PostgreSQL returns one line per row, SQLite (id, parent, notused, detail)
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+collector = SlowQueryCollector(
+    capacity=settings.SLOW_QUERIES["BUFFER_SIZE"],
+    flush_interval=settings.SLOW_QUERIES["FLUSH_INTERVAL"],
+)
@@ -0,0 +1,296 @@
+"""
+Memory-mapped catalog snapshots.
+
+`build_snapshot` compiles the active stores and products into one binary
+file of fixed-width records. Text is kept in a shared string pool. The file
+also holds sorted id tables for detail lookups, and per-store and per-owner
+posting lists for filtered lists. Workers mmap the file, so list and detail
+reads of the catalog need no queries. Every worker serves the same pages
+from the OS page cache.
+
+A new snapshot is written to a temporary file and moved into place with
+`os.replace`. Readers notice the new inode on their next request and map it.
+Requests still using the old mapping keep reading the unlinked old file.
+
+Layout (little-endian): header, then the sections listed in SECTIONS, each
+at the offset recorded for it in the header.
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+
+from .models import ChangeLogEntry, Product, Store
+
+MAGIC = b"CATSNAP2"
+NULL = 0xFFFFFFFF  # string length marking None
+
+SECTIONS = (
+    "stores",            # STORE records sorted by id
+    "products",          # PRODUCT records in list order (newest first)
+    "product_ids",       # ID_ENTRY (id, record number) sorted by id
+    "store_products",    # DIRECTORY by store id -> postings
+    "owner_products",    # DIRECTORY by owner id -> postings
+    "owner_stores",      # DIRECTORY by owner id -> postings
+    "postings",          # uint32 record numbers
+    "strings",           # utf-8 string pool
+)
+
+# magic, built at (unix seconds), change feed cursor (txid, id), then (offset, length) per section
+HEADER = struct.Struct("<8sdqq" + "QQ" * len(SECTIONS))
+# id, owner id (0 = none), product_count, active_product_count, order_revenue (cents),
+# name, address, owner email as (offset, length) into the string pool
+STORE = struct.Struct("<qqqqq6I")
+# id, store id, owner id (0 = none), price (cents), name, description, owner email
+PRODUCT = struct.Struct("<qqqq6I")
+ID_ENTRY = struct.Struct("<qI")
+# key, first posting, number of postings
+DIRECTORY = struct.Struct("<qII")
+POSTING = struct.Struct("<I")
+
+
+def snapshot_path():
+    return Path(settings.CATALOG_SNAPSHOT["PATH"])
+
+
+def _cents(value):
+    return int((value * 100).to_integral_value())
+
+
+def _money(cents):
+    return str(Decimal(cents).scaleb(-2))
+
+
+class _StringPool:
+    def __init__(self):
+        self.data = bytearray()
+        self._seen = {}
+
+    def add(self, value):
+        if value is None:
+            return 0, NULL
+        if value not in self._seen:
+            encoded = value.encode()
+            self._seen[value] = (len(self.data), len(encoded))
+            self.data += encoded
+        return self._seen[value]
+
+
+def _directory(groups, postings):
+    """Appends the record numbers of {key: [numbers]} to `postings` and returns the packed directory."""
+    directory = bytearray()
+    for key in sorted(groups):
+        directory += DIRECTORY.pack(key, len(postings), len(groups[key]))
+        postings.extend(groups[key])
+    return bytes(directory)
+
+
+def catalog_cursor():
+    """
+    (txid, id) of the newest catalog change of an ended transaction. It only
+    grows: a transaction that ends later sorts after it (see ChangeLogEntry).
+    """
+    entries = ChangeLogEntry.visible(ChangeLogEntry.objects.filter(entity_type__in=("product", "store")))
+    return entries.order_by("-txid", "-id").values_list("txid", "id").first() or (0, 0)
+
+
+def build_snapshot(path=None):
+    """Writes a new snapshot of the active catalog and swaps it in. Returns its path."""
+    path = Path(path or snapshot_path())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    cursor = catalog_cursor()  # before reading: later changes trigger the next rebuild
+    pool = _StringPool()
+
+    stores = bytearray()
+    owner_stores = defaultdict(list)
+    store_rows = Store.objects.order_by("pk").values_list(
+        "pk", "owner_id", "product_count", "active_product_count", "order_revenue",
+        "name", "address", "owner__email",
+    )
+    for number, (pk, owner_id, products, active, revenue, name, address, email) in enumerate(store_rows.iterator()):
+        stores += STORE.pack(
+            pk, owner_id or 0, products, active, _cents(revenue),
+            *pool.add(name), *pool.add(address), *pool.add(email),
+        )
+        if owner_id:
+            owner_stores[owner_id].append(number)
+
+    products = bytearray()
+    product_ids = []
+    store_products = defaultdict(list)
+    owner_products = defaultdict(list)
+    product_rows = Product.objects.order_by("-created_at", "-pk").values_list(
+        "pk", "store_id", "owner_id", "price", "name", "description", "owner__email",
+    )
+    for number, (pk, store_id, owner_id, price, name, description, email) in enumerate(product_rows.iterator()):
+        products += PRODUCT.pack(
+            pk, store_id, owner_id or 0, _cents(price),
+            *pool.add(name), *pool.add(description), *pool.add(email),
+        )
+        product_ids.append((pk, number))
+        store_products[store_id].append(number)
+        if owner_id:
+            owner_products[owner_id].append(number)
+
+    postings = []
+    sections = {
+        "stores": bytes(stores),
+        "products": bytes(products),
+        "product_ids": b"".join(ID_ENTRY.pack(pk, number) for pk, number in sorted(product_ids)),
+    }
+    for name, groups in (("store_products", store_products), ("owner_products", owner_products),
+                         ("owner_stores", owner_stores)):
+        sections[name] = _directory(groups, postings)
+    sections["postings"] = b"".join(POSTING.pack(number) for number in postings)
+    sections["strings"] = bytes(pool.data)
+
+    layout = []
+    offset = HEADER.size
+    for name in SECTIONS:
+        layout += [offset, len(sections[name])]
+        offset += len(sections[name])
+
+    tmp = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+    with open(tmp, "wb") as fh:
+        fh.write(HEADER.pack(MAGIC, time.time(), *cursor, *layout))
+        for name in SECTIONS:
+            fh.write(sections[name])
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+    return path
+
+
+class CatalogSnapshot:
+    """Read-only view of a snapshot file. Rows are rendered like the API serializers."""
+
+    def __init__(self, path):
+        with open(path, "rb") as fh:
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.built_at, txid, entry_id, *layout = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a catalog snapshot")
+        self.cursor = (txid, entry_id)
+        self._sections = {name: (layout[2 * i], layout[2 * i + 1]) for i, name in enumerate(SECTIONS)}
+
+    def _count(self, section, record):
+        return self._sections[section][1] // record.size
+
+    def _record(self, section, record, number):
+        return record.unpack_from(self._map, self._sections[section][0] + number * record.size)
+
+    def _string(self, offset, length):
+        if length == NULL:
+            return None
+        start = self._sections["strings"][0] + offset
+        return self._map[start:start + length].decode()
+
+    def _search(self, section, record, key):
+        """Binary search over a section sorted by its first field; returns the record or None."""
+        low, high = 0, self._count(section, record)
+        while low < high:
+            middle = (low + high) // 2
+            entry = self._record(section, record, middle)
+            if entry[0] < key:
+                low = middle + 1
+            elif entry[0] > key:
+                high = middle
+            else:
+                return entry
+        return None
+
+    def _postings(self, directory, key):
+        entry = self._search(directory, DIRECTORY, key)
+        if entry is None:
+            return []
+        _, start, count = entry
+        base = self._sections["postings"][0] + start * POSTING.size
+        return [number for (number,) in POSTING.iter_unpack(self._map[base:base + count * POSTING.size])]
+
+    def _store(self, values):
+        pk, owner_id, products, active, revenue, *strings = values
+        return owner_id or None, {
+            "id": pk,
+            "name": self._string(*strings[0:2]),
+            "address": self._string(*strings[2:4]),
+            "is_active": True,
+            "owner": self._string(*strings[4:6]),
+            "product_count": products,
+            "active_product_count": active,
+            "order_revenue": _money(revenue),
+        }
+
+    def _product(self, values):
+        pk, store_id, owner_id, price, *strings = values
+        return owner_id or None, {
+            "id": pk,
+            "name": self._string(*strings[0:2]),
+            "description": self._string(*strings[2:4]),
+            "price": _money(price),
+            "store": store_id,
+            "is_active": True,
+            "owner": self._string(*strings[4:6]),
+        }
+
+    def get_store(self, pk):
+        """(owner_id, data) of an active store, or None."""
+        values = self._search("stores", STORE, pk)
+        return None if values is None else self._store(values)
+
+    def get_product(self, pk):
+        """(owner_id, data) of an active product, or None."""
+        entry = self._search("product_ids", ID_ENTRY, pk)
+        return None if entry is None else self._product(self._record("products", PRODUCT, entry[1]))
+
+    def list_stores(self, owner_id=None):
+        if owner_id is None:
+            numbers = range(self._count("stores", STORE))
+        else:
+            numbers = self._postings("owner_stores", owner_id)
+        return [self._store(self._record("stores", STORE, number))[1] for number in numbers]
+
+    def list_products(self, store_id=None, owner_id=None):
+        if store_id is not None:
+            numbers = self._postings("store_products", store_id)
+            if owner_id is not None:
+                owned = set(self._postings("owner_products", owner_id))
+                numbers = [number for number in numbers if number in owned]
+        elif owner_id is not None:
+            numbers = self._postings("owner_products", owner_id)
+        else:
+            numbers = range(self._count("products", PRODUCT))
+        return [self._product(self._record("products", PRODUCT, number))[1] for number in numbers]
+
+
+_lock = threading.Lock()
+_current = (None, None)  # (file identity, CatalogSnapshot)
+
+
+def get_snapshot():
+    """
+    The current snapshot for this process, remapped when the file was
+    replaced; None if absent or written in an older format.
+    """
+    global _current
+    try:
+        stat = os.stat(snapshot_path())
+    except FileNotFoundError:
+        return None
+    identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    key, snapshot = _current
+    if key != identity:
+        with _lock:
+            key, snapshot = _current
+            if key != identity:
+                try:
+                    snapshot = CatalogSnapshot(snapshot_path())
+                except ValueError:
+                    snapshot = None
+                _current = (identity, snapshot)
+    return snapshot
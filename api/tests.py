@@ -1,5 +1,16 @@
-from django.urls import reverse
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.core.handlers.asgi import ASGIHandler
+from django.test import TestCase, SimpleTestCase, AsyncRequestFactory, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db.models.signals import post_delete
+from django.urls import path, reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.test import APITestCase
 from api.models import (
     User,
@@ -7,30 +18,67 @@ from api.models import (
     AccessRoleRule,
     BusinessElement,
     Product,
-    Store
+    Store,
+    Order,
+    RevokedToken,
+    AuditLog,
+    ChangeLogEntry,
+    DeletionJob,
+    SlowQuery
 )
-from api.utils import create_jwt
+from api.views import AsyncLoginView, AsyncLogoutView, AsyncRegisterView, MockProductsView, ProductViewSet
+from api.middleware import (
+    LeanAuthenticationMiddleware,
+    LeanMessageMiddleware,
+    LeanSessionMiddleware,
+    QueryBudgetExceeded,
+    ReadYourWritesMiddleware,
+)
+from api.routers import PrimaryReplicaRouter
+from api.jobs import run_deletion_job
+from api.audit import AuditBuffer
+from api.slowqueries import SlowQueryCollector, explain
+from api.policy import Policy, PolicyError, load_policy
+from api.archive import archive_orders
+from api.counters import find_drift, repair
+from api.snapshot import build_snapshot
+from api.seeding import ScaleDataset
+from api.mockdata import MockDataset
+from api.queries import QueryBudget, fingerprint
+from api import metrics, profiling, snapshot
+from api.tracing import route_template
+from api.utils import create_jwt, hash_password
+from unittest import mock
+from asgiref.sync import iscoroutinefunction
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+import io
 import json
+import tempfile
+import uuid
 import bcrypt
 
+
 class AccessRoleRuleTests(APITestCase):
-    def setUp(self):
+    @classmethod
+    def setUpTestData(cls):
         # Create roles
-        self.admin_role, _ = Role.objects.get_or_create(name="Admin")
-        self.user_role, _ = Role.objects.get_or_create(name="User")
+        cls.admin_role, _ = Role.objects.get_or_create(name="Admin")
+        cls.user_role, _ = Role.objects.get_or_create(name="User")
 
         # Create admin user
-        self.admin_user = User.objects.create_superuser(
+        cls.admin_user = User.objects.create_superuser(
             email="admin@example.com",
             full_name="Admin User",
             password="password123"
         )
         # Ensure role matches exactly
-        self.admin_user.role = self.admin_role
-        self.admin_user.save()
+        cls.admin_user.role = cls.admin_role
+        cls.admin_user.save()
 
         # Create non-admin user
-        self.normal_user = User.objects.create_user(
+        cls.normal_user = User.objects.create_user(
             email="user@example.com",
             full_name="Normal User",
             password="password123",
@@ -38,30 +86,24 @@ class AccessRoleRuleTests(APITestCase):
         )
 
         # Create a business element and rule for testing
-        self.element = BusinessElement.objects.create(name="Test Element")
-        self.access_rule = AccessRoleRule.objects.create(
-            role=self.admin_role,
-            element=self.element,
+        cls.element = BusinessElement.objects.create(name="Test Element")
+        cls.access_rule = AccessRoleRule.objects.create(
+            role=cls.admin_role,
+            element=cls.element,
             read_permission=True
         )
 
         # Endpoints
-        self.login_url = reverse("login")
-        self.access_rules_url = reverse("access-rules")
+        cls.access_rules_url = reverse("access-rules")
 
-    def get_jwt_token(self, email, password):
-        """Helper to get JWT token for a user"""
-        response = self.client.post(
-            self.login_url,
-            {"email": email, "password": password},
-            format="json"
-        )
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
-        return response.data["token"]
+    def get_jwt_token(self, email):
+        """Helper to mint a JWT token for a user without going through login"""
+        user = User.objects.get(email=email)
+        return create_jwt(user.id, user.role.name)
 
     def test_admin_can_list_rules(self):
         """Admin should have access to list all access rules"""
-        token = self.get_jwt_token("admin@example.com", "password123")
+        token = self.get_jwt_token("admin@example.com")
         self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
         response = self.client.get(self.access_rules_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -69,7 +111,7 @@ class AccessRoleRuleTests(APITestCase):
 
     def test_non_admin_cannot_list_rules(self):
         """Non-admin roles should receive 403 Forbidden"""
-        token = self.get_jwt_token("user@example.com", "password123")
+        token = self.get_jwt_token("user@example.com")
         self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
         response = self.client.get(self.access_rules_url)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -80,35 +122,30 @@ class AccessRoleRuleTests(APITestCase):
         response = self.client.get(self.access_rules_url)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
-    def tearDown(self):
-        """Clean up all test data"""
-        User.objects.all().delete()
-        Role.objects.all().delete()
-        AccessRoleRule.objects.all().delete()
-        BusinessElement.objects.all().delete()
 
 class ProductPermissionTests(APITestCase):
-    def setUp(self):
+    @classmethod
+    def setUpTestData(cls):
         # ----------------------
         # Roles
         # ----------------------
-        self.admin_role, _ = Role.objects.get_or_create(name="Admin")
-        self.user_role, _ = Role.objects.get_or_create(name="User")
+        cls.admin_role, _ = Role.objects.get_or_create(name="Admin")
+        cls.user_role, _ = Role.objects.get_or_create(name="User")
 
         # ----------------------
         # Users
         # ----------------------
         # Admin
-        self.admin_user = User.objects.create_superuser(
+        cls.admin_user = User.objects.create_superuser(
             email="admin@example.com",
             full_name="Admin User",
             password="password123"
         )
-        self.admin_user.role = self.admin_role
-        self.admin_user.save()
+        cls.admin_user.role = cls.admin_role
+        cls.admin_user.save()
 
         # Normal User
-        self.normal_user = User.objects.create_user(
+        cls.normal_user = User.objects.create_user(
             email="user@example.com",
             full_name="Normal User",
             password="password123",
@@ -118,7 +155,7 @@ class ProductPermissionTests(APITestCase):
         # ----------------------
         # Stores and Products element
         # ----------------------
-        self.store = Store.objects.create(name="Test Store")
+        cls.store = Store.objects.create(name="Test Store")
         products_element, _ = BusinessElement.objects.get_or_create(name="Products")
 
         # ----------------------
@@ -126,7 +163,7 @@ class ProductPermissionTests(APITestCase):
         # ----------------------
         # User role: can create, read products
         AccessRoleRule.objects.create(
-            role=self.user_role,
+            role=cls.user_role,
             element=products_element,
             create_permission=True,
             read_permission=True  # optional if listing is needed
@@ -134,7 +171,7 @@ class ProductPermissionTests(APITestCase):
 
         # Admin role: full permissions
         AccessRoleRule.objects.create(
-            role=self.admin_role,
+            role=cls.admin_role,
             element=products_element,
             create_permission=True,
             read_permission=True,
@@ -147,26 +184,20 @@ class ProductPermissionTests(APITestCase):
         # ----------------------
         # JWT / endpoints
         # ----------------------
-        self.login_url = reverse("login")
-        self.products_url = reverse("product-list")  # DRF router generates this
+        cls.products_url = reverse("product-list")  # DRF router generates this
 
-    def get_jwt_token(self, email, password):
-        """Helper to get JWT token for a user"""
-        response = self.client.post(
-            self.login_url,
-            {"email": email, "password": password},
-            format="json"
-        )
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
-        return response.data["token"]
+    def get_jwt_token(self, email):
+        """Helper to mint a JWT token for a user without going through login"""
+        user = User.objects.get(email=email)
+        return create_jwt(user.id, user.role.name)
 
     def test_user_cannot_delete_product_but_admin_can(self):
         """User creates a product, cannot delete it, admin deletes it"""
         # ----------------------
         # Get JWT tokens
         # ----------------------
-        user_token = self.get_jwt_token("user@example.com", "password123")
-        admin_token = self.get_jwt_token("admin@example.com", "password123")
+        user_token = self.get_jwt_token("user@example.com")
+        admin_token = self.get_jwt_token("admin@example.com")
 
         # ----------------------
         # User creates a product
@@ -198,43 +229,36 @@ class ProductPermissionTests(APITestCase):
         response = self.client.delete(product_detail_url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
-    def tearDown(self):
-        """Clean up all test data"""
-        Product.objects.all().delete()
-        Store.objects.all().delete()
-        User.objects.all().delete()
-        Role.objects.all().delete()
-        AccessRoleRule.objects.all().delete()
-        BusinessElement.objects.all().delete()
 
 class AccessRulesPermissionTests(APITestCase):
-    def setUp(self):
+    @classmethod
+    def setUpTestData(cls):
         # ----------------------
         # Roles
         # ----------------------
-        self.admin_role, _ = Role.objects.get_or_create(name="Admin")
-        self.manager_role, _ = Role.objects.get_or_create(name="Manager")
-        self.user_role, _ = Role.objects.get_or_create(name="User")
+        cls.admin_role, _ = Role.objects.get_or_create(name="Admin")
+        cls.manager_role, _ = Role.objects.get_or_create(name="Manager")
+        cls.user_role, _ = Role.objects.get_or_create(name="User")
 
         # ----------------------
         # Users
         # ----------------------
-        self.admin_user = User.objects.create_superuser(
+        cls.admin_user = User.objects.create_superuser(
             email="admin@example.com",
             full_name="Admin User",
             password="password123"
         )
-        self.admin_user.role = self.admin_role
-        self.admin_user.save()
+        cls.admin_user.role = cls.admin_role
+        cls.admin_user.save()
 
-        self.manager_user = User.objects.create_user(
+        cls.manager_user = User.objects.create_user(
             email="manager@example.com",
             full_name="Manager User",
             password="password123",
             role_name="Manager"
         )
 
-        self.normal_user = User.objects.create_user(
+        cls.normal_user = User.objects.create_user(
             email="user@example.com",
             full_name="Normal User",
             password="password123",
@@ -244,15 +268,15 @@ class AccessRulesPermissionTests(APITestCase):
         # ----------------------
         # Business element
         # ----------------------
-        self.access_rules_element, _ = BusinessElement.objects.get_or_create(name="Access Rules")
+        cls.access_rules_element, _ = BusinessElement.objects.get_or_create(name="Access Rules")
 
         # ----------------------
         # AccessRoleRule
         # ----------------------
         # Manager role can read Access Rules
         AccessRoleRule.objects.create(
-            role=self.manager_role,
-            element=self.access_rules_element,
+            role=cls.manager_role,
+            element=cls.access_rules_element,
             read_permission=True
         )
 
@@ -261,76 +285,66 @@ class AccessRulesPermissionTests(APITestCase):
         # ----------------------
         # Endpoints
         # ----------------------
-        self.access_rules_url = reverse("access-rules")
+        cls.access_rules_url = reverse("access-rules")
 
-    def get_jwt_token(self, email, password):
-        """Helper to get JWT token for a user"""
-        response = self.client.post(
-            reverse("login"),
-            {"email": email, "password": password},
-            format="json"
-        )
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
-        return response.data["token"]
+    def get_jwt_token(self, email):
+        """Helper to mint a JWT token for a user without going through login"""
+        user = User.objects.get(email=email)
+        return create_jwt(user.id, user.role.name)
 
     def test_admin_can_access_access_rules(self):
-        token = self.get_jwt_token("admin@example.com", "password123")
+        token = self.get_jwt_token("admin@example.com")
         self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
         response = self.client.get(self.access_rules_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
     def test_manager_can_access_access_rules(self):
-        token = self.get_jwt_token("manager@example.com", "password123")
+        token = self.get_jwt_token("manager@example.com")
         self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
         response = self.client.get(self.access_rules_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
     def test_normal_user_cannot_access_access_rules(self):
-        token = self.get_jwt_token("user@example.com", "password123")
+        token = self.get_jwt_token("user@example.com")
         self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
         response = self.client.get(self.access_rules_url)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
-    def tearDown(self):
-        """Clean up all test data"""
-        AccessRoleRule.objects.all().delete()
-        BusinessElement.objects.all().delete()
-        User.objects.all().delete()
-        Role.objects.all().delete()
 
 class ProductOwnershipPermissionTests(APITestCase):
-    def setUp(self):
+    @classmethod
+    def setUpTestData(cls):
         # --- Roles ---
-        self.role_user, _ = Role.objects.get_or_create(name="User")
-        self.role_admin, _ = Role.objects.get_or_create(name="Admin")
+        cls.role_user, _ = Role.objects.get_or_create(name="User")
+        cls.role_admin, _ = Role.objects.get_or_create(name="Admin")
 
         # --- Users ---
-        self.user1 = User.objects.create_user(
+        cls.user1 = User.objects.create_user(
             email="user1@example.com",
             full_name="User One",
             password="password123",
             role_name="User"
         )
-        self.user2 = User.objects.create_user(
+        cls.user2 = User.objects.create_user(
             email="user2@example.com",
             full_name="User Two",
             password="password123",
             role_name="User"
         )
-        self.admin = User.objects.create_superuser(
+        cls.admin = User.objects.create_superuser(
             email="admin@example.com",
             full_name="Admin User",
             password="password123"
         )
 
         # --- Business element ---
-        self.products_element, _ = BusinessElement.objects.get_or_create(name="Products")
+        cls.products_element, _ = BusinessElement.objects.get_or_create(name="Products")
 
         # --- Access rules ---
         # User role: can create and read products they own
-        self.user_rule, _ = AccessRoleRule.objects.get_or_create(
-            role=self.role_user,
-            element=self.products_element,
+        cls.user_rule, _ = AccessRoleRule.objects.get_or_create(
+            role=cls.role_user,
+            element=cls.products_element,
             defaults=dict(
                 create_permission=True,
                 read_permission=True,
@@ -340,9 +354,9 @@ class ProductOwnershipPermissionTests(APITestCase):
         )
 
         # Admin role: can read/update/delete all products
-        self.admin_rule, _ = AccessRoleRule.objects.get_or_create(
-            role=self.role_admin,
-            element=self.products_element,
+        cls.admin_rule, _ = AccessRoleRule.objects.get_or_create(
+            role=cls.role_admin,
+            element=cls.products_element,
             defaults=dict(
                 read_all_permission=True,
                 update_all_permission=True,
@@ -351,25 +365,20 @@ class ProductOwnershipPermissionTests(APITestCase):
         )
 
         # --- Store ---
-        self.store = Store.objects.create(name="Main Store", address="123 Market Street")
+        cls.store = Store.objects.create(name="Main Store", address="123 Market Street")
 
         # --- Products URL ---
-        self.products_url = reverse("product-list")
+        cls.products_url = reverse("product-list")
 
-    def get_jwt_token(self, email, password):
-        """Helper to get JWT token for a user"""
-        response = self.client.post(
-            reverse("login"),
-            {"email": email, "password": password},
-            format="json"
-        )
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
-        return response.data["token"]
+    def get_jwt_token(self, email):
+        """Helper to mint a JWT token for a user without going through login"""
+        user = User.objects.get(email=email)
+        return create_jwt(user.id, user.role.name)
 
     def test_ownership_delete_permission(self):
         """User1 creates a product, User2 fails to delete, permissions updated, User2 succeeds"""
         # --- User1 creates a product ---
-        token1 = self.get_jwt_token("user1@example.com", "password123")
+        token1 = self.get_jwt_token("user1@example.com")
         self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token1}")
 
         create_response = self.client.post(
@@ -386,7 +395,7 @@ class ProductOwnershipPermissionTests(APITestCase):
         product_id = create_response.data["id"]
 
         # --- User2 tries to delete (should fail) ---
-        token2 = self.get_jwt_token("user2@example.com", "password123")
+        token2 = self.get_jwt_token("user2@example.com")
         self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token2}")
 
         delete_url = reverse("product-detail", args=[product_id])
@@ -404,18 +413,20 @@ class ProductOwnershipPermissionTests(APITestCase):
         # --- Verify deletion ---
         self.assertFalse(Product.objects.filter(id=product_id).exists())
 
+
 class LogoutAndTokenRevocationTests(APITestCase):
-    def setUp(self):
+    @classmethod
+    def setUpTestData(cls):
         # Create a test user
-        self.user = User.objects.create_user(
+        cls.user = User.objects.create_user(
             email="user@example.com",
             full_name="Test User",
             password="password123",
             role_name="User"
         )
-        self.login_url = reverse("login")
-        self.logout_url = reverse("logout")
-        self.profile_url = reverse("update-profile")
+        cls.login_url = reverse("login")
+        cls.logout_url = reverse("logout")
+        cls.profile_url = reverse("update-profile")
 
     def get_jwt_token(self, email, password):
         """Helper to get JWT token for a user"""
@@ -454,4 +465,1390 @@ class LogoutAndTokenRevocationTests(APITestCase):
         response = self.client.put(self.profile_url, {"full_name": "New Name After Re-login"}, format="json")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.user.refresh_from_db()
-        self.assertEqual(self.user.full_name, "New Name After Re-login")
\ No newline at end of file
+        self.assertEqual(self.user.full_name, "New Name After Re-login")
+
+
+class SparseFieldsetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email="admin@example.com",
+            full_name="Admin User",
+            password="password123"
+        )
+        cls.store = Store.objects.create(name="Main Store", owner=cls.admin)
+        Product.objects.create(
+            name="Laptop",
+            description="A very long description",
+            price="1200.00",
+            store=cls.store,
+            owner=cls.admin
+        )
+        cls.products_url = reverse("product-list")
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.admin.id, 'Admin')}")
+
+    def test_fields_trim_output_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.products_url, {"fields": "id,name,price"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data[0]), {"id", "name", "price"})
+
+        product_sql = [q["sql"] for q in queries.captured_queries if '"api_product"' in q["sql"]]
+        self.assertTrue(product_sql)
+        self.assertNotIn("description", product_sql[0])
+        self.assertIn("owner_id", product_sql[0])
+
+    def test_exclude_drops_fields(self):
+        response = self.client.get(self.products_url, {"exclude": "description"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("description", response.data[0])
+        self.assertIn("price", response.data[0])
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(self.products_url, {"fields": "id,secret"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncAuthViewTests(TestCase):
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+        Role.objects.get_or_create(name="User")
+
+    def post(self, view, data=None, token=None):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        request = self.factory.post("/", data or {}, content_type="application/json", headers=headers)
+        return view.as_view()(request)
+
+    async def test_register_login_logout(self):
+        response = await self.post(AsyncRegisterView, {
+            "full_name": "Async User",
+            "email": "async@example.com",
+            "password": "password123",
+            "password_repeat": "password123"
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = await self.post(AsyncLoginView, {"email": "async@example.com", "password": "wrong"})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = await self.post(AsyncLoginView, {"email": "async@example.com", "password": "password123"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        token = json.loads(response.content)["token"]
+
+        response = await self.post(AsyncLogoutView, token=token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(await RevokedToken.objects.filter(token=token).aexists())
+
+        # The revoked token can no longer be used
+        response = await self.post(AsyncLogoutView, token=token)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+# URLconf of AsyncMiddlewareTests: the async login view regardless of ASYNC_AUTH_VIEWS
+urlpatterns = [path("auth/login/", AsyncLoginView.as_view())]
+
+
+@override_settings(ROOT_URLCONF="api.tests")
+class AsyncMiddlewareTests(TestCase):
+    def test_asgi_chain_is_not_adapted_to_sync(self):
+        # Django logs every middleware it has to wrap in sync_to_async or async_to_sync
+        with override_settings(DEBUG=True), self.assertNoLogs("django.request", "DEBUG"):
+            handler = ASGIHandler()
+        self.assertTrue(iscoroutinefunction(handler._middleware_chain))
+
+    @override_settings(QUERY_COUNT_HEADER=True)
+    async def test_async_view_through_async_chain(self):
+        role = await Role.objects.aget_or_create(name="User")
+        await User.objects.acreate(
+            email="async@example.com", full_name="Async User", role=role[0],
+            password_hash=hash_password("password123"),
+        )
+        response = await self.async_client.post(
+            "/auth/login/", {"email": "async@example.com", "password": "password123"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("token", json.loads(response.content))
+        # Counted although the ORM ran in a sync_to_async worker thread
+        self.assertEqual(response["X-DB-Queries"], "1")
+
+
+class DatabasePoolStatsTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email="admin@example.com",
+            full_name="Admin User",
+            password="password123"
+        )
+        cls.user = User.objects.create_user(
+            email="user@example.com",
+            full_name="Normal User",
+            password="password123",
+            role_name="User"
+        )
+        cls.url = reverse("db-pool-stats")
+
+    def test_admin_sees_pool_stats(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.admin.id, 'Admin')}")
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("pid", response.data)
+        self.assertEqual(response.data["databases"][0]["alias"], "default")
+
+    def test_non_admin_is_forbidden(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.user.id, 'User')}")
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(DATABASE_REPLICAS=["replica_1"], READ_YOUR_WRITES_SECONDS=5)
+class ReadReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+        cache.clear()
+
+    def route_read(self, request):
+        """Runs the middleware and returns the alias chosen for a Product read."""
+        routed = {}
+
+        def get_response(request):
+            routed["db"] = self.router.db_for_read(Product)
+            return HttpResponse(status=200)
+
+        ReadYourWritesMiddleware(get_response)(request)
+        return routed["db"]
+
+    def test_reads_go_to_replica_and_writes_to_primary(self):
+        self.assertEqual(self.router.db_for_read(Product), "replica_1")
+        self.assertEqual(self.router.db_for_write(Product), "default")
+        self.assertEqual(self.router.db_for_read(RevokedToken), "default")
+
+    def test_client_reads_stick_to_primary_after_write(self):
+        headers = {"Authorization": f"Bearer {create_jwt(42, 'User')}"}
+        other = {"Authorization": f"Bearer {create_jwt(43, 'User')}"}
+
+        self.assertEqual(self.route_read(self.factory.get("/api/products/", headers=headers)), "replica_1")
+        self.assertEqual(self.route_read(self.factory.put("/api/auth/profile/", headers=headers)), "default")
+        self.assertEqual(self.route_read(self.factory.get("/api/products/", headers=headers)), "default")
+        self.assertEqual(self.route_read(self.factory.get("/api/products/", headers=other)), "replica_1")
+
+
+class SoftDeleteCascadeTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="owner@example.com",
+            full_name="Store Owner",
+            password="password123",
+            role_name="User"
+        )
+        cls.other = User.objects.create_user(
+            email="other@example.com",
+            full_name="Other User",
+            password="password123",
+            role_name="User"
+        )
+        cls.store = Store.objects.create(name="Owner Store", owner=cls.user)
+        cls.other_store = Store.objects.create(name="Other Store", owner=cls.other)
+        Product.objects.create(name="Own", price="1.00", store=cls.store, owner=cls.user)
+        Product.objects.create(name="Listed", price="1.00", store=cls.store, owner=cls.other)
+        Product.objects.create(name="Elsewhere", price="1.00", store=cls.other_store, owner=cls.other)
+
+    def test_soft_delete_deactivates_stores_and_products_in_bulk(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.user.id, 'User')}")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(reverse("soft-delete"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        updates = [q["sql"] for q in queries.captured_queries if q["sql"].startswith("UPDATE")]
+        # user, stores, products, and the stores' active_product_count
+        self.assertEqual(len(updates), 4)
+
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertTrue(User.all_objects.filter(pk=self.user.pk).exists())
+        self.assertEqual(list(Store.objects.values_list("name", flat=True)), ["Other Store"])
+        self.assertEqual(list(Product.objects.values_list("name", flat=True)), ["Elsewhere"])
+
+        # The token of a deactivated user no longer authenticates
+        response = self.client.delete(reverse("soft-delete"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(BACKGROUND_DELETE_THRESHOLD=3)
+class BackgroundDeletionTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email="admin@example.com",
+            full_name="Admin User",
+            password="password123"
+        )
+        cls.owner = User.objects.create_user(
+            email="owner@example.com",
+            full_name="Store Owner",
+            password="password123",
+            role_name="User"
+        )
+        cls.big_store = Store.objects.create(name="Big Store", owner=cls.owner)
+        cls.small_store = Store.objects.create(name="Small Store", owner=cls.admin)
+        for i in range(2):
+            product = Product.objects.create(name=f"Product {i}", price="5.00", store=cls.big_store, owner=cls.owner)
+            Order.objects.create(product=product, user=cls.admin, quantity=1)
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.admin.id, 'Admin')}")
+
+    def test_small_delete_runs_inline(self):
+        response = self.client.delete(reverse("store-detail", args=[self.small_store.id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Store.all_objects.filter(pk=self.small_store.id).exists())
+
+    def test_large_delete_is_accepted_and_runs_in_batches(self):
+        response = self.client.delete(reverse("store-detail", args=[self.big_store.id]))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job_id = response.data["id"]
+        self.assertEqual(response.data["status"], "pending")
+        # Hidden right away with its products, deleted by the job
+        self.assertFalse(Store.objects.filter(pk=self.big_store.id).exists())
+        self.assertFalse(Product.objects.filter(store_id=self.big_store.id).exists())
+
+        job = run_deletion_job(job_id, batch_size=1)
+        self.assertEqual(job.status, "completed")
+        self.assertEqual(job.rows_deleted, 5)
+        self.assertFalse(Store.all_objects.filter(pk=self.big_store.id).exists())
+        self.assertFalse(Product.all_objects.filter(store_id=self.big_store.id).exists())
+        self.assertFalse(Order.objects.exists())
+
+        response = self.client.get(response["Location"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["rows_deleted"], 5)
+
+    def test_user_deletion_hides_their_stores_and_products(self):
+        response = self.client.delete(reverse("user-detail", args=[self.owner.id]))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertFalse(Store.objects.filter(owner=self.owner).exists())
+        self.assertFalse(Product.objects.filter(owner=self.owner).exists())
+        self.assertEqual(Store.all_objects.get(pk=self.big_store.id).active_product_count, 0)
+
+    def test_resume_only_takes_over_jobs_without_a_heartbeat(self):
+        response = self.client.delete(reverse("store-detail", args=[self.big_store.id]))
+        job = DeletionJob.objects.get(pk=response.data["id"])
+        lease = DeletionJob.objects.filter(pk=job.pk)
+        lease.update(status="running", claimed_at=timezone.now(), heartbeat_at=timezone.now())
+
+        # Its runner is alive
+        self.assertIsNone(run_deletion_job(job.pk, batch_size=1, resume=True))
+        self.assertTrue(Store.all_objects.filter(pk=self.big_store.id).exists())
+
+        # ... until the heartbeat is older than the lease
+        lease.update(heartbeat_at=timezone.now() - timedelta(seconds=settings.DELETION_JOB_LEASE_SECONDS + 1))
+        job = run_deletion_job(job.pk, batch_size=1, resume=True)
+        self.assertEqual(job.status, "completed")
+        self.assertEqual(job.rows_deleted, 5)
+
+    def test_runner_stops_when_its_job_is_taken_over(self):
+        response = self.client.delete(reverse("store-detail", args=[self.big_store.id]))
+        job_id = response.data["id"]
+
+        def take_over(**kwargs):
+            # Another runner claims the job while the first batch is deleted
+            DeletionJob.objects.filter(pk=job_id).update(claimed_at=timezone.now())
+
+        post_delete.connect(take_over, sender=Order, dispatch_uid="test_take_over")
+        self.addCleanup(post_delete.disconnect, sender=Order, dispatch_uid="test_take_over")
+        with self.assertLogs("api.jobs", "WARNING"):
+            self.assertIsNone(run_deletion_job(job_id, batch_size=1))
+        # The superseded runner's batch was rolled back, nothing was counted
+        self.assertEqual(DeletionJob.objects.get(pk=job_id).rows_deleted, 0)
+        self.assertEqual(Order.objects.count(), 2)
+
+
+class AuditLogTests(APITestCase):
+    def setUp(self):
+        self.buffer = AuditBuffer(capacity=10, batch_size=2, flush_interval=60, block_timeout=0, autostart=False)
+        self.admin = User.objects.create_superuser(
+            email="admin@example.com",
+            full_name="Admin User",
+            password="password123"
+        )
+
+    def test_changes_are_buffered_then_flushed_in_batches(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.admin.id, 'Admin')}")
+        with mock.patch("api.audit.audit_buffer", self.buffer), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("store-list"), {"name": "Audited Store"}, format="json")
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            response = self.client.delete(reverse("store-detail", args=[response.data["id"]]))
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        # Nothing is written until the buffer flushes
+        self.assertFalse(AuditLog.objects.exists())
+        self.assertEqual(self.buffer.flush(), 2)
+
+        entries = list(AuditLog.objects.order_by("id"))
+        self.assertEqual([e.action for e in entries], ["create", "delete"])
+        self.assertEqual(entries[0].model, "api.store")
+        self.assertEqual(entries[0].actor_id, self.admin.id)
+        self.assertEqual(entries[0].changes["name"], "Audited Store")
+        self.assertEqual(self.buffer.get_stats()["flushed"], 2)
+
+    def test_full_buffer_drops_and_counts(self):
+        buffer = AuditBuffer(capacity=1, batch_size=10, flush_interval=60, block_timeout=0, autostart=False)
+        self.assertTrue(buffer.put(AuditLog(model="api.store", object_id="1", action="update")))
+        self.assertFalse(buffer.put(AuditLog(model="api.store", object_id="2", action="update")))
+        stats = buffer.get_stats()
+        self.assertEqual((stats["enqueued"], stats["dropped"], stats["buffered"]), (1, 1, 1))
+
+
+class ChangeFeedTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email="admin@example.com",
+            full_name="Admin User",
+            password="password123"
+        )
+        cls.user = User.objects.create_user(
+            email="user@example.com",
+            full_name="Normal User",
+            password="password123",
+            role_name="User"
+        )
+        products_element, _ = BusinessElement.objects.get_or_create(name="Products")
+        AccessRoleRule.objects.update_or_create(
+            role=cls.user.role, element=products_element, defaults=dict(read_permission=True)
+        )
+
+        store = Store.objects.create(name="Feed Store", owner=cls.admin)
+        cls.own = Product.objects.create(name="Own", price="1.00", store=store, owner=cls.user)
+        other = Product.objects.create(name="Other", price="1.00", store=store, owner=cls.admin)
+        cls.own.price = "2.00"
+        cls.own.save()
+        other.delete()
+        cls.url = reverse("changes")
+
+    def test_admin_reads_all_changes_incrementally(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.admin.id, 'Admin')}")
+        response = self.client.get(self.url, {"limit": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(e["entity_type"], e["operation"]) for e in response.data["results"]],
+            [("store", "create"), ("product", "create")]
+        )
+        self.assertTrue(response.data["has_more"])
+
+        response = self.client.get(self.url, {"since": response.data["next_cursor"]})
+        self.assertEqual(
+            [(e["entity_type"], e["operation"]) for e in response.data["results"]],
+            [("product", "create"), ("product", "update"), ("product", "delete")]
+        )
+        self.assertFalse(response.data["has_more"])
+
+    def test_owner_scoped_rule_only_sees_own_objects(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.user.id, 'User')}")
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({e["entity_id"] for e in response.data["results"]}, {self.own.id})
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_entries_of_open_transactions_are_held_back(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.admin.id, 'Admin')}")
+        # An entry with a lower id whose transaction is still open at the horizon
+        pending = ChangeLogEntry.objects.order_by("id").first()
+        ChangeLogEntry.objects.filter(pk=pending.pk).update(txid=10)
+        ChangeLogEntry.objects.exclude(pk=pending.pk).update(txid=5)
+
+        with mock.patch.object(ChangeLogEntry, "visibility_horizon", return_value=10):
+            response = self.client.get(self.url)
+        self.assertNotIn(pending.id, [e["id"] for e in response.data["results"]])
+        self.assertEqual(len(response.data["results"]), 4)
+
+        with mock.patch.object(ChangeLogEntry, "visibility_horizon", return_value=11):
+            response = self.client.get(self.url, {"since": response.data["next_cursor"]})
+        self.assertEqual([e["id"] for e in response.data["results"]], [pending.id])
+        self.assertEqual(response.data["next_cursor"], f"10-{pending.id}")
+
+    def test_bulk_soft_delete_is_logged(self):
+        since = ChangeLogEntry.objects.order_by("-id").values_list("id", flat=True).first()
+        self.user.soft_delete()
+        entries = ChangeLogEntry.objects.filter(id__gt=since)
+        self.assertEqual([(e.entity_type, e.entity_id) for e in entries], [("product", self.own.id)])
+
+
+class OrderFilterTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email="admin@example.com",
+            full_name="Admin User",
+            password="password123"
+        )
+        store = Store.objects.create(name="Order Store", owner=cls.admin)
+        product = Product.objects.create(name="Item", price="5.00", store=store, owner=cls.admin)
+        cls.march = Order.objects.create(product=product, user=cls.admin, status="completed")
+        cls.april = Order.objects.create(product=product, user=cls.admin, status="pending")
+        Order.objects.filter(pk=cls.march.pk).update(created_at=datetime(2024, 3, 15, tzinfo=dt_timezone.utc))
+        Order.objects.filter(pk=cls.april.pk).update(created_at=datetime(2024, 4, 2, tzinfo=dt_timezone.utc))
+        cls.url = reverse("order-list")
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.admin.id, 'Admin')}")
+
+    def ids(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [order["id"] for order in response.data]
+
+    def test_filters_by_month_range_and_status(self):
+        self.assertEqual(self.ids({}), [self.april.id, self.march.id])
+        self.assertEqual(self.ids({"month": "2024-03"}), [self.march.id])
+        self.assertEqual(self.ids({"created_after": "2024-04-01"}), [self.april.id])
+        self.assertEqual(self.ids({"created_before": "2024-04-01T00:00:00Z"}), [self.march.id])
+        self.assertEqual(self.ids({"status": "pending", "month": "2024-03"}), [])
+
+    def test_invalid_filters_are_rejected(self):
+        for params in ({"month": "2024-13"}, {"created_after": "yesterday"}, {"status": "lost"}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_read_rule_only_sees_and_creates_own_orders(self):
+        user = User.objects.create_user(
+            email="buyer@example.com", full_name="Buyer", password="password123", role_name="User"
+        )
+        orders_element, _ = BusinessElement.objects.get_or_create(name="Orders")
+        AccessRoleRule.objects.update_or_create(
+            role=user.role, element=orders_element, defaults=dict(read_permission=True, create_permission=True)
+        )
+        own = Order.objects.create(product=self.march.product, user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(user.id, 'User')}")
+
+        self.assertEqual(self.ids({}), [own.id])
+        response = self.client.get(reverse("order-detail", args=[self.march.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.post(self.url, {"product": self.march.product_id, "user": self.admin.id})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["user"], user.id)
+        self.assertEqual(Order.objects.filter(user=self.admin).count(), 2)
+
+
+class OrderArchiveTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            email="admin@example.com",
+            full_name="Admin User",
+            password="password123"
+        )
+        self.user = User.objects.create_user(
+            email="user@example.com",
+            full_name="Normal User",
+            password="password123",
+            role_name="User"
+        )
+        store = Store.objects.create(name="Archive Store", owner=self.admin)
+        product = Product.objects.create(name="Item", price="5.00", store=store, owner=self.admin)
+        self.old = Order.objects.create(
+            product=product, user=self.admin, quantity=3, total_price="15.00", status="completed"
+        )
+        self.open = Order.objects.create(product=product, user=self.admin, status="pending")
+        Order.objects.update(created_at=datetime(2023, 1, 10, tzinfo=dt_timezone.utc))
+
+        archive_root = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_root.cleanup)
+        settings_override = override_settings(
+            ORDER_ARCHIVE={"DIR": archive_root.name, "OLDER_THAN_DAYS": 30, "BATCH_SIZE": 1}
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_archived_order_moves_out_and_is_still_retrievable(self):
+        self.assertEqual(archive_orders(), 1)
+        self.assertEqual(list(Order.objects.values_list("id", flat=True)), [self.open.id])
+        self.assertFalse(ChangeLogEntry.objects.filter(operation="delete").exists())
+        archived = ChangeLogEntry.objects.get(operation="archive")
+        self.assertEqual((archived.entity_type, archived.entity_id), ("order", self.old.id))
+        # Lifetime revenue keeps the archived order
+        self.assertFalse(find_drift().exists())
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.admin.id, 'Admin')}")
+        response = self.client.get(reverse("order-detail", args=[self.old.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["quantity"], 3)
+        self.assertEqual(response.data["total_price"], "15.00")
+        self.assertEqual(response.data["owner"], self.admin.id)
+
+        response = self.client.delete(reverse("order-detail", args=[self.old.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_archived_order_keeps_object_permissions(self):
+        orders_element, _ = BusinessElement.objects.get_or_create(name="Orders")
+        AccessRoleRule.objects.update_or_create(
+            role=self.user.role, element=orders_element, defaults=dict(read_permission=True)
+        )
+        archive_orders()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.user.id, 'User')}")
+        response = self.client.get(reverse("order-detail", args=[self.old.id]))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class StoreCounterTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email="admin@example.com",
+            full_name="Admin User",
+            password="password123"
+        )
+        cls.store = Store.objects.create(name="Counter Store", owner=cls.admin)
+        cls.other_store = Store.objects.create(name="Other Store", owner=cls.admin)
+
+    def counters(self, store):
+        store = Store.all_objects.get(pk=store.pk)
+        return store.product_count, store.active_product_count, store.order_revenue
+
+    def test_product_changes_adjust_counts(self):
+        first = Product.objects.create(name="First", price="2.00", store=self.store, owner=self.admin)
+        second = Product.objects.create(name="Second", price="3.00", store=self.store, owner=self.admin)
+        self.assertEqual(self.counters(self.store)[:2], (2, 2))
+
+        second.is_active = False
+        second.save()
+        self.assertEqual(self.counters(self.store)[:2], (2, 1))
+
+        moved = Product.objects.only("id", "name").get(pk=first.pk)
+        moved.store = self.other_store
+        moved.save()
+        self.assertEqual(self.counters(self.store)[:2], (1, 0))
+        self.assertEqual(self.counters(self.other_store)[:2], (1, 1))
+
+        second.delete()
+        self.assertEqual(self.counters(self.store)[:2], (0, 0))
+
+    def test_order_revenue_follows_status_and_deletes(self):
+        product = Product.objects.create(name="Item", price="5.00", store=self.store, owner=self.admin)
+        order = Order.objects.create(product=product, user=self.admin, quantity=2, total_price="10.00")
+        Order.objects.create(product=product, user=self.admin, total_price="5.00")
+        self.assertEqual(self.counters(self.store)[2], Decimal("15.00"))
+
+        order.status = "cancelled"
+        order.save()
+        self.assertEqual(self.counters(self.store)[2], Decimal("5.00"))
+
+        Order.objects.filter(status="pending").delete()
+        self.assertEqual(self.counters(self.store)[2], Decimal("0.00"))
+
+    def test_soft_delete_refreshes_active_counts(self):
+        owner = User.objects.create_user(
+            email="owner@example.com", full_name="Owner", password="password123", role_name="User"
+        )
+        Product.objects.create(name="Owned", price="1.00", store=self.store, owner=owner)
+        Product.objects.create(name="Kept", price="1.00", store=self.store, owner=self.admin)
+        owner.soft_delete()
+        self.assertEqual(self.counters(self.store)[:2], (2, 1))
+
+    def test_drift_is_detected_and_repaired(self):
+        product = Product.objects.create(name="Item", price="5.00", store=self.store, owner=self.admin)
+        Order.objects.create(product=product, user=self.admin, total_price="5.00")
+        Store.all_objects.filter(pk=self.store.pk).update(product_count=7, order_revenue=0)
+
+        drifted = list(find_drift())
+        self.assertEqual([row["pk"] for row in drifted], [self.store.pk])
+        self.assertEqual(drifted[0]["expected_product_count"], 1)
+
+        repair([self.store.pk])
+        self.assertEqual(self.counters(self.store), (1, 1, Decimal("5.00")))
+        self.assertFalse(find_drift().exists())
+
+    def test_counters_are_opt_in_on_the_api(self):
+        Product.objects.create(name="Item", price="5.00", store=self.store, owner=self.admin)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.admin.id, 'Admin')}")
+        url = reverse("store-detail", args=[self.store.pk])
+
+        self.assertNotIn("product_count", self.client.get(url).data)
+        response = self.client.get(url, {"include_counters": "1"})
+        self.assertEqual(response.data["product_count"], 1)
+        self.assertEqual(response.data["active_product_count"], 1)
+        self.assertEqual(response.data["order_revenue"], "0.00")
+
+    def test_counters_can_be_selected_as_fields(self):
+        Product.objects.create(name="Item", price="5.00", store=self.store, owner=self.admin)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.admin.id, 'Admin')}")
+        url = reverse("store-detail", args=[self.store.pk])
+
+        response = self.client.get(url, {"fields": "id,product_count"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"id": self.store.pk, "product_count": 1})
+        response = self.client.get(url, {"fields": "id,product_count", "include_counters": "1"})
+        self.assertEqual(response.data, {"id": self.store.pk, "product_count": 1})
+        # `exclude` alone keeps the counters opt-in
+        self.assertNotIn("product_count", self.client.get(url, {"exclude": "address"}).data)
+
+
+class StoreRepriceTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email="admin@example.com",
+            full_name="Admin User",
+            password="password123"
+        )
+        cls.user = User.objects.create_user(
+            email="user@example.com",
+            full_name="Normal User",
+            password="password123",
+            role_name="User"
+        )
+        cls.store = Store.objects.create(name="Reprice Store", owner=cls.admin)
+        cls.own = Product.objects.create(name="Own", price="10.00", store=cls.store, owner=cls.user)
+        cls.other = Product.objects.create(name="Other", price="3.33", store=cls.store, owner=cls.admin)
+        cls.url = reverse("store-reprice", args=[cls.store.pk])
+
+    def prices(self):
+        return dict(Product.all_objects.values_list("name", "price"))
+
+    def test_admin_reprices_in_a_single_update(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.admin.id, 'Admin')}")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {"percent": "10"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"updated": 2})
+        updates = [q["sql"] for q in queries.captured_queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.prices(), {"Own": Decimal("11.00"), "Other": Decimal("3.66")})
+        self.assertEqual(ChangeLogEntry.objects.filter(entity_type="product", operation="update").count(), 2)
+
+        response = self.client.post(self.url, {"amount": "-5", "max_price": "5"}, format="json")
+        self.assertEqual(response.data, {"updated": 1})
+        self.assertEqual(self.prices()["Other"], Decimal("0.00"))
+
+    def test_owner_only_rule_limits_rows(self):
+        products_element, _ = BusinessElement.objects.get_or_create(name="Products")
+        rule, _ = AccessRoleRule.objects.update_or_create(
+            role=self.user.role, element=products_element, defaults=dict(update_permission=False)
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.user.id, 'User')}")
+        response = self.client.post(self.url, {"amount": "1"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        rule.update_permission = True
+        rule.save()
+        response = self.client.post(self.url, {"amount": "1"}, format="json")
+        self.assertEqual(response.data, {"updated": 1})
+        self.assertEqual(self.prices(), {"Own": Decimal("11.00"), "Other": Decimal("3.33")})
+
+    def test_body_needs_exactly_one_change(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.admin.id, 'Admin')}")
+        for body in ({}, {"percent": "5", "amount": "1"}, {"percent": "-150"}):
+            response = self.client.post(self.url, body, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, body)
+
+
+class CatalogSnapshotTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            email="admin@example.com",
+            full_name="Admin User",
+            password="password123"
+        )
+        self.user = User.objects.create_user(
+            email="user@example.com",
+            full_name="Normal User",
+            password="password123",
+            role_name="User"
+        )
+        self.store = Store.objects.create(name="Snapshot Store", address="Main St 1", owner=self.admin)
+        self.other_store = Store.objects.create(name="Plain Store", owner=self.user)
+        self.product = Product.objects.create(
+            name="Café", description="ünïcode", price="12.50", store=self.store, owner=self.user
+        )
+        Product.objects.create(name="Plain", price="0.99", store=self.other_store, owner=self.admin)
+        Product.objects.create(name="Hidden", price="1.00", store=self.store, owner=self.admin, is_active=False)
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = f"{directory.name}/catalog.snapshot"
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.admin.id, 'Admin')}")
+        cache.clear()  # read-your-writes markers of other tests
+
+    def fetch(self, name, *args, **params):
+        response = self.client.get(reverse(name, args=args), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return json.loads(response.content)
+
+    def test_snapshot_matches_database_responses_without_catalog_queries(self):
+        requests = [
+            ("product-list", (), {}),
+            ("product-list", (), {"store": self.store.pk}),
+            ("product-list", (), {"owner": self.admin.pk}),
+            ("product-detail", (self.product.pk,), {"fields": "id,name,price"}),
+            ("store-list", (), {"include_counters": "1"}),
+            ("store-list", (), {"owner": self.user.pk}),
+            ("store-detail", (self.store.pk,), {}),
+        ]
+        expected = [self.fetch(name, *args, **params) for name, args, params in requests]
+
+        snapshot_settings = {"ENABLED": True, "PATH": self.path}
+        with override_settings(CATALOG_SNAPSHOT=snapshot_settings):
+            build_snapshot()
+            with CaptureQueriesContext(connection) as queries:
+                served = [self.fetch(name, *args, **params) for name, args, params in requests]
+
+        self.assertEqual(served, expected)
+        catalog_queries = [q["sql"] for q in queries.captured_queries if "api_product" in q["sql"] or "api_store" in q["sql"]]
+        self.assertEqual(catalog_queries, [])
+
+    def test_rebuild_is_picked_up_and_unknown_ids_fall_back(self):
+        with override_settings(CATALOG_SNAPSHOT={"ENABLED": True, "PATH": self.path}):
+            build_snapshot()
+            self.assertEqual(len(self.fetch("product-list")), 2)
+
+            created = Product.objects.create(name="New", price="2.00", store=self.store, owner=self.admin)
+            self.assertEqual(self.fetch("product-detail", created.pk)["name"], "New")
+            self.assertEqual(len(self.fetch("product-list")), 2)
+
+            build_snapshot()
+            self.assertEqual(len(self.fetch("product-list")), 3)
+
+    def test_writer_reads_its_own_changes_without_replicas(self):
+        with override_settings(CATALOG_SNAPSHOT={"ENABLED": True, "PATH": self.path}, DATABASE_REPLICAS=[]):
+            build_snapshot()
+            response = self.client.patch(reverse("product-detail", args=[self.product.pk]), {"name": "Renamed"})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(self.fetch("product-detail", self.product.pk)["name"], "Renamed")
+
+            response = self.client.delete(reverse("product-detail", args=[self.product.pk]))
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+            response = self.client.get(reverse("product-detail", args=[self.product.pk]))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_change_committed_behind_the_cursor_makes_snapshot_stale(self):
+        # The lowest catalog entry belongs to a transaction still open at the first build
+        pending = ChangeLogEntry.objects.order_by("id").first()
+        ChangeLogEntry.objects.filter(pk=pending.pk).update(txid=10)
+        ChangeLogEntry.objects.exclude(pk=pending.pk).update(txid=5)
+        with override_settings(CATALOG_SNAPSHOT={"ENABLED": True, "PATH": self.path}):
+            with mock.patch.object(ChangeLogEntry, "visibility_horizon", return_value=10):
+                build_snapshot()
+            built = snapshot.get_snapshot().cursor
+            self.assertEqual(built[0], 5)
+
+            with mock.patch.object(ChangeLogEntry, "visibility_horizon", return_value=11):
+                self.assertEqual(snapshot.catalog_cursor(), (10, pending.id))
+                self.assertLess(built, snapshot.catalog_cursor())
+
+    def test_object_permissions_apply_to_snapshot_reads(self):
+        products_element, _ = BusinessElement.objects.get_or_create(name="Products")
+        AccessRoleRule.objects.update_or_create(
+            role=self.user.role, element=products_element, defaults=dict(read_permission=True)
+        )
+        with override_settings(CATALOG_SNAPSHOT={"ENABLED": True, "PATH": self.path}):
+            build_snapshot()
+            self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.user.id, 'User')}")
+            self.assertEqual(self.fetch("product-detail", self.product.pk)["price"], "12.50")
+            other = Product.objects.get(name="Plain")
+            response = self.client.get(reverse("product-detail", args=[other.pk]))
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class QueryCountHeaderTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email="admin@example.com",
+            full_name="Admin User",
+            password="password123"
+        )
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.admin.id, 'Admin')}")
+
+    def test_header_reports_queries_when_enabled(self):
+        self.assertNotIn("X-DB-Queries", self.client.get(reverse("store-list")))
+
+        with override_settings(QUERY_COUNT_HEADER=True):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse("store-list"))
+        self.assertEqual(int(response["X-DB-Queries"]), len(queries.captured_queries))
+
+
+class QueryBudgetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email="admin@example.com",
+            full_name="Admin User",
+            password="password123"
+        )
+        store = Store.objects.create(name="Budget Store", owner=cls.admin)
+        for i in range(5):
+            owner = User.objects.create_user(
+                email=f"owner{i}@example.com",
+                full_name=f"Owner {i}",
+                password="password123",
+                role_name="User"
+            )
+            Product.objects.create(name=f"Product {i}", price="1.00", store=store, owner=owner)
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.admin.id, 'Admin')}")
+
+    def budgets(self, **overrides):
+        return override_settings(QUERY_BUDGETS={**settings.QUERY_BUDGETS, **overrides})
+
+    def test_fingerprint_normalizes_literals(self):
+        self.assertEqual(
+            fingerprint("SELECT *  FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+            "SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?"
+        )
+
+    def test_list_cost_does_not_grow_with_rows(self):
+        with self.budgets(RAISE=True):
+            response = self.client.get(reverse("product-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len({product["owner"] for product in response.data}), 5)
+
+    def test_over_budget_request_raises_with_the_sql(self):
+        with self.budgets(RAISE=True), \
+                mock.patch.object(ProductViewSet, "query_budgets", {"default": QueryBudget(queries=1)}):
+            with self.assertRaises(QueryBudgetExceeded) as raised:
+                self.client.get(reverse("product-list"))
+        message = str(raised.exception)
+        self.assertIn("GET /api/products/ (product-list) ran 3 queries (budget 1)", message)
+        self.assertIn('FROM "api_product"', message)
+
+    def test_over_budget_request_is_logged_when_sampled(self):
+        with self.budgets(RAISE=False, SAMPLE_RATE=1.0), \
+                mock.patch.object(ProductViewSet, "query_budgets", {"list": QueryBudget(queries=1)}):
+            with self.assertLogs("api.middleware", "WARNING") as logs:
+                response = self.client.get(reverse("product-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("over its query budget: 3 queries (budget 1)", logs.output[0])
+
+
+class ProfilingTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email="admin@example.com",
+            full_name="Admin User",
+            password="password123"
+        )
+        cls.user = User.objects.create_user(
+            email="user@example.com",
+            full_name="Normal User",
+            password="password123",
+            role_name="User"
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(
+            PROFILING={"DIR": directory.name, "SAMPLE_RATE": 0, "TOKEN_MAX_AGE": 60, "KEEP": 2}
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.admin.id, 'Admin')}")
+
+    def test_signed_token_profiles_the_request(self):
+        response = self.client.get(reverse("store-list"))
+        self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(profiling.list_profiles(), [])
+
+        token = profiling.make_token("/api/stores/")
+        response = self.client.get(reverse("store-list"), HTTP_X_PROFILE_TOKEN=token)
+        profile_id = response["X-Profile-Id"]
+
+        profiles = self.client.get(reverse("profile-list")).data
+        self.assertEqual([(p["id"], p["path"], p["trigger"]) for p in profiles], [(profile_id, "/api/stores/", "token")])
+
+        response = self.client.get(reverse("profile-detail", args=[profile_id]), {"output": "text"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("function calls", response.content.decode())
+        response = self.client.get(reverse("profile-detail", args=[profile_id]))
+        self.assertEqual(response["Content-Disposition"], f'attachment; filename="{profile_id}.prof"')
+
+    def test_request_id_cannot_name_the_profile(self):
+        token = profiling.make_token("/api/stores/")
+        request_id = uuid.uuid4().hex
+        ids = [
+            self.client.get(reverse("store-list"), HTTP_X_PROFILE_TOKEN=token, HTTP_X_REQUEST_ID=request_id)["X-Profile-Id"]
+            for _ in range(2)
+        ]
+        self.assertNotIn(request_id, ids)
+        self.assertNotEqual(ids[0], ids[1])
+        self.assertEqual([p["request_id"] for p in profiling.list_profiles()], [request_id, request_id])
+
+    def test_invalid_or_out_of_scope_tokens_are_ignored(self):
+        token = profiling.make_token("/api/products/")
+        for value in (token, token + "x"):
+            response = self.client.get(reverse("store-list"), HTTP_X_PROFILE_TOKEN=value)
+            self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(profiling.list_profiles(), [])
+
+    def test_only_admins_read_profiles(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.user.id, 'User')}")
+        self.assertEqual(self.client.get(reverse("profile-list")).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class MetricsTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email="admin@example.com",
+            full_name="Admin User",
+            password="password123"
+        )
+        cls.user = User.objects.create_user(
+            email="user@example.com",
+            full_name="Normal User",
+            password="password123",
+            role_name="User"
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(METRICS={"ENABLED": True, "DIR": self.directory, "TOKEN": ""})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def scrape(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.content.decode().splitlines()
+
+    def test_requests_and_hot_paths_are_recorded(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.admin.id, 'Admin')}")
+        self.client.get(reverse("store-list"))
+        # No Stores rule for the User role
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.user.id, 'User')}")
+        self.assertEqual(self.client.get(reverse("store-list")).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer not-a-jwt")
+        self.client.get(reverse("store-list"))
+        revoked = create_jwt(self.admin.id, "Admin")
+        RevokedToken.objects.create(token=revoked)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {revoked}")
+        self.client.get(reverse("store-list"))
+
+        lines = self.scrape()
+        self.assertIn('http_responses_total{view="store-list",method="GET",status="200"} 1.0', lines)
+        self.assertIn('http_responses_total{view="store-list",method="GET",status="403"} 1.0', lines)
+        self.assertIn('http_responses_total{view="store-list",method="GET",status="401"} 2.0', lines)
+        self.assertIn('http_request_duration_seconds_bucket{view="store-list",method="GET",le="+Inf"} 4.0', lines)
+        self.assertIn('http_request_db_queries_count{view="store-list",method="GET"} 4.0', lines)
+        self.assertIn('permission_denials_total{element="Stores",action="list"} 1.0', lines)
+        self.assertIn('jwt_decode_failures_total{reason="invalid"} 1.0', lines)
+        self.assertIn("revoked_token_hits_total 1.0", lines)
+        self.assertIn("# TYPE bcrypt_duration_seconds histogram", lines)
+
+    def test_middleware_decoding_a_token_is_not_counted(self):
+        # ReadYourWritesMiddleware decodes the token again before authentication runs
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION="Bearer not-a-jwt")
+        self.assertEqual(ReadYourWritesMiddleware.client_key(request), "addr:127.0.0.1")
+        self.assertFalse(any(line.startswith("jwt_decode_failures_total{") for line in self.scrape()))
+
+    def test_samples_of_all_processes_are_added_up(self):
+        other = metrics._ValueFile(Path(self.directory) / "1.db")
+        other.add(json.dumps(["revoked_token_hits_total", []]), 2)
+        metrics.REVOKED_TOKEN_HITS.inc()
+        self.assertIn("revoked_token_hits_total 3.0", self.scrape())
+
+    def test_token_is_required_when_configured(self):
+        with override_settings(METRICS={"ENABLED": True, "DIR": self.directory, "TOKEN": "scrape-secret"}):
+            self.assertEqual(self.client.get("/metrics").status_code, status.HTTP_401_UNAUTHORIZED)
+            response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer scrape-secret")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class TracingTests(APITestCase):
+    traceparent = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email="admin@example.com",
+            full_name="Admin User",
+            password="password123"
+        )
+        store = Store.objects.create(name="Traced Store", owner=cls.admin)
+        Product.objects.create(name="Traced", price="1.00", store=store, owner=cls.admin)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.file = Path(directory.name) / "traces.jsonl"
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.admin.id, 'Admin')}")
+
+    def tracing(self, ratio):
+        return override_settings(TRACING={"ENABLED": True, "SAMPLE_RATIO": ratio, "FILE": self.file, "SERVICE_NAME": "test"})
+
+    def exported_spans(self):
+        if not self.file.exists():
+            return []
+        lines = self.file.read_text().splitlines()
+        return [
+            span
+            for line in lines
+            for resource in json.loads(line)["resourceSpans"]
+            for scope in resource["scopeSpans"]
+            for span in scope["spans"]
+        ]
+
+    def test_inbound_trace_is_continued_with_pipeline_spans(self):
+        with self.tracing(0.0):
+            response = self.client.get(reverse("product-list"), HTTP_TRACEPARENT=self.traceparent)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["traceresponse"].startswith("00-0af7651916cd43dd8448eb211c80319c-"))
+
+        spans = {span["name"]: span for span in self.exported_spans()}
+        self.assertEqual({span["traceId"] for span in spans.values()}, {"0af7651916cd43dd8448eb211c80319c"})
+        root = spans["GET /api/products/"]
+        self.assertEqual(root["parentSpanId"], "b7ad6b7169203331")
+        for name in ("JWTAuthentication.authenticate", "RoleBasedPermission.has_permission",
+                     "serialize ProductSerializer", "render json", "db.query"):
+            self.assertIn(name, spans)
+        authenticate = spans["JWTAuthentication.authenticate"]
+        for name in ("auth.revocation_check", "auth.jwt_decode", "auth.user_fetch"):
+            self.assertEqual(spans[name]["parentSpanId"], authenticate["spanId"])
+
+    def test_sampling(self):
+        unsampled = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-00"
+        with self.tracing(1.0):
+            response = self.client.get(reverse("product-list"), HTTP_TRACEPARENT=unsampled)
+        self.assertNotIn("traceresponse", response)
+        with self.tracing(0.0):
+            self.client.get(reverse("product-list"))
+        self.assertEqual(self.exported_spans(), [])
+
+        with self.tracing(1.0):
+            response = self.client.get(reverse("product-list"))
+        self.assertIn("traceresponse", response)
+        self.assertTrue(self.exported_spans())
+
+    def test_route_template(self):
+        self.assertEqual(route_template("api/^products/(?P<pk>[^/.]+)/$"), "/api/products/{pk}/")
+
+
+class SlowQueryTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email="admin@example.com",
+            full_name="Admin User",
+            password="password123"
+        )
+        store = Store.objects.create(name="Slow Store", owner=cls.admin)
+        Product.objects.create(name="Slow", price="1.00", store=store, owner=cls.admin)
+
+    def setUp(self):
+        self.collector = SlowQueryCollector(capacity=100, flush_interval=60, autostart=False)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.admin.id, 'Admin')}")
+
+    def capture(self, threshold_ms=0):
+        config = {**settings.SLOW_QUERIES, "ENABLED": True, "THRESHOLD_MS": threshold_ms, "EXPLAIN": True}
+        with override_settings(SLOW_QUERIES=config), mock.patch("api.slowqueries.collector", self.collector):
+            response = self.client.get(reverse("product-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with override_settings(SLOW_QUERIES=config):
+            return self.collector.flush()
+
+    def test_slow_statements_are_aggregated_per_fingerprint_with_a_plan(self):
+        recorded = self.capture()
+        self.assertGreater(recorded, 0)
+
+        products = SlowQuery.objects.get(fingerprint__contains='FROM "api_product"', view="product-list")
+        self.assertEqual(products.action, "list")
+        self.assertEqual(products.database, "default")
+        self.assertEqual(products.count, 1)
+        self.assertTrue(products.plan)
+        captured_at = products.plan_captured_at
+
+        self.capture()
+        products.refresh_from_db()
+        self.assertEqual(products.count, 2)
+        self.assertGreaterEqual(products.total_ms, products.max_ms)
+        self.assertEqual(products.plan_captured_at, captured_at)  # not refreshed within PLAN_TTL
+
+    def test_parameters_are_only_stored_when_enabled(self):
+        self.capture()
+        products = SlowQuery.objects.get(fingerprint__contains='FROM "api_product"', view="product-list")
+        self.assertEqual((products.sample_sql, products.sample_params), ("", []))
+
+        with override_settings(SLOW_QUERIES={**settings.SLOW_QUERIES, "STORE_SAMPLES": True}):
+            self.capture()
+        products.refresh_from_db()
+        self.assertIn('FROM "api_product"', products.sample_sql)
+
+    def test_fast_statements_are_ignored(self):
+        self.assertEqual(self.capture(threshold_ms=60_000), 0)
+        self.assertFalse(SlowQuery.objects.exists())
+
+    def test_only_selects_updates_and_deletes_are_explained(self):
+        self.assertIsNone(explain("default", 'INSERT INTO "api_role" ("name") VALUES (%s)', ["Guest"]))
+        self.assertTrue(explain("default", 'SELECT "name" FROM "api_role" WHERE "id" = %s', [1]))
+
+    def test_command_prints_top_offenders(self):
+        self.capture()
+        output = io.StringIO()
+        call_command("slow_queries", limit=1, sort="count", view="product-list", stdout=output)
+        self.assertIn("#1 product-list (list) on default: 1x", output.getvalue())
+        self.assertNotIn("#2", output.getvalue())
+
+        call_command("slow_queries", reset=True, stdout=io.StringIO())
+        self.assertFalse(SlowQuery.objects.exists())
+
+
+class PolicySyncTests(TestCase):
+    policy = {
+        "roles": ["Admin", "Auditor"],
+        "elements": ["Products", "Orders"],
+        "rules": {
+            "Admin": {"*": ["read", "read_all", "create", "update", "update_all", "delete", "delete_all"]},
+            "Auditor": {"*": ["read", "read_all"], "Orders": []},
+        },
+    }
+
+    def sync(self, policy, *args):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / "policy.json"
+        path.write_text(json.dumps(policy))
+        output = io.StringIO()
+        call_command("sync_policy", "--file", str(path), *args, stdout=output)
+        return output.getvalue()
+
+    def rules(self):
+        return {
+            (rule.role.name, rule.element.name): (rule.read_permission, rule.read_all_permission, rule.delete_permission)
+            for rule in AccessRoleRule.objects.select_related("role", "element")
+        }
+
+    def test_sync_creates_then_only_updates_what_changed(self):
+        self.sync(self.policy)
+        self.assertTrue(Role.objects.filter(name="Auditor").exists())
+        self.assertEqual(self.rules()[("Auditor", "Products")], (True, True, False))
+        self.assertEqual(self.rules()[("Auditor", "Orders")], (False, False, False))
+        self.assertEqual(self.rules()[("Admin", "Orders")], (True, True, True))
+
+        self.assertIn("Policy already in sync", self.sync(self.policy))
+
+        changed = json.loads(json.dumps(self.policy))
+        changed["rules"]["Auditor"]["Orders"] = ["read"]
+        with CaptureQueriesContext(connection) as queries:
+            output = self.sync(changed, "--verbosity", "2")
+        self.assertIn("~ rule Auditor -> Orders: none => read", output)
+        self.assertIn("1 rules written", output)
+        self.assertLess(len(queries), 15)
+        self.assertEqual(self.rules()[("Auditor", "Orders")], (True, False, False))
+
+    def test_dry_run_writes_nothing(self):
+        output = self.sync(self.policy, "--dry-run")
+        self.assertIn("+ rule Auditor -> Orders: none", output)
+        self.assertIn("Dry run: 1 roles and 0 elements to create, 4 rules to create", output)
+        self.assertFalse(AccessRoleRule.objects.exists())
+        self.assertFalse(Role.objects.filter(name="Auditor").exists())
+
+    def test_prune_deletes_rules_outside_the_policy(self):
+        self.sync(self.policy)
+        guest, _ = Role.objects.get_or_create(name="Guest")
+        AccessRoleRule.objects.create(role=guest, element=BusinessElement.objects.get(name="Orders"))
+
+        self.assertIn("Policy already in sync", self.sync(self.policy))
+        output = self.sync(self.policy, "--prune", "--dry-run")
+        self.assertIn("- rule Guest -> Orders", output)
+        self.sync(self.policy, "--prune")
+        self.assertNotIn(("Guest", "Orders"), self.rules())
+
+    def test_invalid_policies_are_rejected(self):
+        for policy in (
+            {"roles": ["Admin"], "elements": ["Orders"], "rules": {"Ghost": {}}},
+            {"roles": ["Admin"], "elements": ["Orders"], "rules": {"Admin": {"Stores": ["read"]}}},
+            {"roles": ["Admin"], "elements": ["Orders"], "rules": {"Admin": {"*": ["fly"]}}},
+            {"roles": ["Admin", "Admin"], "elements": []},
+        ):
+            with self.subTest(policy=policy), self.assertRaises(PolicyError):
+                Policy.from_dict(policy)
+
+    def test_shipped_policy_has_the_default_rules(self):
+        policy = load_policy()
+        self.assertEqual(policy.roles, ["Admin", "Moderator", "User", "Guest"])
+        self.assertEqual(policy.rules["Moderator", "Products"], (True, True, True, True, False, False, False))
+        self.assertEqual(policy.rules["Guest", "Orders"], (True, False, False, False, False, False, False))
+
+
+class APIOnlyProfileTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email="admin@example.com",
+            full_name="Admin User",
+            password="password123"
+        )
+
+    def api_profile(self):
+        from core import settings_api
+        return override_settings(
+            ROOT_URLCONF=settings_api.ROOT_URLCONF,
+            MIDDLEWARE=settings_api.MIDDLEWARE,
+            TEMPLATES=settings_api.TEMPLATES,
+            REST_FRAMEWORK=settings_api.REST_FRAMEWORK,
+        )
+
+    def test_profile_leaves_out_admin_sessions_and_templates(self):
+        from core import settings_api
+        for app in ("django.contrib.admin", "django.contrib.sessions", "django.contrib.messages"):
+            self.assertNotIn(app, settings_api.INSTALLED_APPS)
+        self.assertNotIn("django.contrib.sessions.middleware.SessionMiddleware", settings_api.MIDDLEWARE)
+        self.assertIn("api.apps.ApiConfig", settings_api.INSTALLED_APPS)
+        self.assertEqual(settings_api.TEMPLATES, [])
+
+    def test_api_is_served_without_the_admin(self):
+        with self.api_profile():
+            response = self.client.post(
+                reverse("login"), {"email": "admin@example.com", "password": "password123"}, format="json",
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['token']}")
+            self.assertEqual(self.client.get(reverse("product-list")).status_code, status.HTTP_200_OK)
+            self.assertEqual(self.client.get("/admin/").status_code, status.HTTP_404_NOT_FOUND)
+
+
+class LeanMiddlewareTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email="admin@example.com",
+            full_name="Admin User",
+            password="password123"
+        )
+
+    def test_api_requests_skip_sessions_csrf_and_messages(self):
+        request = RequestFactory().get("/api/products/")
+        middleware = [
+            LeanSessionMiddleware(lambda r: HttpResponse()),
+            LeanAuthenticationMiddleware(lambda r: HttpResponse()),
+            LeanMessageMiddleware(lambda r: HttpResponse()),
+        ]
+        for instance in middleware:
+            instance.process_request(request)
+        self.assertFalse(hasattr(request, "session"))
+        self.assertFalse(hasattr(request, "user"))
+        self.assertFalse(hasattr(request, "_messages"))
+
+        client = self.client_class(enforce_csrf_checks=True)
+        response = client.post(reverse("login"), {"email": "admin@example.com", "password": "password123"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("Cookie", response.get("Vary", ""))
+        self.assertEqual(response.cookies, {})
+
+    def test_admin_keeps_sessions_and_csrf(self):
+        client = self.client_class(enforce_csrf_checks=True)
+        response = client.get("/admin/login/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(settings.CSRF_COOKIE_NAME, response.cookies)
+
+        response = client.post("/admin/login/", {"username": "admin@example.com", "password": "password123"})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(MOCK_DATA={"USERS": 50, "STORES": 20, "PRODUCTS": 300, "SEED": 7, "PRELOAD": False})
+class MockDataTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email="admin@example.com", full_name="Admin User", password="password123"
+        )
+        cls.user = User.objects.create_user(
+            email="user@example.com", full_name="Regular User", password="password123", role_name="User"
+        )
+        products = BusinessElement.objects.get_or_create(name="Products")[0]
+        AccessRoleRule.objects.update_or_create(
+            role=cls.admin.role, element=products, defaults={"read_all_permission": True},
+        )
+        AccessRoleRule.objects.update_or_create(
+            role=cls.user.role, element=products, defaults={"read_permission": True},
+        )
+
+    def test_owner_rows_are_contiguous(self):
+        dataset = MockDataset(users=50, stores=20, products=300, seed=7)
+        self.assertEqual(len(dataset.products()), 300)
+        self.assertEqual(sum(len(dataset.products(owner)) for owner in range(1, 51)), 300)
+        for owner in range(1, 51):
+            ids = [row["id"] for row in dataset.products(owner)]
+            self.assertTrue(all(row["owner"] == owner for row in dataset.products(owner)))
+            self.assertEqual(ids, list(range(ids[0], ids[0] + len(ids))) if ids else [])
+            self.assertTrue(all(row["owner"] == owner for row in dataset.stores(owner)))
+        self.assertEqual(dataset.products()[10:12], dataset.products()[10:12])
+        self.assertEqual(dataset.products()[10], MockDataset(50, 20, 300, seed=7).products()[10])
+
+    def test_read_all_and_own_rows(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.admin.id, 'Admin')}")
+        response = self.client.get(reverse("mock-products"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Without DEFAULT_PAGINATION_CLASS the mocks return a bare list, like the real endpoints
+        self.assertEqual([row["id"] for row in response.json()], list(range(1, 301)))
+        with mock.patch.object(MockProductsView, "max_rows", 50):
+            response = self.client.get(reverse("mock-products"))
+        self.assertEqual(len(response.json()), 50)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.user.id, 'User')}")
+        response = self.client.get(reverse("mock-products"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = MockDataset(50, 20, 300, seed=7).products(self.user.id)[:]
+        self.assertEqual(response.json(), json.loads(json.dumps(expected)))
+
+    def test_paginated_like_the_real_endpoints(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {create_jwt(self.admin.id, 'Admin')}")
+        # DEFAULT_PAGINATION_CLASS is read when the views are imported
+        pagination = type("Pagination", (PageNumberPagination,), {"page_size": 25})
+        with mock.patch.object(MockProductsView, "pagination_class", pagination):
+            response = self.client.get(reverse("mock-products"), {"page": 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["count"], 300)
+        self.assertEqual([row["id"] for row in response.json()["results"]], list(range(51, 76)))
+
+
+class ScaleDatasetTests(SimpleTestCase):
+    def make_dataset(self, seed):
+        return ScaleDataset(
+            50, 10, 200, 1000,
+            password_hash="$2b$12$hash",
+            role_ids={"User": 3, "Moderator": 2},
+            first_ids={"user": 1, "store": 1, "product": 1, "order": 1},
+            seed=seed,
+            now=datetime(2025, 1, 1, tzinfo=dt_timezone.utc),
+        )
+
+    def generate(self, dataset):
+        return {
+            table: [row.rstrip("\n").split("\t") for row in rows()]
+            for table, rows in (("users", dataset.users), ("products", dataset.products),
+                                ("orders", dataset.orders), ("stores", dataset.stores))
+        }
+
+    def test_same_seed_gives_same_rows(self):
+        self.assertEqual(self.generate(self.make_dataset(7)), self.generate(self.make_dataset(7)))
+        self.assertNotEqual(self.generate(self.make_dataset(7)), self.generate(self.make_dataset(8)))
+
+    def test_store_counters_match_generated_rows(self):
+        data = self.generate(self.make_dataset(1))
+        stores = {int(row[0]): row for row in data["stores"]}
+        product_store = {int(row[0]): int(row[4]) for row in data["products"]}
+
+        self.assertEqual(sum(int(row[5]) for row in stores.values()), len(data["products"]))
+        self.assertEqual(
+            sum(int(row[6]) for row in stores.values()),
+            sum(row[5] == "t" for row in data["products"])
+        )
+        revenue = {pk: Decimal("0") for pk in stores}
+        for row in data["orders"]:
+            if row[5] != "cancelled":
+                revenue[product_store[int(row[1])]] += Decimal(row[4])
+        self.assertEqual({pk: Decimal(row[7]) for pk, row in stores.items()}, revenue)
+
+        # Ownership is skewed: some users own several stores
+        self.assertLess(len({row[4] for row in stores.values()}), len(stores))
@@ -0,0 +1,182 @@
+"""
+Request tracing compatible with OpenTelemetry.
+
+TracingMiddleware continues the trace of an inbound W3C `traceparent`
+header, or starts a new one. Sampling follows OpenTelemetry's
+ParentBased(TraceIdRatioBased): an inbound sampled flag is honoured, and
+new traces are sampled when their id falls under TRACING["SAMPLE_RATIO"].
+Unsampled requests create no spans at all, so `span()` costs one
+ContextVar lookup there.
+
+Spans cover authentication, permission classes, every SQL statement,
+serialization and rendering. When the request span ends, the whole trace
+is appended to TRACING["FILE"] as one OTLP/JSON ExportTraceServiceRequest
+per line. The OpenTelemetry Collector's `otlpjsonfile` receiver can ship
+that file to any tracing backend.
+"""
+import functools
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+
+from .queries import execute_wrapper, fingerprint
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_GROUP = re.compile(r"\(\?P<(\w+)>[^)]*\)")
+KINDS = {"INTERNAL": 1, "SERVER": 2, "CLIENT": 3}
+
+_current = ContextVar("current_span", default=None)
+_export_lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "attributes", "start", "end", "error", "spans")
+
+    def __init__(self, trace_id, name, parent_id=None, kind="INTERNAL", attributes=None, spans=None):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.start = time.time_ns()
+        self.end = None
+        self.error = None
+        # Finished spans of the trace, shared by all its spans in this process
+        self.spans = [] if spans is None else spans
+
+    def child(self, name, kind="INTERNAL", attributes=None):
+        return Span(self.trace_id, name, self.span_id, kind, attributes, self.spans)
+
+    def finish(self):
+        self.end = time.time_ns()
+        self.spans.append(self)
+
+    def as_otlp(self):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": KINDS[self.kind],
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(self.end),
+            "attributes": [_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 0},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def start_request_span(traceparent, name, attributes):
+    """The root span of a request, or None when the request is not sampled."""
+    match = TRACEPARENT.match(traceparent or "")
+    if match and match.group(1) != "0" * 32:
+        trace_id, parent_id, flags = match.groups()
+        if not int(flags, 16) & 1:
+            return None
+    else:
+        trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+        # TraceIdRatioBased: compare the low 64 bits of the trace id
+        if int(trace_id[16:], 16) >= settings.TRACING["SAMPLE_RATIO"] * 2 ** 64:
+            return None
+    return Span(trace_id, name, parent_id, "SERVER", attributes)
+
+
+def route_template(route):
+    """A resolver route as a path template: "api/^products/(?P<pk>[^/.]+)/$" -> "/api/products/{pk}/"."""
+    return "/" + _GROUP.sub(r"{\1}", route).replace("^", "").replace("$", "")
+
+
+@contextmanager
+def activate(span):
+    token = _current.set(span)
+    try:
+        yield span
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name, kind="INTERNAL", **attributes):
+    """A child span of the current one; does nothing outside a sampled trace."""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    child = parent.child(name, kind, attributes)
+    token = _current.set(child)
+    try:
+        yield child
+    except Exception as exc:
+        child.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        _current.reset(token)
+        child.finish()
+
+
+def traced(name=None):
+    """Decorator running the function in a span named `name` (default: its qualified name)."""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _trace_query(execute, sql, params, many, context):
+    attributes = {"db.system": context["connection"].vendor, "db.statement": fingerprint(sql)}
+    with span("db.query", "CLIENT", **attributes):
+        return execute(sql, params, many, context)
+
+
+def trace_queries():
+    """Adds a span for each SQL statement run in this context inside the block."""
+    return execute_wrapper(_trace_query)
+
+
+def export(root):
+    """Appends the finished trace of `root` to TRACING["FILE"] as one OTLP/JSON line."""
+    request = {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                _attribute("service.name", settings.TRACING["SERVICE_NAME"]),
+                _attribute("process.pid", os.getpid()),
+            ]},
+            "scopeSpans": [{
+                "scope": {"name": "api.tracing"},
+                "spans": [span.as_otlp() for span in root.spans],
+            }],
+        }]
+    }
+    line = json.dumps(request, separators=(",", ":")) + "\n"
+    path = Path(settings.TRACING["FILE"])
+    with _export_lock:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a") as fh:
+            fh.write(line)
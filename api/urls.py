@@ -1,16 +1,27 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     LoginView,
     LogoutView,
     RegisterView,
+    AsyncLoginView,
+    AsyncLogoutView,
+    AsyncRegisterView,
     ProfileUpdateView,
     SoftDeleteUserView,
+    DatabasePoolStatsView,
+    AuditBufferStatsView,
+    ProfileListView,
+    ProfileDetailView,
+    DeletionJobDetailView,
+    ChangeFeedView,
     AccessRoleRuleListCreateView,
     AccessRoleRuleDetailView,
     UserViewSet,
     ProductViewSet,
     StoreViewSet,
+    OrderViewSet,
     MockUsersView,
     MockProductsView,
     MockStoresView
@@ -20,12 +31,19 @@ router = DefaultRouter()
 router.register(r'users', UserViewSet, basename='user')
 router.register(r'products', ProductViewSet, basename='product')
 router.register(r'stores', StoreViewSet, basename='store')
+router.register(r'orders', OrderViewSet, basename='order')
+
+# Under ASGI the native async auth views avoid the sync thread-pool shim
+if settings.ASYNC_AUTH_VIEWS:
+    login_view, logout_view, register_view = AsyncLoginView, AsyncLogoutView, AsyncRegisterView
+else:
+    login_view, logout_view, register_view = LoginView, LogoutView, RegisterView
 
 urlpatterns = [
     # Authentication endpoints
-    path('auth/login/', LoginView.as_view(), name='login'),
-    path('auth/logout/', LogoutView.as_view(), name='logout'),
-    path('auth/register/', RegisterView.as_view(), name='register'),
+    path('auth/login/', login_view.as_view(), name='login'),
+    path('auth/logout/', logout_view.as_view(), name='logout'),
+    path('auth/register/', register_view.as_view(), name='register'),
     path('auth/profile/', ProfileUpdateView.as_view(), name='update-profile'),
     path('auth/delete/', SoftDeleteUserView.as_view(), name='soft-delete'),
 
@@ -33,6 +51,18 @@ urlpatterns = [
     path('access-rules/', AccessRoleRuleListCreateView.as_view(), name='access-rules'),
     path('access-rules/<int:pk>/', AccessRoleRuleDetailView.as_view(), name='access-rule-detail'),
 
+    # Incremental change feed
+    path('changes/', ChangeFeedView.as_view(), name='changes'),
+
+    # Background deletions
+    path('deletion-jobs/<int:pk>/', DeletionJobDetailView.as_view(), name='deletion-job-detail'),
+
+    # Operational endpoints (Admin only)
+    path('ops/db-pool/', DatabasePoolStatsView.as_view(), name='db-pool-stats'),
+    path('ops/audit-buffer/', AuditBufferStatsView.as_view(), name='audit-buffer-stats'),
+    path('ops/profiles/', ProfileListView.as_view(), name='profile-list'),
+    path('ops/profiles/<str:profile_id>/', ProfileDetailView.as_view(), name='profile-detail'),
+
     path('mock/users/', MockUsersView.as_view(), name='mock-users'),
     path('mock/products/', MockProductsView.as_view(), name='mock-products'),
     path('mock/stores/', MockStoresView.as_view(), name='mock-stores'),
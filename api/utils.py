@@ -1,7 +1,13 @@
+import asyncio
+import os
+import time
 import jwt
 import uuid
+import bcrypt
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from django.conf import settings
+from .metrics import BCRYPT_SECONDS
 
 JWT_SECRET = settings.SECRET_KEY
 JWT_ALGORITHM = "HS256"
@@ -20,11 +26,44 @@ def create_jwt(user_id, role_name):
     return token
 
 
-def decode_jwt(token):
+def verify_jwt(token):
+    """(payload, None) for a valid token, otherwise (None, "expired" or "invalid")."""
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
+        return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM]), None
     except jwt.ExpiredSignatureError:
-        return None
+        return None, "expired"
     except jwt.InvalidTokenError:
-        return None
\ No newline at end of file
+        return None, "invalid"
+
+
+def decode_jwt(token):
+    return verify_jwt(token)[0]
+
+
+# bcrypt releases the GIL, so a small pool sized to the CPU count lets async
+# views hash passwords without blocking the event loop.
+_password_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="bcrypt")
+
+
+def hash_password(raw_password):
+    started = time.perf_counter()
+    password_hash = bcrypt.hashpw(raw_password.encode(), bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)).decode()
+    BCRYPT_SECONDS.observe(time.perf_counter() - started, operation="hash")
+    return password_hash
+
+
+def check_password(raw_password, password_hash):
+    started = time.perf_counter()
+    matches = bcrypt.checkpw(raw_password.encode(), password_hash.encode())
+    BCRYPT_SECONDS.observe(time.perf_counter() - started, operation="check")
+    return matches
+
+
+async def ahash_password(raw_password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, hash_password, raw_password)
+
+
+async def acheck_password(raw_password, password_hash):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, check_password, raw_password, password_hash)
@@ -1,8 +1,21 @@
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import DataError, transaction
+from django.db.models import DecimalField, F, Q, Value
+from django.db.models.functions import Greatest, Round
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status, generics, viewsets
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.decorators import authentication_classes, permission_classes
+from rest_framework.reverse import reverse
+from rest_framework import status, generics, viewsets, exceptions
+from rest_framework.serializers import ALL_FIELDS
+from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
+from rest_framework.exceptions import ValidationError
+from rest_framework.decorators import action, authentication_classes, permission_classes
 from .authentication import JWTAuthentication
 from .models import (
     User,
@@ -11,28 +24,43 @@ from .models import (
     Product,
     Store,
     Order,
-    RevokedToken
+    RevokedToken,
+    DeletionJob,
+    ChangeLogEntry
 )
 from .serializers import (
     AccessRoleRuleSerializer,
     UserSerializer,
     ProductSerializer,
     StoreSerializer,
-    OrderSerializer
+    OrderSerializer,
+    DeletionJobSerializer,
+    ChangeLogEntrySerializer,
+    RepriceSerializer
 )
-from .permissions import CanAccessAccessRules, RoleBasedPermission, MockRoleBasedPermission
-from .utils import create_jwt
+from .permissions import CanAccessAccessRules, RoleBasedPermission, MockRoleBasedPermission, IsAdminRole
+from .dbpool import get_pool_stats
+from .queries import QueryBudget
+from .routers import pin_to_primary
+from . import archive, audit, jobs, metrics, mockdata, profiling, snapshot
+from .utils import create_jwt, hash_password, ahash_password
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from types import SimpleNamespace
+import hmac
 import json
-import bcrypt
 
 class LoginView(APIView):
+    authentication_classes = []
+    query_budgets = {"post": QueryBudget(queries=1, db_ms=20)}
+
     def post(self, request):
         data = json.loads(request.body)
         email = data.get("email")
         password = data.get("password")
 
         try:
-            user = User.objects.get(email=email, is_active=True)
+            user = User.objects.select_related("role").get(email=email)
         except User.DoesNotExist:
             return Response({"error": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
 
@@ -47,6 +75,7 @@ class LoginView(APIView):
 class LogoutView(APIView):
     authentication_classes = [JWTAuthentication]
     permission_classes = []
+    query_budgets = {"post": QueryBudget(queries=6, db_ms=30)}
 
     def post(self, request):
         auth_header = request.headers.get("Authorization")
@@ -65,6 +94,8 @@ class LogoutView(APIView):
         return Response({"message": "Logout successful, token revoked"}, status=status.HTTP_200_OK)
 
 class RegisterView(APIView):
+    authentication_classes = []
+
     def post(self, request):
         data = json.loads(request.body)
         full_name = data.get("full_name")
@@ -78,11 +109,11 @@ class RegisterView(APIView):
         if password != password_repeat:
             return Response({"error": "Passwords do not match"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if User.objects.filter(email=email).exists():
+        if User.all_objects.filter(email=email).exists():
             return Response({"error": "User with this email already exists"}, status=status.HTTP_400_BAD_REQUEST)
 
         role = Role.objects.get(name="User")
-        password_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+        password_hash = hash_password(password)
         user = User.objects.create(email=email, full_name=full_name, password_hash=password_hash, role=role)
 
         token = create_jwt(user.id, role.name)
@@ -106,7 +137,7 @@ class ProfileUpdateView(APIView):
         if password:
             if password != password_repeat:
                 return Response({"error": "Passwords do not match"}, status=status.HTTP_400_BAD_REQUEST)
-            user.password_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+            user.password_hash = hash_password(password)
 
         user.save()
         return Response({"message": "Profile updated successfully"}, status=status.HTTP_200_OK)
@@ -117,192 +148,693 @@ class SoftDeleteUserView(APIView):
 
     def delete(self, request):
         user = request.user
-        user.is_active = False
-        user.save()
+        stores, products = user.soft_delete()
+        changes = {"owner_id": user.pk, "is_active": False}
+        audit.record(Store, "*", "bulk_update", {**changes, "rows": stores})
+        audit.record(Product, "*", "bulk_update", {**changes, "rows": products})
         return Response({"message": "Account deleted (soft) successfully"}, status=status.HTTP_200_OK)
 
+class AsyncAPIView(View):
+    """
+    Base for natively async JSON endpoints served under ASGI.
+    DRF's APIView is sync-only, so these views parse JSON themselves and,
+    like APIView, are exempt from CSRF.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    @staticmethod
+    def parse_json(request):
+        try:
+            return json.loads(request.body)
+        except ValueError:
+            return None
+
+class AsyncLoginView(AsyncAPIView):
+    async def post(self, request):
+        data = self.parse_json(request)
+        if data is None:
+            return JsonResponse({"error": "Invalid JSON body"}, status=status.HTTP_400_BAD_REQUEST)
+        email = data.get("email")
+        password = data.get("password")
+
+        try:
+            user = await User.objects.select_related("role").aget(email=email)
+        except User.DoesNotExist:
+            return JsonResponse({"error": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
+
+        if not password or not await user.acheck_password(password):
+            return JsonResponse({"error": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
+
+        token = create_jwt(user.id, user.role.name)
+        return JsonResponse({"token": token}, status=status.HTTP_200_OK)
+
+class AsyncLogoutView(AsyncAPIView):
+    async def post(self, request):
+        try:
+            _, token = await JWTAuthentication().aauthenticate(request)
+        except exceptions.APIException as exc:
+            response = JsonResponse({"detail": str(exc.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+            response["WWW-Authenticate"] = JWTAuthentication().authenticate_header(request)
+            return response
+
+        # Save token to revoked list
+        await RevokedToken.objects.aget_or_create(token=token)
+        return JsonResponse({"message": "Logout successful, token revoked"}, status=status.HTTP_200_OK)
+
+class AsyncRegisterView(AsyncAPIView):
+    async def post(self, request):
+        data = self.parse_json(request)
+        if data is None:
+            return JsonResponse({"error": "Invalid JSON body"}, status=status.HTTP_400_BAD_REQUEST)
+        full_name = data.get("full_name")
+        email = data.get("email")
+        password = data.get("password")
+        password_repeat = data.get("password_repeat")
+
+        if not all([full_name, email, password, password_repeat]):
+            return JsonResponse({"error": "All fields are required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if password != password_repeat:
+            return JsonResponse({"error": "Passwords do not match"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if await User.all_objects.filter(email=email).aexists():
+            return JsonResponse({"error": "User with this email already exists"}, status=status.HTTP_400_BAD_REQUEST)
+
+        role = await Role.objects.aget(name="User")
+        password_hash = await ahash_password(password)
+        user = await User.objects.acreate(email=email, full_name=full_name, password_hash=password_hash, role=role)
+
+        token = create_jwt(user.id, role.name)
+        return JsonResponse({"token": token, "user_id": user.id}, status=status.HTTP_201_CREATED)
+
+class DatabasePoolStatsView(APIView):
+    """
+    Connection pool counters of the worker process serving the request.
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminRole]
+
+    def get(self, request):
+        return Response(get_pool_stats())
+
+class AuditBufferStatsView(APIView):
+    """
+    Audit buffer counters of the worker process serving the request.
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminRole]
+
+    def get(self, request):
+        return Response(audit.audit_buffer.get_stats())
+
+class MetricsView(View):
+    """
+    Prometheus scrape endpoint with the metrics of all worker processes.
+    When METRICS["TOKEN"] is set, it must be sent as a bearer token.
+    """
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def get(self, request):
+        token = settings.METRICS["TOKEN"]
+        if token:
+            prefix, _, given = request.headers.get("Authorization", "").partition(" ")
+            if prefix.lower() != "bearer" or not hmac.compare_digest(given, token):
+                return HttpResponse("Unauthorized\n", status=401, content_type="text/plain")
+        return HttpResponse(metrics.render(), content_type=self.content_type)
+
+class ProfileListView(APIView):
+    """
+    Request profiles stored by ProfilingMiddleware on this host, newest first.
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminRole]
+
+    def get(self, request):
+        profiles = profiling.list_profiles()
+        for meta in profiles:
+            meta["url"] = reverse("profile-detail", args=[meta["id"]], request=request)
+        return Response(profiles)
+
+class ProfileDetailView(APIView):
+    """
+    Downloads a profile (pstats format, for `python -m pstats` or snakeviz).
+    `?output=text` returns the top functions by `?sort=` (cumulative) instead.
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminRole]
+    sort_keys = ("cumulative", "tottime", "calls", "ncalls")
+
+    def get(self, request, profile_id):
+        path = profiling.profile_file(profile_id)
+        if path is None:
+            raise Http404
+        if request.query_params.get("output") == "text":
+            sort = request.query_params.get("sort", "cumulative")
+            if sort not in self.sort_keys:
+                raise ValidationError({"sort": f"Expected one of {', '.join(self.sort_keys)}"})
+            return HttpResponse(profiling.render_stats(path, sort), content_type="text/plain")
+        return FileResponse(open(path, "rb"), as_attachment=True, filename=path.name)
+
 class AccessRoleRuleListCreateView(generics.ListCreateAPIView):
-    queryset = AccessRoleRule.objects.all()
+    queryset = AccessRoleRule.objects.select_related("role", "element")
     serializer_class = AccessRoleRuleSerializer
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated, CanAccessAccessRules]
 
 class AccessRoleRuleDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = AccessRoleRule.objects.all()
+    queryset = AccessRoleRule.objects.select_related("role", "element")
     serializer_class = AccessRoleRuleSerializer
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated, CanAccessAccessRules]
 
-class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all()
+class SparseFieldsetMixin:
+    """
+    Adds `?fields=a,b` / `?exclude=c` to read actions of a viewset.
+
+    The selected fields trim the serializer output and narrow the SQL with
+    `.only()`, so unrequested columns (e.g. large text columns) are never
+    fetched. Columns listed in `always_loaded_fields` are loaded regardless,
+    since permission checks rely on them.
+    """
+    always_loaded_fields = ('owner',)
+
+    def get_sparse_fieldset(self):
+        """
+        Returns (field_names, columns) for the current request, or None when no
+        sparse fieldset was requested. `columns` is None when the selected
+        fields cannot be mapped onto concrete model columns.
+        """
+        if hasattr(self, '_sparse_fieldset'):
+            return self._sparse_fieldset
+
+        self._sparse_fieldset = None
+        if self.request.method not in SAFE_METHODS:
+            return None
+
+        requested = self._parse_field_list('fields')
+        excluded = self._parse_field_list('exclude')
+        if requested is None and excluded is None:
+            return None
+
+        # Every field a fieldset may name, including opt-in ones such as the store counters
+        serializer = self.get_serializer_class()(context=self.get_serializer_context(), fields=ALL_FIELDS)
+        readable = {name: field for name, field in serializer.fields.items() if not field.write_only}
+
+        unknown = [name for name in (requested or []) + (excluded or []) if name not in readable]
+        if unknown:
+            raise ValidationError({"fields": f"Unknown field(s): {', '.join(unknown)}"})
+
+        if requested is None:
+            # `exclude` alone trims what the request renders without a fieldset
+            requested = [name for name in self.get_serializer().fields if name in readable]
+        names = [name for name in requested if name not in (excluded or [])]
+        self._sparse_fieldset = (names, self._get_sparse_columns([readable[name] for name in names]))
+        return self._sparse_fieldset
+
+    def _parse_field_list(self, param):
+        value = self.request.query_params.get(param)
+        if value is None:
+            return None
+        return [name.strip() for name in value.split(',') if name.strip()]
+
+    def _get_sparse_columns(self, fields):
+        opts = self.queryset.model._meta
+        columns = {opts.pk.name}
+        columns.update(name for name in self.always_loaded_fields if self._is_column(opts, name))
+        # Relations joined with select_related() cannot be deferred
+        if isinstance(self.queryset.query.select_related, dict):
+            columns.update(self.queryset.query.select_related)
+
+        for field in fields:
+            if field.source == '*':
+                return None
+            attr = field.source.split('.')[0]
+            if not self._is_column(opts, attr):
+                return None
+            columns.add(attr)
+
+        return sorted(columns)
+
+    @staticmethod
+    def _is_column(opts, name):
+        try:
+            model_field = opts.get_field(name)
+        except FieldDoesNotExist:
+            return False
+        return model_field.concrete and not model_field.many_to_many
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fieldset = self.get_sparse_fieldset()
+        if fieldset and fieldset[1]:
+            queryset = queryset.only(*fieldset[1])
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        fieldset = self.get_sparse_fieldset()
+        if fieldset:
+            kwargs.setdefault('fields', fieldset[0])
+        return super().get_serializer(*args, **kwargs)
+
+class CatalogSnapshotMixin:
+    """
+    Serves list and retrieve from the memory-mapped catalog snapshot
+    (api.snapshot) when CATALOG_SNAPSHOT["ENABLED"] is set and a snapshot
+    file exists, without querying the catalog tables. Clients pinned to the
+    primary database after a write, and ids missing from the snapshot, are
+    served from the database.
+
+    `list_filters` maps query parameters to model fields; both paths apply
+    them.
+    """
+    list_filters = {}
+
+    def get_snapshot(self):
+        if not settings.CATALOG_SNAPSHOT["ENABLED"] or pin_to_primary.get():
+            return None
+        return snapshot.get_snapshot()
+
+    def get_list_filters(self):
+        filters = {}
+        for param, field in self.list_filters.items():
+            value = self.request.query_params.get(param)
+            if value is None:
+                continue
+            try:
+                filters[field] = int(value)
+            except ValueError:
+                raise ValidationError({param: "Expected an integer id"})
+        return filters
+
+    def get_queryset(self):
+        return super().get_queryset().filter(**self.get_list_filters())
+
+    def get_snapshot_fields(self):
+        # The serializer decides which fields are shown (sparse fieldsets, options)
+        return list(self.get_serializer().fields)
+
+    def list(self, request, *args, **kwargs):
+        catalog = self.get_snapshot()
+        if catalog is None:
+            return super().list(request, *args, **kwargs)
+        rows = self.snapshot_list(catalog, **self.get_list_filters())
+        names = self.get_snapshot_fields()
+        return Response([{name: row[name] for name in names} for row in rows])
+
+    def retrieve(self, request, *args, **kwargs):
+        catalog = self.get_snapshot()
+        try:
+            found = catalog and self.snapshot_get(catalog, int(kwargs[self.lookup_field]))
+        except ValueError:
+            found = None
+        if not found:
+            return super().retrieve(request, *args, **kwargs)
+
+        owner_id, row = found
+        self.check_object_permissions(request, SimpleNamespace(pk=row["id"], owner_id=owner_id))
+        return Response({name: row[name] for name in self.get_snapshot_fields()})
+
+class BackgroundDeleteMixin:
+    """
+    Deletes objects with large dependent graphs in a background job.
+
+    When the delete would cascade to BACKGROUND_DELETE_THRESHOLD rows or more,
+    the request is answered with 202 and the DeletionJob, whose progress can
+    be followed at its Location. Smaller graphs are deleted inline as before.
+    The target's stores and products are deactivated in the request, so
+    "destroy" needs a larger query budget than the other writes.
+    """
+    deletion_target = None
+
+    def destroy(self, request, *args, **kwargs):
+        instance = self.get_object()
+        threshold = settings.BACKGROUND_DELETE_THRESHOLD
+        if jobs.dependent_row_count(self.deletion_target, instance.pk, limit=threshold) < threshold:
+            self.perform_destroy(instance)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        job = jobs.enqueue_deletion(instance, requested_by=request.user)
+        location = reverse("deletion-job-detail", args=[job.pk], request=request)
+        return Response(DeletionJobSerializer(job).data, status=status.HTTP_202_ACCEPTED, headers={"Location": location})
+
+class DeletionJobDetailView(generics.RetrieveAPIView):
+    """
+    Progress of a background deletion. Users see their own jobs, Admins all.
+    """
+    serializer_class = DeletionJobSerializer
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        user = self.request.user
+        if user.role.name == "Admin":
+            return DeletionJob.objects.all()
+        return DeletionJob.objects.filter(requested_by=user)
+
+class UserViewSet(SparseFieldsetMixin, BackgroundDeleteMixin, viewsets.ModelViewSet):
+    # Admins manage deactivated accounts too
+    queryset = User.all_objects.select_related("role")
     serializer_class = UserSerializer
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated, RoleBasedPermission]
     business_element = "Users"
-
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all()
+    deletion_target = "user"
+    query_budgets = {
+        "list": QueryBudget(queries=4, db_ms=100),
+        "retrieve": QueryBudget(queries=5, db_ms=30),
+        "destroy": QueryBudget(queries=18, db_ms=50),
+        "default": QueryBudget(queries=8, db_ms=50),
+    }
+
+class ProductViewSet(CatalogSnapshotMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.select_related("owner")
     serializer_class = ProductSerializer
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated, RoleBasedPermission]
     business_element = "Products"
+    list_filters = {"store": "store_id", "owner": "owner_id"}
+    query_budgets = {
+        "list": QueryBudget(queries=4, db_ms=100),
+        "retrieve": QueryBudget(queries=5, db_ms=30),
+        "default": QueryBudget(queries=8, db_ms=50),
+    }
 
-class StoreViewSet(viewsets.ModelViewSet):
-    queryset = Store.objects.all()
+    def snapshot_list(self, catalog, store_id=None, owner_id=None):
+        return catalog.list_products(store_id=store_id, owner_id=owner_id)
+
+    def snapshot_get(self, catalog, pk):
+        return catalog.get_product(pk)
+
+class StoreViewSet(CatalogSnapshotMixin, SparseFieldsetMixin, BackgroundDeleteMixin, viewsets.ModelViewSet):
+    queryset = Store.objects.select_related("owner")
     serializer_class = StoreSerializer
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated, RoleBasedPermission]
     business_element = "Stores"
+    deletion_target = "store"
+    list_filters = {"owner": "owner_id"}
+    query_budgets = {
+        "list": QueryBudget(queries=4, db_ms=100),
+        "retrieve": QueryBudget(queries=5, db_ms=30),
+        "destroy": QueryBudget(queries=15, db_ms=50),
+        "default": QueryBudget(queries=8, db_ms=50),
+    }
+
+    def snapshot_list(self, catalog, owner_id=None):
+        return catalog.list_stores(owner_id=owner_id)
+
+    def snapshot_get(self, catalog, pk):
+        return catalog.get_store(pk)
+
+    def get_serializer(self, *args, **kwargs):
+        # ?include_counters=1 adds product_count, active_product_count and order_revenue
+        if self.request.query_params.get('include_counters', '').lower() in ('1', 'true', 'yes'):
+            kwargs.setdefault('include_counters', True)
+        return super().get_serializer(*args, **kwargs)
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    def reprice(self, request, pk=None):
+        """
+        `POST /api/stores/<id>/reprice/` with `{"percent": "10"}` or
+        `{"amount": "-0.50"}`, optionally narrowed by `product_ids`,
+        `min_price` and `max_price`. Runs as a single UPDATE over the store's
+        active products, limited by the Products update rule:
+        `update_all_permission` reprices every match, `update_permission`
+        only the user's own products. Prices are rounded to cents and never
+        drop below zero.
+        """
+        store = self.get_store_for_reprice(pk)
+        scope = self.get_reprice_scope(request.user)
+        if scope is None:
+            return Response({"detail": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+
+        serializer = RepriceSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        products = Product.objects.filter(scope, store=store)
+        if 'product_ids' in data:
+            products = products.filter(pk__in=data['product_ids'])
+        if 'min_price' in data:
+            products = products.filter(price__gte=data['min_price'])
+        if 'max_price' in data:
+            products = products.filter(price__lte=data['max_price'])
+
+        if 'percent' in data:
+            change = {"percent": data['percent']}
+            new_price = Round(F('price') * (1 + data['percent'] / 100), 2)
+        else:
+            change = {"amount": data['amount']}
+            new_price = F('price') + data['amount']
+        new_price = Greatest(new_price, Value(Decimal('0')), output_field=DecimalField(max_digits=10, decimal_places=2))
+
+        try:
+            with transaction.atomic():
+                ChangeLogEntry.record_queryset(products, "update")
+                updated = products.update(price=new_price, updated_at=timezone.now())
+        except DataError:
+            raise ValidationError({"detail": "The new prices are out of range"})
 
+        audit.record(Product, "*", "bulk_update", {"store_id": store.pk, **change, "rows": updated})
+        return Response({"updated": updated}, status=status.HTTP_200_OK)
 
-class OrderViewSet(viewsets.ModelViewSet):
+    def get_store_for_reprice(self, pk):
+        try:
+            return Store.objects.only('pk').get(pk=pk)
+        except (Store.DoesNotExist, ValueError):
+            raise Http404
+
+    def get_reprice_scope(self, user):
+        """Q limiting repriced products by the Products update rule, or None when not allowed."""
+        if user.role.name == "Admin":
+            return Q()
+        rule = AccessRoleRule.objects.filter(role=user.role, element__name="Products").first()
+        if rule is None:
+            return None
+        if rule.update_all_permission:
+            return Q()
+        if rule.update_permission:
+            return Q(owner_id=user.pk)
+        return None
+
+
+class OrderViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
+    """
+    Orders are partitioned by `created_at` month on PostgreSQL. The filters
+    below become `created_at` range conditions, so only the matching
+    partitions are scanned:
+
+    - `?created_after=` / `?created_before=` (ISO date or datetime)
+    - `?month=YYYY-MM`, also usable on retrieve as a partition hint
+    - `?status=`
+
+    Orders moved to the cold archive are still served by retrieve, straight
+    from the archive files.
+
+    Roles without `read_all_permission` on Orders only list and retrieve
+    their own orders, and orders are always created for the requesting user.
+    """
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated, RoleBasedPermission]
     business_element = "Orders"
-
-# Mock Users endpoint
-class MockUsersView(APIView):
+    query_budgets = {
+        "list": QueryBudget(queries=4, db_ms=100),
+        "retrieve": QueryBudget(queries=5, db_ms=30),
+        "default": QueryBudget(queries=8, db_ms=50),
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+
+        if self.action in ("list", "retrieve") and not self.can_read_all():
+            queryset = queryset.filter(user=self.request.user)
+
+        for param, lookup in (("created_after", "created_at__gte"), ("created_before", "created_at__lt")):
+            if param in params:
+                queryset = queryset.filter(**{lookup: self._parse_moment(param, params[param])})
+
+        if "month" in params:
+            try:
+                month = datetime.strptime(params["month"], "%Y-%m").replace(tzinfo=dt_timezone.utc)
+            except ValueError:
+                raise ValidationError({"month": "Expected YYYY-MM"})
+            next_month = (month + timedelta(days=32)).replace(day=1)
+            queryset = queryset.filter(created_at__gte=month, created_at__lt=next_month)
+
+        if "status" in params:
+            statuses = {value for value, _ in Order.STATUS_CHOICES}
+            if params["status"] not in statuses:
+                raise ValidationError({"status": f"Expected one of: {', '.join(sorted(statuses))}"})
+            queryset = queryset.filter(status=params["status"])
+
+        return queryset
+
+    def can_read_all(self):
+        user = self.request.user
+        if user.role.name == "Admin":
+            return True
+        # Cached on the request by the permission check
+        rule = RoleBasedPermission().get_rule(self.request, self.business_element)
+        return bool(rule and rule.read_all_permission)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            if self.action != "retrieve":
+                raise
+            try:
+                order = archive.find_archived_order(int(self.kwargs[self.lookup_field]))
+            except ValueError:
+                order = None
+            if order is None:
+                raise
+            self.check_object_permissions(self.request, order)
+            return order
+
+    @staticmethod
+    def _parse_moment(param, value):
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValidationError({param: "Expected an ISO date or datetime"})
+            moment = datetime(day.year, day.month, day.day)
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment, dt_timezone.utc)
+        return moment
+
+class ChangeFeedView(APIView):
+    """
+    Incremental change feed: `GET /api/changes/?since=<cursor>&limit=<n>`.
+
+    Entries are returned in cursor order. Start with `since=0` and pass
+    back `next_cursor` ("<txid>-<id>"). Entries of transactions that may
+    still commit are held back (see ChangeLogEntry), so no entry appears
+    behind a cursor already returned. Each entity type follows the role
+    rules of its business element: `read_all_permission` shows every
+    change, `read_permission` only changes to objects the user owns.
+    """
     authentication_classes = [JWTAuthentication]
-    permission_classes = [IsAuthenticated, MockRoleBasedPermission]
-    business_element = "Users"
-
-    def get(self, request):
-        mock_users = [
-            {
-                "id": 1,
-                "full_name": "Alice",
-                "email": "alice@example.com",
-                "password_hash": "$2b$12$abcdefghijklmnopqrstuv",  # fake bcrypt hash
-                "role": "Admin",  # e.g. Admin role id
-                "is_active": True,
-                "is_staff": True,
-                "is_superuser": True,
-                "date_joined": "2025-11-13T09:00:00Z",
-            },
-            {
-                "id": 2,
-                "full_name": "Bob",
-                "email": "bob@example.com",
-                "password_hash": "$2b$12$uvwxyzabcdefghijklmn",  # fake bcrypt hash
-                "role": "User",  # e.g. Manager role id
-                "is_active": True,
-                "is_staff": False,
-                "is_superuser": False,
-                "date_joined": "2025-11-13T09:30:00Z",
-            },
-        ]
-        # Access rule provided by MockRoleBasedPermission
-        rule = getattr(self, "access_rule", None)
-        if not rule:
-            return Response({"detail": "Forbidden"}, status=403)
-
-        # If read_all_permission, return all users
-        if rule.read_all_permission:
-            return Response(mock_users)
+    permission_classes = [IsAuthenticated]
 
-        # If read_permission, return only users owned by this user
-        if rule.read_permission:
-            filtered = [s for s in mock_users if s["id"] == request.user.id]
-            return Response(filtered)
+    elements = {"product": "Products", "store": "Stores", "order": "Orders"}
+    default_limit = 100
+    max_limit = 1000
+    query_budgets = {"get": QueryBudget(queries=5, db_ms=50)}
 
-        # Otherwise, forbid access
-        return Response({"detail": "Forbidden"}, status=403)
-
-# Mock Products endpoint
-class MockProductsView(APIView):
+    def get(self, request):
+        try:
+            txid, since = self.parse_cursor(request.query_params.get("since", "0"))
+            limit = int(request.query_params.get("limit", self.default_limit))
+        except ValueError:
+            raise ValidationError({"detail": "'since' must be 0 or a next_cursor and 'limit' an integer"})
+        if txid < 0 or since < 0 or limit < 1:
+            raise ValidationError({"detail": "'since' must be >= 0 and 'limit' >= 1"})
+        limit = min(limit, self.max_limit)
+
+        entries = ChangeLogEntry.objects.filter(ChangeLogEntry.after(txid, since))
+        scope = self.get_scope(request.user)
+        if scope is None:
+            return Response({"detail": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+        if scope is not True:
+            entries = entries.filter(scope)
+        entries = ChangeLogEntry.visible(entries)
+
+        page = list(entries.order_by("txid", "id")[:limit])
+        return Response({
+            "results": ChangeLogEntrySerializer(page, many=True).data,
+            "next_cursor": f"{page[-1].txid}-{page[-1].id}" if page else f"{txid}-{since}",
+            "has_more": len(page) == limit,
+        })
+
+    @staticmethod
+    def parse_cursor(value):
+        """(txid, id) of a next_cursor; "0" is the start of the feed."""
+        txid, _, since = value.partition("-")
+        return int(txid), int(since or 0)
+
+    def get_scope(self, user):
+        """True for unrestricted access, a Q filter, or None when nothing is readable."""
+        if user.role.name == "Admin":
+            return True
+
+        rules = {
+            rule.element.name: rule
+            for rule in AccessRoleRule.objects.filter(role=user.role, element__name__in=self.elements.values())
+            .select_related("element")
+        }
+        scope = None
+        for entity_type, element_name in self.elements.items():
+            rule = rules.get(element_name)
+            if rule is None:
+                continue
+            if rule.read_all_permission:
+                condition = Q(entity_type=entity_type)
+            elif rule.read_permission:
+                condition = Q(entity_type=entity_type, owner_id=user.pk)
+            else:
+                continue
+            scope = condition if scope is None else scope | condition
+        return scope
+
+
+class MockListView(generics.GenericAPIView):
+    """
+    Read-only list over the generated rows in api.mockdata. Read_all returns
+    every row and read returns the user's own rows. Like the real endpoints
+    the response is paginated with DEFAULT_PAGINATION_CLASS when one is
+    configured and a bare list otherwise; the bare list stops at `max_rows`
+    so a request never renders the whole dataset.
+    """
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated, MockRoleBasedPermission]
-    business_element = "Products"
+    max_rows = 1000
+    business_element = None
+    dataset_reader = None  # MockDataset method returning the rows
 
     def get(self, request):
-        # fake product list
-        mock_products = [
-            {
-                "id": 1,
-                "name": "Laptop",
-                "description": "High-performance laptop with 16GB RAM and 1TB SSD.",
-                "price": 1200.00,
-                "store": 1,
-                "store_name": "Main Street Store",
-                "is_active": True,
-                "owner": 1,
-                "owner_name": "Alice",
-                "created_at": "2025-11-13T09:00:00Z",
-                "updated_at": "2025-11-13T09:15:00Z",
-            },
-            {
-                "id": 2,
-                "name": "Phone",
-                "description": "Latest smartphone with OLED display and 128GB storage.",
-                "price": 800.00,
-                "store": 2,  # Mall Store
-                "store_name": "Mall Store",
-                "is_active": True,
-                "owner": 2,  # Bob
-                "owner_name": "Bob",
-                "created_at": "2025-11-13T09:30:00Z",
-                "updated_at": "2025-11-13T09:45:00Z",
-            },
-        ]
         # Access rule provided by MockRoleBasedPermission
         rule = getattr(self, "access_rule", None)
         if not rule:
             return Response({"detail": "Forbidden"}, status=403)
 
-        # If read_all_permission, return all products
+        read = getattr(mockdata.get_dataset(), self.dataset_reader)
         if rule.read_all_permission:
-            return Response(mock_products)
-
-        # If read_permission, return only products owned by this user
-        if rule.read_permission:
-            filtered = [s for s in mock_products if s["owner"] == request.user.id]
-            return Response(filtered)
+            rows = read(None)
+        elif rule.read_permission:
+            rows = read(request.user.id)
+        else:
+            return Response({"detail": "Forbidden"}, status=403)
 
-        # Otherwise, forbid access
-        return Response({"detail": "Forbidden"}, status=403)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(rows[:self.max_rows])
 
-# Mock Stores endpoint
-class MockStoresView(APIView):
-    authentication_classes = [JWTAuthentication]
-    permission_classes = [IsAuthenticated, MockRoleBasedPermission]
-    business_element = "Stores"
 
-    def get(self, request):
-        # All mock stores
-        mock_stores = [
-            {
-                "id": 1,
-                "name": "Main Street Store",
-                "address": "123 Main St",
-                "is_active": True,
-                "owner": 1,  # Alice
-                "owner_email": "alice@example.com",
-            },
-            {
-                "id": 2,
-                "name": "Mall Store",
-                "address": "456 Mall Rd",
-                "is_active": True,
-                "owner": 2,  # Bob
-                "owner_email": "bob@example.com",
-            },
-        ]
+# Mock Users endpoint
+class MockUsersView(MockListView):
+    business_element = "Users"
+    dataset_reader = "users"
 
-        # Access rule provided by MockRoleBasedPermission
-        rule = getattr(self, "access_rule", None)
-        if not rule:
-            return Response({"detail": "Forbidden"}, status=403)
 
-        # If read_all_permission, return all stores
-        if rule.read_all_permission:
-            return Response(mock_stores)
+# Mock Products endpoint
+class MockProductsView(MockListView):
+    business_element = "Products"
+    dataset_reader = "products"
 
-        # If read_permission, return only stores owned by this user
-        if rule.read_permission:
-            filtered = [s for s in mock_stores if s["owner"] == request.user.id]
-            return Response(filtered)
 
-        # Otherwise, forbid access
-        return Response({"detail": "Forbidden"}, status=403)
\ No newline at end of file
+# Mock Stores endpoint
+class MockStoresView(MockListView):
+    business_element = "Stores"
+    dataset_reader = "stores"
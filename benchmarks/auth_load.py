@@ -0,0 +1,71 @@
+"""
+Login-storm load test comparing sync (WSGI) and async (ASGI) deployments.
+
+Start the two servers against the same database, e.g.:
+
+    gunicorn core.wsgi:application -w 4 -b 127.0.0.1:8000
+    ASYNC_AUTH_VIEWS=1 uvicorn core.asgi:application --workers 4 --port 8001
+
+then run:
+
+    python -m benchmarks.auth_load --target wsgi=http://127.0.0.1:8000 \\
+        --target asgi=http://127.0.0.1:8001 --requests 2000 --concurrency 500
+
+Each target gets a fresh account through /api/auth/register/, then a storm of
+/api/auth/login/ calls. Throughput and p50/p95/p99 latency are printed per
+target, and written as JSON with --output.
+"""
+import argparse
+import asyncio
+import json
+import uuid
+
+from .common import http_request, run_load, summarize
+
+PASSWORD = "bench-password-123"
+
+
+async def login_storm(base_url, total, concurrency):
+    email = f"bench-{uuid.uuid4().hex[:12]}@example.com"
+    response = await http_request(base_url, "POST", "/api/auth/register/", {
+        "full_name": "Benchmark User",
+        "email": email,
+        "password": PASSWORD,
+        "password_repeat": PASSWORD,
+    })
+    if response.status != 201:
+        raise SystemExit(f"{base_url}: registration failed with {response.status}: {response.body[:200]!r}")
+
+    def login(_):
+        return http_request(base_url, "POST", "/api/auth/login/", {"email": email, "password": PASSWORD})
+
+    latencies, errors, elapsed = await run_load(login, total, concurrency)
+    return summarize(latencies, elapsed, errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", action="append", required=True, metavar="LABEL=URL",
+                        help="Server to test, may be given several times")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for target in args.target:
+        label, _, url = target.partition("=")
+        results[label] = asyncio.run(login_storm(url, args.requests, args.concurrency))
+
+    print(f"{'target':<10}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for label, stats in results.items():
+        print(f"{label:<10}{stats['throughput_rps']:>10}{stats['p50_ms']:>10}"
+              f"{stats['p95_ms']:>10}{stats['p99_ms']:>10}{stats['errors']:>8}")
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Connection-setup overhead benchmark.
+
+Each iteration does what a request does: obtain a connection, run one
+trivial query and release the connection at the end of the request. Run it
+once per configuration and compare, e.g.:
+
+    python -m benchmarks.db_connection_setup                 # new connection per request
+    DB_POOL=1 python -m benchmarks.db_connection_setup       # psycopg 3 pool
+    DB_CONN_MAX_AGE=60 python -m benchmarks.db_connection_setup
+"""
+import argparse
+import json
+import os
+import time
+
+import django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+    django.setup()
+
+    from django.db import close_old_connections, connection
+    from api.dbpool import get_pool_stats
+    from .common import summarize
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(args.iterations):
+        t0 = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        # Same cleanup Django runs on request_finished
+        close_old_connections()
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    result = summarize(latencies, elapsed)
+    result["mode"] = "pool" if getattr(connection, "pool", None) else f"conn_max_age={connection.settings_dict['CONN_MAX_AGE']}"
+    result["connections"] = get_pool_stats()["databases"][0]
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
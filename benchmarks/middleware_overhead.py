@@ -0,0 +1,81 @@
+"""
+Per-request overhead of the session, CSRF, authentication and message
+middleware on /api/ paths.
+
+Serves the same request in-process through the full middleware stack,
+once with LEAN_PATH_PREFIXES empty (every middleware runs, as with
+Django's stock classes) and once with the configured prefixes (the Lean*
+middleware step aside), and prints the median time per request of each
+and the difference:
+
+    python -m benchmarks.middleware_overhead
+    python -m benchmarks.middleware_overhead --path /api/products/ --requests 5000 --json
+
+The default request, an unauthenticated GET /api/products/, needs no
+database. A session cookie is sent so the session middleware has a session
+to look at.
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import time
+
+import django
+
+
+def time_requests(client, path, requests):
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get(path)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default="/api/products/")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per round (default: 2000)")
+    parser.add_argument("--rounds", type=int, default=5, help="Rounds per stack; the median is reported")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+    django.setup()
+    from django.conf import settings
+    from django.test import Client, override_settings
+
+    # Keep the comparison to the middleware themselves
+    quiet = override_settings(
+        METRICS={**settings.METRICS, "ENABLED": False},
+        TRACING={**settings.TRACING, "ENABLED": False},
+        QUERY_BUDGETS={**settings.QUERY_BUDGETS, "ENABLED": False},
+        SLOW_QUERIES={**settings.SLOW_QUERIES, "ENABLED": False},
+        DEBUG=False,
+    )
+    logging.disable(logging.WARNING)  # one "Unauthorized" line per request otherwise
+    stacks = {"full": (), "lean": settings.LEAN_PATH_PREFIXES}
+    rounds = {name: [] for name in stacks}
+    with quiet:
+        client = Client()
+        client.cookies[settings.SESSION_COOKIE_NAME] = "benchmark-session"
+        client.get(args.path)  # load the URLconf and views
+        for _ in range(args.rounds):
+            for name, prefixes in stacks.items():
+                with override_settings(LEAN_PATH_PREFIXES=prefixes):
+                    rounds[name].append(time_requests(client, args.path, args.requests))
+
+    results = {name: round(statistics.median(values), 1) for name, values in rounds.items()}
+    results["saved_us"] = round(results["full"] - results["lean"], 1)
+    results["saved_percent"] = round(results["saved_us"] / results["full"] * 100, 1)
+    if args.json:
+        print(json.dumps(results))
+        return
+    print(f"GET {args.path}, median of {args.rounds} rounds of {args.requests} requests")
+    print(f"{'full middleware stack':<28}{results['full']:>10.1f} us/request")
+    print(f"{'lean on ' + ', '.join(stacks['lean']):<28}{results['lean']:>10.1f} us/request")
+    print(f"{'removed':<28}{results['saved_us']:>10.1f} us/request ({results['saved_percent']}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Order partitioning benchmark (PostgreSQL only).
+
+Fills api_order with synthetic rows spread over the last --months months
+using generate_series, then times the two hot queries: the newest-first
+order list and a status + month report. On a partitioned table the filled
+months are split out of the default partition before timing starts, and
+the EXPLAIN output shows which partitions the planner keeps. Run it once
+before and once after the partitioning migration to compare:
+
+    python -m benchmarks.order_partitions --rows 10000000
+    python -m benchmarks.order_partitions --skip-fill     # reuse existing rows
+"""
+import argparse
+import json
+import os
+import time
+
+
+def fill(cursor, rows, months):
+    cursor.execute("SELECT id FROM api_product ORDER BY id LIMIT 1")
+    product = cursor.fetchone()
+    cursor.execute("SELECT id FROM api_user ORDER BY id LIMIT 1")
+    user = cursor.fetchone()
+    if not product or not user:
+        raise SystemExit("Needs at least one product and one user to attach orders to")
+
+    cursor.execute(
+        """
+        INSERT INTO api_order (product_id, user_id, owner_id, quantity, total_price, status, created_at, updated_at)
+        SELECT %(product)s, %(user)s, %(user)s, 1 + i %% 5, 10.00,
+               (ARRAY['pending', 'paid', 'shipped', 'completed', 'cancelled'])[1 + i %% 5],
+               now() - make_interval(secs => random() * %(span)s),
+               now()
+        FROM generate_series(1, %(rows)s) AS i
+        """,
+        {"product": product[0], "user": user[0], "rows": rows, "span": months * 30 * 86400},
+    )
+    cursor.execute("ANALYZE api_order")
+
+
+def timed(cursor, sql, params, repeat):
+    latencies = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        latencies.append(time.perf_counter() - t0)
+    cursor.execute("EXPLAIN " + sql, params)
+    plan = [line for (line,) in cursor.fetchall()]
+    return latencies, plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--months", type=int, default=24, help="Spread created_at over this many months")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--skip-fill", action="store_true")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+    import django
+    django.setup()
+
+    from django.db import connection, transaction
+    from django.utils import timezone
+    from api import partitions
+    from .common import summarize
+
+    if connection.vendor != "postgresql":
+        raise SystemExit("This benchmark needs PostgreSQL")
+
+    with connection.cursor() as cursor:
+        # The fill and partition backfill are long single statements
+        cursor.execute("SET statement_timeout = 0")
+        if not args.skip_fill:
+            t0 = time.perf_counter()
+            fill(cursor, args.rows, args.months)
+            print(f"inserted {args.rows} orders in {time.perf_counter() - t0:.1f}s")
+
+        if partitions.is_partitioned(cursor):
+            # Split the filled months out of the default partition so the planner can prune them
+            t0 = time.perf_counter()
+            with transaction.atomic():
+                created = [partitions.create_month_partition(cursor, month)
+                           for month in partitions.default_partition_months(cursor)]
+            cursor.execute("ANALYZE api_order")
+            print(f"created {len(created)} month partitions in {time.perf_counter() - t0:.1f}s")
+
+        month = partitions.add_months(partitions.month_start(timezone.now().date()), -1)
+        queries = {
+            "newest_first": (
+                "SELECT * FROM api_order ORDER BY created_at DESC LIMIT 50",
+                [],
+            ),
+            "status_month": (
+                "SELECT status, count(*), sum(total_price) FROM api_order "
+                "WHERE status = %s AND created_at >= %s AND created_at < %s GROUP BY status",
+                ["completed", month, partitions.add_months(month, 1)],
+            ),
+        }
+
+        result = {"partitioned": partitions.is_partitioned(cursor)}
+        for name, (sql, params) in queries.items():
+            latencies, plan = timed(cursor, sql, params, args.repeat)
+            result[name] = summarize(latencies, sum(latencies))
+            result[name]["plan"] = plan
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Worker startup benchmark.
+
+Boots a fresh interpreter per run under `python -X importtime`, builds the
+WSGI application and serves one request in-process, the way a new worker
+does after a scale-out. For each settings module it reports the median of
+--repeat runs:
+
+  imports            modules imported and their total import time
+  setup ms           django.setup()
+  wsgi ms            get_wsgi_application() (middleware chain)
+  request ms         the first request (URLconf, views, serializers)
+  first response ms  process start to the first response, measured outside
+
+plus the slowest top-level imports of the last run. The default request,
+an unauthenticated GET /api/products/, needs no database.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --settings core.settings_api --repeat 10 \\
+        --history benchmarks/startup_history.jsonl --baseline startup.json
+
+--history appends each run with a timestamp and the git commit, so startup
+time can be tracked over time. With --baseline, a settings module regresses
+when its first response or import time is more than --tolerance percent
+slower, and the exit status is 1 (--save-baseline writes the baseline).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CHILD = """
+import io, json, time
+started = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+wsgi = time.perf_counter()
+environ = {
+    "REQUEST_METHOD": "GET", "PATH_INFO": %(path)r, "QUERY_STRING": "", "SERVER_NAME": %(host)r,
+    "SERVER_PORT": "80", "HTTP_HOST": %(host)r, "wsgi.input": io.BytesIO(), "wsgi.url_scheme": "http",
+}
+statuses = []
+b"".join(application(environ, lambda status, headers: statuses.append(status)))
+done = time.perf_counter()
+print(json.dumps({
+    "status": int(statuses[0].split()[0]),
+    "setup_ms": (setup - started) * 1000,
+    "wsgi_ms": (wsgi - setup) * 1000,
+    "request_ms": (done - wsgi) * 1000,
+}))
+"""
+
+
+def parse_importtime(stderr):
+    """(modules imported, total import ms, {top-level module: cumulative ms})."""
+    count, total_us, top_level = 0, 0, {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        count += 1
+        total_us += int(self_us)
+        if not name.startswith("  "):  # imported by the script itself
+            top_level[name.strip()] = int(cumulative_us) / 1000
+    return count, total_us / 1000, top_level
+
+
+def boot(settings, path, host):
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": settings, "PYTHONPATH": os.pathsep.join(sys.path)}
+    code = CHILD % {"path": path, "host": host}
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    elapsed = (time.perf_counter() - started) * 1000
+    if result.returncode:
+        sys.stderr.write(result.stderr[-4000:])
+        raise SystemExit(f"{settings}: worker failed to start")
+    run = json.loads(result.stdout.strip().splitlines()[-1])
+    run["modules"], run["import_ms"], top_level = parse_importtime(result.stderr)
+    run["first_response_ms"] = elapsed
+    return run, top_level
+
+
+def measure(settings, repeat, path, host):
+    runs, top_level = [], {}
+    for _ in range(repeat):
+        run, top_level = boot(settings, path, host)
+        runs.append(run)
+    stats = {
+        key: round(statistics.median(run[key] for run in runs), 1)
+        for key in ("modules", "import_ms", "setup_ms", "wsgi_ms", "request_ms", "first_response_ms")
+    }
+    stats["status"] = runs[-1]["status"]
+    stats["slowest_imports"] = dict(sorted(top_level.items(), key=lambda item: -item[1])[:10])
+    return stats
+
+
+def compare(results, baseline, tolerance):
+    """Returns human-readable regressions of `results` against `baseline`."""
+    regressions = []
+    factor = 1 + tolerance / 100
+    for settings, stats in results.items():
+        base = baseline.get(settings)
+        if base is None:
+            continue
+        for key in ("first_response_ms", "import_ms"):
+            if base[key] and stats[key] > base[key] * factor:
+                regressions.append(f"{settings}: {key} {base[key]} -> {stats[key]}")
+    return regressions
+
+
+def git_commit():
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--settings", action="append",
+                        help="Settings module to boot, may be given several times "
+                             "(default: core.settings and core.settings_api)")
+    parser.add_argument("--repeat", type=int, default=5, help="Boots per settings module (default: 5)")
+    parser.add_argument("--path", default="/api/products/", help="Path of the first request")
+    parser.add_argument("--host", default="localhost", help="Host header of the first request")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    parser.add_argument("--history", help="Append the results to this JSON lines file")
+    parser.add_argument("--baseline", help="Compare against results stored in this JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run to --baseline")
+    parser.add_argument("--tolerance", type=float, default=20.0,
+                        help="Allowed first response/import time regression in percent (default: 20)")
+    args = parser.parse_args()
+
+    profiles = args.settings or ["core.settings", "core.settings_api"]
+    results = {settings: measure(settings, args.repeat, args.path, args.host) for settings in profiles}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'settings':<24}{'modules':>9}{'import ms':>11}{'setup ms':>10}{'wsgi ms':>9}"
+              f"{'request ms':>12}{'first response ms':>19}")
+        for settings, stats in results.items():
+            print(f"{settings:<24}{stats['modules']:>9.0f}{stats['import_ms']:>11}{stats['setup_ms']:>10}"
+                  f"{stats['wsgi_ms']:>9}{stats['request_ms']:>12}{stats['first_response_ms']:>19}")
+        for settings, stats in results.items():
+            print(f"\nslowest imports under {settings}:")
+            for name, ms in stats["slowest_imports"].items():
+                print(f"  {ms:>9.1f} ms  {name}")
+
+    if args.history:
+        entry = {"at": datetime.now(timezone.utc).isoformat(timespec="seconds"), "commit": git_commit(),
+                 "python": sys.version.split()[0], "results": results}
+        with open(args.history, "a") as fh:
+            fh.write(json.dumps(entry) + "\n")
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, "w") as fh:
+            json.dump(results, fh, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline) as fh:
+            regressions = compare(results, json.load(fh), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+End-to-end API benchmark suite.
+
+Runs scripted scenarios against a running server and reports throughput,
+p50/p95/p99 latency and database queries per request for each of them.
+Start the server with the query count header enabled and a seeded
+database, e.g.:
+
+    QUERY_COUNT_HEADER=1 gunicorn core.wsgi:application -w 4 -b 127.0.0.1:8000
+
+then run:
+
+    python -m benchmarks.suite --url http://127.0.0.1:8000 \\
+        --account admin=admin@example.com:password123 \\
+        --output results.json --baseline benchmarks/baseline.json
+
+Scenarios:
+  login                      POST /api/auth/login/ storm
+  <role>:products.list       GET /api/products/ for every --account (plus a freshly registered "user")
+  <role>:products.detail     GET /api/products/<id>/
+  <role>:stores.list         GET /api/stores/
+  <role>:stores.detail       GET /api/stores/<id>/
+  <role>:products.create     POST /api/products/ and
+  <role>:products.update     PATCH /api/products/<id>/ (only with --writes)
+  logout                     POST /api/auth/logout/ with pre-issued tokens
+
+With --baseline, a scenario regresses when its p95 latency or throughput
+is more than --tolerance percent worse, or when it runs more queries per
+request. The exit status is 1 on any regression, so the suite can gate CI.
+Use --save-baseline to store the current run as the new baseline.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import uuid
+
+from .common import http_request, run_load, summarize
+
+PASSWORD = "bench-password-123"
+
+
+class Session:
+    def __init__(self, base_url, concurrency, requests):
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.requests = requests
+        self.results = {}
+
+    async def call(self, method, path, body=None, token=None):
+        headers = {"Authorization": f"Bearer {token}"} if token else None
+        return await http_request(self.base_url, method, path, body, headers)
+
+    async def login(self, email, password):
+        response = await self.call("POST", "/api/auth/login/", {"email": email, "password": password})
+        if response.status != 200:
+            raise SystemExit(f"Login as {email} failed with {response.status}: {response.body[:200]!r}")
+        return response.json()["token"]
+
+    async def run(self, name, make_request, expected_status=(200,), total=None):
+        """Runs one scenario; `make_request(i)` returns (method, path, body, token)."""
+        queries = []
+
+        async def request(i):
+            response = await self.call(*make_request(i))
+            if "x-db-queries" in response.headers:
+                queries.append(int(response.headers["x-db-queries"]))
+            return response
+
+        latencies, errors, elapsed = await run_load(request, total or self.requests, self.concurrency, expected_status)
+        stats = summarize(latencies, elapsed, errors)
+        stats["queries_per_request"] = round(sum(queries) / len(queries), 2) if queries else None
+        self.results[name] = stats
+
+
+async def first_id(session, path, token):
+    response = await session.call("GET", path, token=token)
+    if response.status != 200 or not response.json():
+        return None
+    return response.json()[0]["id"]
+
+
+async def run_suite(args):
+    session = Session(args.url, args.concurrency, args.requests)
+
+    email = f"bench-{uuid.uuid4().hex[:12]}@example.com"
+    response = await session.call("POST", "/api/auth/register/", {
+        "full_name": "Benchmark User", "email": email, "password": PASSWORD, "password_repeat": PASSWORD,
+    })
+    if response.status != 201:
+        raise SystemExit(f"Registration failed with {response.status}: {response.body[:200]!r}")
+
+    accounts = {"user": (email, PASSWORD)}
+    for account in args.account or []:
+        role, _, credentials = account.partition("=")
+        account_email, _, password = credentials.partition(":")
+        accounts[role] = (account_email, password)
+
+    login_body = {"email": email, "password": PASSWORD}
+    await session.run("login", lambda i: ("POST", "/api/auth/login/", login_body, None), total=args.login_requests)
+
+    for role, (account_email, password) in accounts.items():
+        token = await session.login(account_email, password)
+        for resource in ("products", "stores"):
+            list_path = f"/api/{resource}/"
+            await session.run(f"{role}:{resource}.list", lambda i: ("GET", list_path, None, token))
+            object_id = await first_id(session, list_path, token)
+            if object_id is not None:
+                detail_path = f"{list_path}{object_id}/"
+                await session.run(f"{role}:{resource}.detail", lambda i: ("GET", detail_path, None, token))
+
+        if args.writes:
+            store_id = await first_id(session, "/api/stores/", token)
+            if store_id is None:
+                continue
+            run_id = uuid.uuid4().hex[:8]
+            await session.run(
+                f"{role}:products.create",
+                lambda i: ("POST", "/api/products/",
+                           {"name": f"bench-{run_id}-{i}", "price": "9.99", "store": store_id}, token),
+                expected_status=(201,),
+            )
+            product_id = await first_id(session, "/api/products/", token)
+            if product_id is not None:
+                await session.run(
+                    f"{role}:products.update",
+                    lambda i: ("PATCH", f"/api/products/{product_id}/", {"price": f"{10 + i % 90}.00"}, token),
+                )
+
+    # Every logout revokes its token, so issue them up front (not timed)
+    tokens = [await session.login(email, PASSWORD) for _ in range(args.logout_requests)]
+    await session.run("logout", lambda i: ("POST", "/api/auth/logout/", None, tokens[i]), total=len(tokens))
+    return session.results
+
+
+def compare(results, baseline, tolerance):
+    """Returns human-readable regressions of `results` against `baseline`."""
+    regressions = []
+    factor = tolerance / 100
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if base["p95_ms"] and stats["p95_ms"] > base["p95_ms"] * (1 + factor):
+            regressions.append(f"{name}: p95 {base['p95_ms']} -> {stats['p95_ms']} ms")
+        if base["throughput_rps"] and stats["throughput_rps"] < base["throughput_rps"] * (1 - factor):
+            regressions.append(f"{name}: throughput {base['throughput_rps']} -> {stats['throughput_rps']} rps")
+        if None not in (base.get("queries_per_request"), stats["queries_per_request"]) \
+                and stats["queries_per_request"] > base["queries_per_request"]:
+            regressions.append(
+                f"{name}: queries/request {base['queries_per_request']} -> {stats['queries_per_request']}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--account", action="append", metavar="ROLE=EMAIL:PASSWORD",
+                        help="Existing account to run the read/write scenarios as, may be given several times")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per read/write scenario")
+    parser.add_argument("--login-requests", type=int, default=200)
+    parser.add_argument("--logout-requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--writes", action="store_true", help="Also run product create/update scenarios")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against results stored in this JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run to --baseline")
+    parser.add_argument("--tolerance", type=float, default=20.0,
+                        help="Allowed p95/throughput regression in percent (default: 20)")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_suite(args))
+
+    print(f"{'scenario':<28}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'errors':>8}")
+    for name, stats in results.items():
+        queries = "-" if stats["queries_per_request"] is None else stats["queries_per_request"]
+        print(f"{name:<28}{stats['throughput_rps']:>10}{stats['p50_ms']:>10}"
+              f"{stats['p95_ms']:>10}{stats['p99_ms']:>10}{queries:>9}{stats['errors']:>8}")
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, "w") as fh:
+            json.dump(results, fh, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline) as fh:
+            regressions = compare(results, json.load(fh), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
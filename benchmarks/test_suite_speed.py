@@ -0,0 +1,61 @@
+"""
+Test suite wall-clock benchmark.
+
+Runs `manage.py test` once with the default settings, once serially with
+core.settings_test, and once with core.settings_test and --parallel, then
+prints the time of each run and the speedup over the first:
+
+    python -m benchmarks.test_suite_speed --parallel 4
+    TEST_DB=sqlite python -m benchmarks.test_suite_speed --json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def run(label, settings, extra, labels):
+    command = [sys.executable, "manage.py", "test", *labels, "--noinput", *extra]
+    if settings:
+        command.append(f"--settings={settings}")
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(f"{label} run failed")
+    return round(elapsed, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("labels", nargs="*", default=["api"], help="Test labels (default: api)")
+    parser.add_argument("--parallel", default="auto", help="Worker processes for the parallel run (default: auto)")
+    parser.add_argument("--skip-default", action="store_true", help="Do not time the run with the default settings")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    runs = []
+    if not args.skip_default:
+        runs.append(("default", os.environ.get("DJANGO_SETTINGS_MODULE"), []))
+    runs += [
+        ("fast", "core.settings_test", []),
+        (f"fast --parallel {args.parallel}", "core.settings_test", ["--parallel", args.parallel]),
+    ]
+
+    results = {label: run(label, settings, extra, args.labels) for label, settings, extra in runs}
+    baseline = next(iter(results.values()))
+    if args.json:
+        print(json.dumps({"seconds": results, "speedup": {k: round(baseline / v, 2) for k, v in results.items()}}))
+        return
+    for label, seconds in results.items():
+        print(f"{label:<28}{seconds:>8.2f} s{baseline / seconds:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/5.2/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,15 +42,26 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.TracingMiddleware',
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'api.middleware.LeanSessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
+    'api.middleware.LeanCsrfViewMiddleware',
+    'api.middleware.LeanAuthenticationMiddleware',
+    'api.middleware.LeanMessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.ReadYourWritesMiddleware',
+    'api.middleware.QueryCountMiddleware',
+    'api.middleware.QueryBudgetMiddleware',
+    'api.middleware.SlowQueryMiddleware',
+    'api.middleware.ProfilingMiddleware',
 ]
 
+# Paths authenticated with JWT only: the Lean* middleware skip sessions, CSRF,
+# request.user and messages there, and keep them for /admin/
+LEAN_PATH_PREFIXES = ("/api/", "/metrics")
+
 ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
@@ -69,10 +81,50 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'core.wsgi.application'
 
+# Serve login/logout/register through native async views. Enable this when
+# running under an ASGI server (e.g. uvicorn core.asgi:application).
+ASYNC_AUTH_VIEWS = os.environ.get("ASYNC_AUTH_VIEWS", "0") == "1"
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connection management is configured through environment variables:
+#   DB_POOL=1                 psycopg 3 connection pool (DB_POOL_MIN_SIZE / DB_POOL_MAX_SIZE /
+#                             DB_POOL_TIMEOUT seconds to wait for a free connection)
+#   DB_PGBOUNCER=1            safe behind pgbouncer in transaction mode: no app-side pool,
+#                             no server-side prepared statements or cursors
+#   DB_STATEMENT_TIMEOUT_MS   per-statement timeout (0 disables)
+#   DB_CONN_MAX_AGE           persistent connection lifetime when not pooling
+DB_POOL = os.environ.get("DB_POOL", "0") == "1"
+DB_PGBOUNCER = os.environ.get("DB_PGBOUNCER", "0") == "1"
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+DATABASE_OPTIONS = {}
+if DB_PGBOUNCER:
+    # pgbouncer rejects the "options" startup parameter and does not keep
+    # prepared statements across transactions. Set statement_timeout on the
+    # role instead (ALTER ROLE testuser SET statement_timeout = ...).
+    # psycopg2 never prepares server-side; psycopg 3 must be told not to.
+    try:
+        import psycopg  # noqa: F401
+        DATABASE_OPTIONS["prepare_threshold"] = None
+    except ImportError:
+        pass
+elif DB_STATEMENT_TIMEOUT_MS:
+    DATABASE_OPTIONS["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+
+if DB_POOL and not DB_PGBOUNCER:
+    from psycopg_pool import ConnectionPool
+
+    DATABASE_OPTIONS["pool"] = {
+        "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", "2")),
+        "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", "10")),
+        "timeout": float(os.environ.get("DB_POOL_TIMEOUT", "10")),
+        # Validate connections when they are handed out of the pool
+        "check": ConnectionPool.check_connection,
+    }
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -81,10 +133,138 @@ DATABASES = {
         'PASSWORD': 'testpass',
         'HOST': 'localhost',
         'PORT': '5432',
+        'OPTIONS': DATABASE_OPTIONS,
+        # The pool owns connection lifetimes; persistent connections are
+        # only used without it.
+        'CONN_MAX_AGE': 0 if 'pool' in DATABASE_OPTIONS else int(os.environ.get("DB_CONN_MAX_AGE", "0")),
+        'CONN_HEALTH_CHECKS': True,
+        'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER,
     }
 }
 
+# Read replicas: comma-separated host[:port] list, e.g. DB_REPLICAS=localhost:5433.
+# Each replica gets a "replica_<n>" alias; tests mirror them onto default.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(filter(None, os.environ.get("DB_REPLICAS", "").split(",")), start=1):
+    replica_host, _, replica_port = replica.strip().partition(":")
+    alias = f"replica_{index}"
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': replica_host,
+        'PORT': replica_port or '5432',
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['api.routers.PrimaryReplicaRouter']
+
+# After a client writes, its reads stay on the primary for this many seconds.
+# The marker lives in the default cache, which must be shared between
+# workers (e.g. Redis/Memcached) for stickiness across processes.
+READ_YOUR_WRITES_SECONDS = int(os.environ.get("READ_YOUR_WRITES_SECONDS", "5"))
+
 AUTH_USER_MODEL = 'api.User'
+
+# Roles, business elements and access rules (see api/policy.py, manage.py sync_policy)
+ACCESS_POLICY_FILE = os.environ.get("ACCESS_POLICY_FILE", BASE_DIR / "api" / "policy.json")
+
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.renderers.TracedJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+
+# bcrypt cost factor for new password hashes (core.settings_test lowers it)
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+
+# Write-behind audit log of AccessRoleRule, Product, Store and Order changes
+AUDIT_LOG = {
+    "ENABLED": os.environ.get("AUDIT_LOG_ENABLED", "1") == "1",
+    "BUFFER_SIZE": int(os.environ.get("AUDIT_LOG_BUFFER_SIZE", "10000")),  # records held in memory
+    "BATCH_SIZE": int(os.environ.get("AUDIT_LOG_BATCH_SIZE", "500")),  # flush when this many are buffered
+    "FLUSH_INTERVAL": float(os.environ.get("AUDIT_LOG_FLUSH_INTERVAL", "2.0")),  # ... or after this many seconds
+    "BLOCK_TIMEOUT": float(os.environ.get("AUDIT_LOG_BLOCK_TIMEOUT", "0.05")),  # max wait for room when full
+}
+
+# Deletes cascading to at least this many rows run as background jobs,
+# removing DELETION_BATCH_SIZE rows per transaction.
+BACKGROUND_DELETE_THRESHOLD = int(os.environ.get("BACKGROUND_DELETE_THRESHOLD", "1000"))
+DELETION_BATCH_SIZE = int(os.environ.get("DELETION_BATCH_SIZE", "1000"))
+# A running job whose runner has not finished a batch for this long may be resumed
+DELETION_JOB_LEASE_SECONDS = int(os.environ.get("DELETION_JOB_LEASE_SECONDS", "300"))
+
+# Cold archive of completed/cancelled orders (see api/archive.py)
+ORDER_ARCHIVE = {
+    "DIR": os.environ.get("ORDER_ARCHIVE_DIR", str(BASE_DIR / "archive" / "orders")),
+    "OLDER_THAN_DAYS": int(os.environ.get("ORDER_ARCHIVE_OLDER_THAN_DAYS", "180")),
+    "BATCH_SIZE": int(os.environ.get("ORDER_ARCHIVE_BATCH_SIZE", "1000")),
+}
+
+# Adds an X-DB-Queries header with the request's query count (benchmarks)
+QUERY_COUNT_HEADER = os.environ.get("QUERY_COUNT_HEADER", "0") == "1"
+
+# Per-view query budgets (see api/queries.py); RAISE fails the request instead of logging
+QUERY_BUDGETS = {
+    "ENABLED": os.environ.get("QUERY_BUDGETS_ENABLED", "1") == "1",
+    "RAISE": os.environ.get("QUERY_BUDGETS_RAISE", "0") == "1",
+    "SAMPLE_RATE": float(os.environ.get("QUERY_BUDGETS_SAMPLE_RATE", "0.1")),
+    "REPORT_LIMIT": 10,  # fingerprints per logged warning
+}
+
+# Prometheus metrics aggregated across worker processes (see api/metrics.py).
+# Empty DIR when the server starts; with TOKEN set, /metrics requires "Authorization: Bearer <TOKEN>".
+METRICS = {
+    "ENABLED": os.environ.get("METRICS_ENABLED", "1") == "1",
+    "DIR": os.environ.get("METRICS_DIR", BASE_DIR / "var" / "metrics"),
+    "TOKEN": os.environ.get("METRICS_TOKEN", ""),
+}
+
+# OpenTelemetry-compatible request traces written as OTLP/JSON lines (see api/tracing.py)
+TRACING = {
+    "ENABLED": os.environ.get("TRACING_ENABLED", "1") == "1",
+    "SAMPLE_RATIO": float(os.environ.get("TRACING_SAMPLE_RATIO", "0.01")),
+    "FILE": os.environ.get("TRACING_FILE", BASE_DIR / "var" / "traces.jsonl"),
+    "SERVICE_NAME": os.environ.get("TRACING_SERVICE_NAME", "testingtask-api"),
+}
+
+# Slow statement capture (see api/slowqueries.py); ANALYZE re-runs slow SELECTs on PostgreSQL
+SLOW_QUERIES = {
+    "ENABLED": os.environ.get("SLOW_QUERIES_ENABLED", "1") == "1",
+    "THRESHOLD_MS": float(os.environ.get("SLOW_QUERIES_THRESHOLD_MS", "100")),
+    "EXPLAIN": os.environ.get("SLOW_QUERIES_EXPLAIN", "1") == "1",
+    "ANALYZE": os.environ.get("SLOW_QUERIES_ANALYZE", "0") == "1",
+    "EXPLAIN_TIMEOUT_MS": int(os.environ.get("SLOW_QUERIES_EXPLAIN_TIMEOUT_MS", "5000")),
+    "PLAN_TTL": int(os.environ.get("SLOW_QUERIES_PLAN_TTL", "3600")),
+    # Store the latest statement with its parameters; they can hold emails, tokens and password hashes
+    "STORE_SAMPLES": os.environ.get("SLOW_QUERIES_STORE_SAMPLES", "0") == "1",
+    "BUFFER_SIZE": 1000,  # statements held in memory; more are dropped
+    "FLUSH_INTERVAL": 5.0,  # seconds
+}
+
+# On-demand cProfile of requests with a signed X-Profile-Token or sampled (see api/profiling.py)
+PROFILING = {
+    "DIR": os.environ.get("PROFILING_DIR", BASE_DIR / "var" / "profiles"),
+    "SAMPLE_RATE": float(os.environ.get("PROFILING_SAMPLE_RATE", "0")),
+    "TOKEN_MAX_AGE": int(os.environ.get("PROFILING_TOKEN_MAX_AGE", "3600")),
+    "KEEP": int(os.environ.get("PROFILING_KEEP", "200")),
+}
+
+# Memory-mapped catalog snapshot serving product/store reads (see api/snapshot.py)
+CATALOG_SNAPSHOT = {
+    "ENABLED": os.environ.get("CATALOG_SNAPSHOT_ENABLED", "0") == "1",
+    "PATH": os.environ.get("CATALOG_SNAPSHOT_PATH", str(BASE_DIR / "var" / "catalog.snapshot")),
+}
+
+# Generated rows behind the /api/mock/ endpoints (see api/mockdata.py); PRELOAD builds them at startup
+MOCK_DATA = {
+    "USERS": int(os.environ.get("MOCK_DATA_USERS", "1000")),
+    "STORES": int(os.environ.get("MOCK_DATA_STORES", "200")),
+    "PRODUCTS": int(os.environ.get("MOCK_DATA_PRODUCTS", "5000")),
+    "SEED": int(os.environ.get("MOCK_DATA_SEED", "0")),
+    "PRELOAD": os.environ.get("MOCK_DATA_PRELOAD", "0") == "1",
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -134,6 +314,10 @@ LOGGING = {
             "handlers": ["console"],
             "level": "INFO",
         },
+        "api.middleware": {
+            "handlers": ["console"],
+            "level": "WARNING",
+        },
         "__main__": {
             "handlers": ["console"],
             "level": "INFO",
@@ -0,0 +1,42 @@
+"""
+API-only settings for the application servers:
+
+    DJANGO_SETTINGS_MODULE=core.settings_api gunicorn core.wsgi:application
+
+The API authenticates with JWT only, so this profile leaves out the admin,
+sessions, messages, staticfiles and the template engine, together with
+their middleware and the browsable API. None of them is imported when a
+worker boots, which makes it start faster (`python -m benchmarks.startup`).
+
+Run migrations and the admin with core.settings, which keeps the tables
+of the left-out apps up to date.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS, MIDDLEWARE, REST_FRAMEWORK
+
+DEFERRED_APPS = {
+    "django.contrib.admin",
+    "django.contrib.sessions",
+    "django.contrib.messages",
+    "django.contrib.staticfiles",
+}
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in DEFERRED_APPS]
+
+# Session and CSRF handling only matter for cookie authentication
+DEFERRED_MIDDLEWARE = {
+    "api.middleware.LeanSessionMiddleware",
+    "api.middleware.LeanCsrfViewMiddleware",
+    "api.middleware.LeanAuthenticationMiddleware",
+    "api.middleware.LeanMessageMiddleware",
+}
+MIDDLEWARE = [name for name in MIDDLEWARE if name not in DEFERRED_MIDDLEWARE]
+
+TEMPLATES = []
+ROOT_URLCONF = "core.urls_api"
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    "DEFAULT_RENDERER_CLASSES": ["api.renderers.TracedJSONRenderer"],
+    # Every view declares its authentication classes; none falls back to sessions
+    "DEFAULT_AUTHENTICATION_CLASSES": [],
+}
@@ -0,0 +1,35 @@
+"""
+Settings for the test suite:
+
+    python manage.py test --settings=core.settings_test --parallel auto
+
+Passwords are hashed with bcrypt's minimum cost, so creating and logging in
+users is cheap. This is only acceptable for throwaway test data. With
+--parallel, Django gives every worker process its own clone of the test
+database (test_testdb_1, test_testdb_2, ...). TEST_DB=sqlite runs the
+suite on SQLite instead of PostgreSQL.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, DATABASES, METRICS, QUERY_BUDGETS, SLOW_QUERIES, TRACING, os
+
+BCRYPT_ROUNDS = 4
+
+# A request over its view's query budget fails the test that made it
+QUERY_BUDGETS = {**QUERY_BUDGETS, "RAISE": True}
+
+# Tests that check metrics, traces or slow queries enable them themselves
+METRICS = {**METRICS, "ENABLED": False}
+TRACING = {**TRACING, "SAMPLE_RATIO": 0.0}
+SLOW_QUERIES = {**SLOW_QUERIES, "ENABLED": False}
+
+# No app-side pool: each worker process uses one connection to its own clone
+DATABASES["default"]["OPTIONS"].pop("pool", None)
+
+if os.environ.get("TEST_DB") == "sqlite":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "test.sqlite3",
+        }
+    }
+    DATABASE_REPLICAS = []
@@ -0,0 +1,11 @@
+"""
+URL configuration of the API-only profile (core.settings_api): the API and
+/metrics, without the admin.
+"""
+from django.urls import path, include
+from api.views import MetricsView
+
+urlpatterns = [
+    path('api/', include('api.urls')),
+    path('metrics', MetricsView.as_view(), name='metrics'),
+]